@@ -0,0 +1,104 @@
+import os
+import time
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import estado
+
+# Agenda de sessões: cada bot pode ter uma janela diária (inicio/fim, dias da semana, fuso).
+# Na borda de início o bot é iniciado (o /start já zera os contadores de stop), na borda
+# de fim ele é drenado; bots sem janela com reset_diario só têm os contadores zerados à
+# meia-noite. Cada bot dispara num slot próprio de até SESSION_JITTER segundos depois
+# da borda para a frota não bater no Docker e no backend no mesmo instante.
+SESSION_TICK = float(os.getenv("SESSION_TICK", "15"))
+SESSION_JITTER = float(os.getenv("SESSION_JITTER", "120"))
+SESSION_DEFAULT_TZ = os.getenv("SESSION_DEFAULT_TZ", "America/Sao_Paulo")
+
+_tarefa = None
+
+
+def _slot(user_id: int, brokerage_id: int) -> timedelta:
+    """Atraso fixo do bot dentro do jitter (o mesmo em todas as bordas e restarts)."""
+    bruto = hashlib.sha1(f"{user_id}:{brokerage_id}".encode()).digest()
+    return timedelta(seconds=int.from_bytes(bruto[:4], "big") / 2 ** 32 * SESSION_JITTER)
+
+
+def _horario(dia, hhmm: str, fuso) -> datetime:
+    hora, minuto = map(int, hhmm.split(":"))
+    return datetime(dia.year, dia.month, dia.day, hora, minuto, tzinfo=fuso)
+
+
+def eventos(sessao: dict, agora: float) -> list[tuple[str, str]]:
+    """Bordas vencidas para a sessão no instante agora: [(evento, dia da janela)]."""
+    fuso = ZoneInfo(sessao["fuso"])
+    local = datetime.fromtimestamp(agora, fuso)
+    atraso = _slot(sessao["user_id"], sessao["brokerage_id"])
+    vencidos = []
+
+    if not sessao["inicio"] or not sessao["fim"]:
+        if sessao["reset_diario"] and local >= _horario(local.date(), "00:00", fuso) + atraso:
+            vencidos.append(("reset", local.date().isoformat()))
+        return vencidos
+
+    # janela de ontem ainda pode estar aberta (ex.: 22:00-02:00) ou com o fim pendente
+    for dia in (local.date() - timedelta(days=1), local.date()):
+        if str(dia.weekday()) not in sessao["dias"]:
+            continue
+        inicio = _horario(dia, sessao["inicio"], fuso)
+        fim = _horario(dia, sessao["fim"], fuso)
+        if fim <= inicio:
+            fim += timedelta(days=1)
+        if inicio + atraso <= local < fim:
+            vencidos.append(("start", dia.isoformat()))
+        elif local >= fim + atraso:
+            vencidos.append(("stop", dia.isoformat()))
+    return vencidos
+
+
+def hoje(fuso: str) -> str:
+    return datetime.now(ZoneInfo(fuso)).date().isoformat()
+
+
+async def verificar(executar):
+    """
+    Uma passada: junta as bordas vencidas e ainda não executadas e manda cada tipo
+    de ação num lote só (executar(acao, [(user_id, brokerage_id)]) com concorrência limitada).
+    """
+    agora = time.time()
+    lotes = {}
+    feitos = []
+    for sessao in estado.sessoes():
+        user_id, brokerage_id = sessao["user_id"], sessao["brokerage_id"]
+        pendentes = [(evento, dia) for evento, dia in eventos(sessao, agora)
+                     if not estado.disparado(user_id, brokerage_id, evento, dia)]
+        if not pendentes:
+            continue
+        # várias bordas atrasadas (orquestrador fora do ar): só a mais recente vale
+        feitos += [(user_id, brokerage_id, evento, dia) for evento, dia in pendentes]
+        lotes.setdefault(pendentes[-1][0], []).append((user_id, brokerage_id))
+
+    # marca antes de executar: uma falha não vira uma sequência de starts/stops repetidos
+    if feitos:
+        estado.marcar_disparos(feitos)
+    for evento, bots in lotes.items():
+        print(f"🗓️ Sessões: {evento} para {len(bots)} bot(s)")
+        async for _ in executar(evento, bots):
+            pass
+
+
+async def _loop(executar):
+    while True:
+        try:
+            await verificar(executar)
+        except Exception as e:
+            print(f"⚠️ Erro na agenda de sessões: {e}")
+        await asyncio.sleep(SESSION_TICK)
+
+
+def iniciar(executar):
+    """Inicia a agenda de sessões em segundo plano."""
+    global _tarefa
+    if _tarefa is None or _tarefa.done():
+        _tarefa = asyncio.create_task(_loop(executar))
+    return _tarefa
@@ -0,0 +1,35 @@
+import os
+import time
+import asyncio
+
+# Relógio do worker. Em produção é o relógio real. No replay de gravações
+# (benchmarks/replay.py) o tempo é virtual: vale RELOGIO_INICIO (início da gravação)
+# no instante real RELOGIO_ORIGEM e corre RELOGIO_ESCALA vezes mais rápido. Esperas de
+# horário e de expiração encolhem na mesma proporção; o replayer usa as mesmas três
+# variáveis para publicar cada sinal no instante virtual em que foi gravado.
+RELOGIO_INICIO = float(os.getenv("RELOGIO_INICIO", "0"))
+RELOGIO_ORIGEM = float(os.getenv("RELOGIO_ORIGEM", "0")) or time.time()
+VIRTUAL = RELOGIO_INICIO > 0
+ESCALA = float(os.getenv("RELOGIO_ESCALA", "1")) if VIRTUAL else 1.0
+
+
+def agora() -> float:
+    """Epoch atual (virtual durante o replay)."""
+    if not VIRTUAL:
+        return time.time()
+    return RELOGIO_INICIO + (time.time() - RELOGIO_ORIGEM) * ESCALA
+
+
+def monotonico() -> float:
+    """Para medir idades/intervalos na mesma escala das esperas."""
+    return agora() if VIRTUAL else time.monotonic()
+
+
+def real(segundos: float) -> float:
+    """Duração virtual convertida em segundos reais (latências reportadas)."""
+    return segundos / ESCALA
+
+
+async def dormir(segundos: float):
+    if segundos > 0:
+        await asyncio.sleep(segundos / ESCALA)
@@ -0,0 +1,247 @@
+import os
+import json
+import time
+import itertools
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Backtest das opções do bot (entry_price, gales, stop_win/stop_loss) sobre os sinais
+# gravados pelos publishers (SIGNAL_TAP_PATH). O histórico vira arrays NumPy e cada
+# bloco de combinações é simulado de uma vez, sem laço por sinal:
+#   - escada de gales como nos workers: xofre entra com E, 2E, 4E (teto de 1000 por
+#     ordem) e cada gale só depois da etapa anterior perdida; home_broker usa
+#     gale_one_value/gale_two_value e, como o worker, opera o gale 2 sempre que a
+#     entrada perdeu (mesmo com o gale 1 ganho ou desligado); avalon/polarium sem gales
+#   - gale 2 do home_broker depois de um gale 1 ganho não tem resultado publicado (o
+#     canal já fechou o call): conta como LOSS, o pior caso da exposição
+#   - cada resultado publicado depois de um sinal fecha a próxima etapa dele
+#     (WIN/LOSS da entrada, depois do gale 1, do gale 2); etapa sem resultado não opera
+#   - totais e stop como no settle_trade_order/decide_stop: win_value soma o lucro dos
+#     ganhos, loss_value o valor das perdas; ao atingir o stop o bot para até o reset
+#     diário (dia de Brasília)
+BACKTEST_SIGNALS_PATH = os.getenv("BACKTEST_SIGNALS_PATH", "sinais.jsonl")
+BACKTEST_PAYOUT = float(os.getenv("BACKTEST_PAYOUT", "0.8"))
+BACKTEST_MAX_COMBINATIONS = int(os.getenv("BACKTEST_MAX_COMBINATIONS", "200000"))
+# combinações simuladas por vez (memória ~ bloco × 3 × sinais × 8 bytes por array)
+BACKTEST_BLOCK = int(os.getenv("BACKTEST_BLOCK", "1024"))
+
+TZ_BRASILIA = ZoneInfo("America/Sao_Paulo")
+VALOR_MAXIMO_ORDEM = 1000  # xofre: tentar_ordem_com_inversao limita cada ordem
+
+# corretora -> exchange topic de onde vêm os sinais que o worker consome
+EXCHANGES = {
+    "xofre": "xofre_signals.topic",
+    "home_broker": "xofre_signals.topic",
+    "avalon": "avalon_signals.topic",
+    "polarium": "polarium_signals.topic",
+}
+PARAMETROS = ("entry_price", "gale_one", "gale_two", "gale_one_value", "gale_two_value", "stop_win", "stop_loss")
+# parâmetros que não mudam nada na simulação de cada corretora (não multiplicam a grade)
+IGNORADOS = {
+    "xofre": ("gale_one_value", "gale_two_value"),
+    "home_broker": ("gale_one", "gale_two"),
+    "avalon": ("gale_one", "gale_two", "gale_one_value", "gale_two_value"),
+    "polarium": ("gale_one", "gale_two", "gale_one_value", "gale_two_value"),
+}
+TIPOS_SINAL = ("signal_confirmed", "entry")
+DESCONHECIDO, LOSS, WIN = -1, 0, 1
+
+_cache = {}
+
+
+def historico(caminho: str, exchange: str, desde: str | None = None, ate: str | None = None) -> dict:
+    """
+    Sinais do exchange na gravação, como arrays:
+      dia[N]          índice do dia (Brasília) de cada sinal, para o reset diário
+      resultado[N,3]  WIN/LOSS/DESCONHECIDO da entrada, gale 1 e gale 2
+      etapas[N,3]     etapa existe no sinal (gale sem horário não é executado)
+    Relido só quando o arquivo muda.
+    """
+    import numpy as np
+    chave = (caminho, exchange, desde, ate)
+    mtime = os.path.getmtime(caminho)
+    if chave in _cache and _cache[chave][0] == mtime:
+        return _cache[chave][1]
+
+    sinais = []  # [data, [resultados], [etapas]]
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            try:
+                evento = json.loads(linha)
+            except json.JSONDecodeError:
+                continue
+            if evento.get("ex") != exchange:
+                continue
+            payload = evento.get("p") or {}
+            tipo = payload.get("type")
+            if tipo in TIPOS_SINAL:
+                data = datetime.fromtimestamp(evento["t"], TZ_BRASILIA).date().isoformat()
+                if (desde and data < desde) or (ate and data > ate):
+                    sinais.append(None)  # fora do período: resultados seguintes são descartados
+                    continue
+                agendado = tipo == "signal_confirmed"
+                sinais.append([data, [], [True, agendado and bool(payload.get("gale1")),
+                                          agendado and bool(payload.get("gale2"))]])
+            elif tipo == "result" and sinais and sinais[-1] is not None and len(sinais[-1][1]) < 3:
+                sinais[-1][1].append(WIN if payload.get("result") == "WIN" else LOSS)
+    sinais = [s for s in sinais if s is not None]
+
+    n = len(sinais)
+    resultado = np.full((n, 3), DESCONHECIDO, dtype=np.int8)
+    etapas = np.zeros((n, 3), dtype=bool)
+    datas = sorted({s[0] for s in sinais})
+    indice = {d: i for i, d in enumerate(datas)}
+    dia = np.array([indice[s[0]] for s in sinais], dtype=np.int32)
+    for i, (_, resultados, existe) in enumerate(sinais):
+        resultado[i, :len(resultados)] = resultados
+        etapas[i] = existe
+
+    hist = {"dia": dia, "resultado": resultado, "etapas": etapas, "datas": datas}
+    _cache[chave] = (mtime, hist)
+    return hist
+
+
+def grade(corretora: str, valores: dict) -> dict:
+    """Produto cartesiano das listas de cada parâmetro (um valor fixo vira lista de um)."""
+    import numpy as np
+    listas = []
+    for nome in PARAMETROS:
+        lista = valores.get(nome)
+        if not isinstance(lista, (list, tuple)):
+            lista = [lista]
+        if nome in IGNORADOS[corretora]:
+            lista = lista[:1]
+        listas.append(lista)
+    total = 1
+    for lista in listas:
+        total *= len(lista)
+    if total > BACKTEST_MAX_COMBINATIONS:
+        raise ValueError(f"{total} combinações (máximo {BACKTEST_MAX_COMBINATIONS})")
+    colunas = zip(*itertools.product(*listas)) if total else [[] for _ in PARAMETROS]
+    return {nome: np.array(coluna, dtype=float) for nome, coluna in zip(PARAMETROS, colunas)}
+
+
+def _por_dia(acumulado, inicio_dia):
+    """Acumulado ao longo de todas as etapas -> acumulado dentro do dia de cada etapa."""
+    import numpy as np
+    com_zero = np.concatenate([np.zeros((acumulado.shape[0], 1)), acumulado], axis=1)
+    return acumulado - com_zero[:, inicio_dia]
+
+
+def simular(hist: dict, combos: dict, corretora: str, payout: float) -> dict:
+    """Métricas de cada combinação (arrays de tamanho C), em blocos de BACKTEST_BLOCK."""
+    import numpy as np
+    n = len(hist["dia"])
+    total = len(combos["entry_price"])
+    metricas = {nome: np.zeros(total) for nome in
+                ("profit", "orders", "wins", "losses", "max_drawdown", "stop_win_days", "stop_loss_days")}
+    if not n or not total:
+        return metricas
+
+    resultado = hist["resultado"]
+    if corretora == "home_broker":
+        resultado = resultado.copy()
+        resultado[(resultado[:, 2] == DESCONHECIDO) & (resultado[:, 1] == WIN), 2] = LOSS
+    resultado = resultado.reshape(1, n * 3)
+    existe = hist["etapas"].reshape(1, n * 3)
+    # posição (na sequência achatada de etapas) onde começa o dia de cada etapa
+    dia = np.repeat(hist["dia"], 3)
+    primeiras = np.flatnonzero(np.r_[True, dia[1:] != dia[:-1]])
+    inicio_dia = primeiras[np.searchsorted(primeiras, np.arange(n * 3), side="right") - 1]
+
+    for a in range(0, total, BACKTEST_BLOCK):
+        b = min(a + BACKTEST_BLOCK, total)
+        c = {nome: v[a:b, None] for nome, v in combos.items()}
+        entrada = c["entry_price"]
+        if corretora == "xofre":
+            valores = np.minimum(np.hstack([entrada, entrada * 2, entrada * 4]), VALOR_MAXIMO_ORDEM)
+            habilitada = np.hstack([np.ones_like(entrada), c["gale_one"], c["gale_two"]]) > 0
+        elif corretora == "home_broker":
+            valores = np.hstack([entrada, c["gale_one_value"], c["gale_two_value"]])
+            habilitada = valores > 0
+        else:
+            valores = np.hstack([entrada, np.zeros_like(entrada), np.zeros_like(entrada)])
+            habilitada = valores > 0
+            habilitada[:, 1:] = False
+        blocos = b - a
+
+        # etapa executada: etapa que a dispara perdida, gale habilitado, etapa no sinal e
+        # resultado conhecido (no home_broker o gale 2 é disparado pela entrada, não pelo gale 1)
+        executada = np.empty((blocos, n, 3), dtype=bool)
+        r = resultado.reshape(1, n, 3)
+        pode = existe.reshape(1, n, 3) & (r != DESCONHECIDO)
+        executada[:, :, 0] = pode[:, :, 0]
+        for k in (1, 2):
+            dispara = 0 if corretora == "home_broker" else k - 1
+            executada[:, :, k] = executada[:, :, dispara] & (r[:, :, dispara] == LOSS) & pode[:, :, k] & habilitada[:, k, None]
+        executada = executada.reshape(blocos, n * 3)
+
+        valor = np.tile(valores, n)
+        ganho = np.where(executada & (resultado == WIN), valor * payout, 0.0)
+        perda = np.where(executada & (resultado == LOSS), valor, 0.0)
+
+        win_dia = _por_dia(np.cumsum(ganho, axis=1), inicio_dia)
+        loss_dia = _por_dia(np.cumsum(perda, axis=1), inicio_dia)
+        # tolerância: a subtração do acumulado do dia anterior deixa resíduo de ponto flutuante
+        por_win = win_dia >= c["stop_win"] - 1e-6
+        atingiu = por_win | (loss_dia >= c["stop_loss"] - 1e-6)
+        # etapa vale se nenhum stop foi atingido antes dela no mesmo dia
+        antes = _por_dia(np.cumsum(atingiu, axis=1, dtype=float), inicio_dia) - atingiu
+        valida = antes == 0
+        primeira = atingiu & valida
+
+        ganho *= valida
+        perda *= valida
+        saldo = np.cumsum(ganho - perda, axis=1)
+        pico = np.maximum.accumulate(np.maximum(saldo, 0), axis=1)
+        metricas["profit"][a:b] = saldo[:, -1]
+        metricas["orders"][a:b] = (executada & valida).sum(axis=1)
+        metricas["wins"][a:b] = (ganho > 0).sum(axis=1)
+        metricas["losses"][a:b] = (perda > 0).sum(axis=1)
+        metricas["max_drawdown"][a:b] = (pico - saldo).max(axis=1)
+        metricas["stop_win_days"][a:b] = (primeira & por_win).sum(axis=1)
+        metricas["stop_loss_days"][a:b] = (primeira & ~por_win).sum(axis=1)
+    return metricas
+
+
+ORDENACOES = ("profit", "max_drawdown", "wins", "stop_loss_days")
+
+
+def avaliar(corretora: str, valores: dict, payout: float = BACKTEST_PAYOUT, desde: str | None = None,
+            ate: str | None = None, top: int = 20, ordenar: str = "profit", caminho: str | None = None) -> dict:
+    """Roda a grade inteira e devolve as `top` melhores combinações pela métrica escolhida."""
+    import numpy as np
+    inicio = time.perf_counter()
+    hist = historico(caminho or BACKTEST_SIGNALS_PATH, EXCHANGES[corretora], desde, ate)
+    combos = grade(corretora, valores)
+    if any(np.any(combos[nome] <= 0) for nome in ("entry_price", "stop_win", "stop_loss")):
+        raise ValueError("entry_price, stop_win e stop_loss precisam ser maiores que zero")
+    metricas = simular(hist, combos, corretora, payout)
+
+    chave = metricas[ordenar]
+    # drawdown e dias de stop loss: menor é melhor
+    ordem = np.argsort(chave if ordenar in ("max_drawdown", "stop_loss_days") else -chave, kind="stable")[:top]
+    melhores = []
+    for i in ordem:
+        parametros = {nome: _valor(nome, combos[nome][i]) for nome in PARAMETROS if nome not in IGNORADOS[corretora]}
+        melhores.append({**parametros, **{nome: _valor(nome, v[i]) for nome, v in metricas.items()}})
+
+    decorrido = time.perf_counter() - inicio
+    total = len(combos["entry_price"])
+    return {
+        "brokerage": corretora,
+        "signals": int(len(hist["dia"])),
+        "days": hist["datas"],
+        "combinations": total,
+        "elapsed_ms": round(decorrido * 1000),
+        "combinations_per_second": round(total / decorrido) if decorrido else None,
+        "results": melhores,
+    }
+
+
+def _valor(nome: str, v):
+    if nome in ("gale_one", "gale_two"):
+        return bool(v)
+    if nome in ("orders", "wins", "losses", "stop_win_days", "stop_loss_days"):
+        return int(v)
+    return round(float(v), 2)
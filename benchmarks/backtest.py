@@ -0,0 +1,72 @@
+"""
+Vazão do backtest vetorizado (backtest.py): combinações simuladas por segundo sobre
+uma gravação sintética de sinais (ou uma gravação real com --gravacao).
+
+Uso:
+    python benchmarks/backtest.py --sinais 2000 --dias 5
+    python benchmarks/backtest.py --gravacao sinais.jsonl --corretora home_broker
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import backtest  # noqa: E402
+
+INICIO = 1760000000.0
+
+
+def gerar(caminho: str, sinais: int, dias: int, taxa_win: float, exchange: str):
+    """Sinais agendados com entrada/gales e um resultado por etapa até o primeiro WIN."""
+    intervalo = dias * 86400 / sinais
+    with open(caminho, "w", encoding="utf-8") as f:
+        for n in range(sinais):
+            t = INICIO + n * intervalo
+            payload = {"type": "signal_confirmed", "symbol": "EURUSD", "direction": "BUY", "expiration": "01:00",
+                       "entry_time": "10:00", "gale1": "10:01", "gale2": "10:02"}
+            f.write(json.dumps({"t": t, "ex": exchange, "rk": "signal_confirmed.xofre.EURUSD._", "p": payload}) + "\n")
+            for etapa in range(3):
+                ganhou = random.random() < taxa_win
+                resultado = {"type": "result", "result": "WIN" if ganhou else "LOSS"}
+                f.write(json.dumps({"t": t + 60 * (etapa + 1), "ex": exchange, "rk": "result.xofre._._",
+                                    "p": resultado}) + "\n")
+                if ganhou:
+                    break
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gravacao", help="JSONL gravado pelos publishers (padrão: sintético)")
+    parser.add_argument("--corretora", choices=list(backtest.EXCHANGES), default="xofre")
+    parser.add_argument("--sinais", type=int, default=1000)
+    parser.add_argument("--dias", type=int, default=3)
+    parser.add_argument("--taxa-win", type=float, default=0.6)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(0)
+    caminho = args.gravacao
+    if not caminho:
+        caminho = os.path.join(tempfile.mkdtemp(prefix="backtest_"), "sinais.jsonl")
+        gerar(caminho, args.sinais, args.dias, args.taxa_win, backtest.EXCHANGES[args.corretora])
+
+    valores = {
+        "entry_price": [1, 2, 5, 10, 20, 50],
+        "gale_one": [True, False], "gale_two": [True, False],
+        "gale_one_value": [0, 5, 10, 20, 40], "gale_two_value": [0, 10, 20, 40, 80],
+        "stop_win": [10, 20, 50, 100, 200, 500], "stop_loss": [10, 20, 50, 100, 200, 500],
+    }
+    melhores = []
+    for _ in range(args.repeticoes):
+        r = backtest.avaliar(args.corretora, valores, caminho=caminho, top=1)
+        melhores.append(r["combinations_per_second"])
+    print(f"{args.corretora}: {r['signals']} sinais em {len(r['days'])} dia(s), {r['combinations']} combinações")
+    print(f"melhor de {args.repeticoes}: {max(melhores)} combinações/s ({r['elapsed_ms']} ms na última)")
+    print(f"topo: {r['results'][0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Perfil de import do caminho de startup dos workers (python -X importtime).
+
+Importa o main.py de cada worker com -X importtime, mostra os módulos mais caros
+e falha (exit 1) se algum módulo adiado aparecer no startup ou se o total passar
+do orçamento. Serve como checagem de regressão do tempo até consumir a fila.
+
+Uso:
+    python benchmarks/importtime.py                       # todos os workers, interpretador atual
+    python benchmarks/importtime.py xofre --budget-ms 400
+    docker run --rm xofre_bot python -X importtime -c "import main" 2>&1 | python benchmarks/importtime.py --stdin
+"""
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKERS = ["avalon", "polarium", "xofre", "home_broker"]
+
+# Módulos que só devem ser carregados depois que o worker já está consumindo
+DEFERRED = ("aiohttp", "dotenv", "pytz", "api")
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse(report: str):
+    """Retorna [(modulo, self_us, cumulative_us, nivel)] na ordem do relatório."""
+    rows = []
+    for line in report.splitlines():
+        m = LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    return rows
+
+
+def importtime(worker: str, python: str):
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    proc = subprocess.run(
+        [python, "-X", "importtime", "-c", "import main"],
+        cwd=os.path.join(ROOT, worker), env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import main falhou em {worker}:\n{proc.stderr[-2000:]}")
+    return proc.stderr
+
+
+def checar(nome: str, report: str, budget_ms: float, top: int):
+    rows = parse(report)
+    total_us = sum(r[1] for r in rows)
+    adiados = sorted({r[0] for r in rows if r[0].split(".")[0] in DEFERRED})
+
+    print(f"\n=== {nome}: {total_us / 1000:.1f} ms em {len(rows)} módulos ===")
+    for modulo, self_us, cum_us, nivel in sorted((r for r in rows if r[3] == 1), key=lambda r: -r[2])[:top]:
+        print(f"  {cum_us / 1000:8.1f} ms  {modulo}")
+
+    ok = True
+    if adiados:
+        print(f"  ❌ módulos adiados carregados no startup: {', '.join(adiados)}")
+        ok = False
+    if budget_ms and total_us / 1000 > budget_ms:
+        print(f"  ❌ acima do orçamento de {budget_ms:.0f} ms")
+        ok = False
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("workers", nargs="*", default=WORKERS)
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--budget-ms", type=float, default=0, help="falha se o import total passar disso")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--stdin", action="store_true", help="lê um relatório -X importtime da entrada padrão")
+    args = parser.parse_args()
+
+    if args.stdin:
+        ok = checar("stdin", sys.stdin.read(), args.budget_ms, args.top)
+    else:
+        ok = all([checar(w, importtime(w, args.python), args.budget_ms, args.top) for w in args.workers])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
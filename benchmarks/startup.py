@@ -0,0 +1,80 @@
+"""
+Benchmark de inicialização das imagens de bot.
+
+Mede, para cada imagem de corretora, o tempo entre criar o container e o worker
+ficar pronto para o primeiro sinal (log "aguardando sinais" após conectar no RabbitMQ).
+
+Uso:
+    python benchmarks/startup.py --runs 5
+    python benchmarks/startup.py --images xofre_bot:latest avalon_bot:latest --network botnet
+"""
+import os
+import re
+import time
+import argparse
+import statistics
+import docker
+
+IMAGES = ["xofre_bot:latest", "polarium_bot:latest", "avalon_bot:latest", "new_bot:latest"]
+READY_PATTERN = re.compile(r"aguardando sinais", re.IGNORECASE)
+
+
+def medir(client, image: str, network: str, env: dict, timeout: float):
+    """Retorna (create_s, start_s, ready_s) ou None se o worker não ficar pronto no prazo."""
+    name = f"startup_bench_{int(time.time() * 1000)}"
+    t0 = time.perf_counter()
+    container = client.containers.create(image=image, name=name, detach=True, environment=env, network=network)
+    t_create = time.perf_counter()
+    try:
+        container.start()
+        t_start = time.perf_counter()
+        for line in container.logs(stream=True, follow=True):
+            if READY_PATTERN.search(line.decode(errors="ignore")):
+                return t_create - t0, t_start - t0, time.perf_counter() - t0
+            if time.perf_counter() - t0 > timeout:
+                break
+        return None
+    finally:
+        container.remove(force=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", nargs="+", default=IMAGES)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--network", default=os.getenv("DOCKER_NETWORK", "botnet"))
+    parser.add_argument("--rabbitmq-host", default="rabbitmq")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    client = docker.from_env()
+    env = {
+        "USER_ID": "0",
+        "BROKERAGE_ID": "0",
+        "RABBITMQ_HOST": args.rabbitmq_host,
+        "RABBITMQ_USER": os.getenv("RABBITMQ_USER", ""),
+        "RABBITMQ_PASS": os.getenv("RABBITMQ_PASS", ""),
+    }
+
+    print(f"{'imagem':<22} {'tam(MB)':>8} {'create':>8} {'start':>8} {'pronto p50':>11} {'pronto max':>11} {'falhas':>7}")
+    for image in args.images:
+        size_mb = client.images.get(image).attrs["Size"] / 1e6
+        amostras, falhas = [], 0
+        for _ in range(args.runs):
+            r = medir(client, image, args.network, env, args.timeout)
+            if r is None:
+                falhas += 1
+            else:
+                amostras.append(r)
+        if not amostras:
+            print(f"{image:<22} {size_mb:>8.0f} {'-':>8} {'-':>8} {'-':>11} {'-':>11} {falhas:>7}")
+            continue
+        create = statistics.median(a[0] for a in amostras)
+        start = statistics.median(a[1] for a in amostras)
+        ready = [a[2] for a in amostras]
+        print(f"{image:<22} {size_mb:>8.0f} {create:>7.2f}s {start:>7.2f}s "
+              f"{statistics.median(ready):>10.2f}s {max(ready):>10.2f}s {falhas:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Stubs locais das APIs externas para os testes de carga e de replay (benchmarks/carga.py,
+benchmarks/replay.py).
+
+Um único servidor aiohttp com um prefixo por serviço; os workers apontam para ele
+pelas variáveis de base de URL:
+
+    /backend     -> api.multitradingob.com            (BACKEND_URL)
+    /avalon      -> avalon_api:3001                   (AVALON_API_URL)
+    /polarium    -> polarium_api:3002                 (POLARIUM_API_URL)
+    /xofre       -> broker-api.mybroker.dev           (XOFRE_API_URL)
+    /hb-edge     -> trade-api-edge.homebroker.com     (HB_EDGE_URL)
+    /hb-account  -> bot-account-manager-api.homebroker.com (HB_ACCOUNT_URL)
+    /hb-trade    -> bot-trade-api.homebroker.com      (HB_TRADE_URL)
+
+Latência (média ± jitter) e resultados são configuráveis; cada chamada relevante é
+registrada com o horário para o relatório (ordens, criação e liquidação no backend).
+
+Uso isolado (testes manuais de um worker):
+    python benchmarks/stubs.py --porta 9000 --latencia-backend 80 --latencia-corretora 150 --taxa-loss 0.3
+"""
+import json
+import time
+import base64
+import random
+import asyncio
+import argparse
+import itertools
+from aiohttp import web
+
+config = {
+    "latencia_backend": 50.0,    # ms
+    "latencia_corretora": 100.0,  # ms
+    "jitter": 0.3,               # fração da latência, para mais ou para menos
+    "taxa_erro": 0.0,            # fração das ordens recusadas (HTTP 500)
+    "taxa_loss": 0.3,            # sem plano do injetor: chance de LOSS em cada ordem
+    "duracao": 5.0,              # s até o resultado de uma ordem ficar disponível (xofre/HB)
+    "payout": 0.8,
+    "saldo_inicial": 10000.0,
+}
+
+# opções de bot devolvidas pelo backend (por usuário; win/loss acumulam como no real)
+opcoes_base = {
+    "bot_status": 1, "entry_price": 5, "is_demo": True, "is_auto": True,
+    "gale_one": True, "gale_two": True, "gale_one_value": 10, "gale_two_value": 20,
+    "stop_win": 10 ** 9, "stop_loss": 10 ** 9, "symbols": [], "timeframes": [],
+}
+opcoes = {}
+simbolos = []
+# resultado de cada etapa (entrada, gale 1, gale 2) por símbolo, definido pelo injetor
+planos = {}
+
+# registros para o relatório
+ordens = []        # {"corretora", "usuario", "symbol", "id", "etapa", "t"}
+criadas = {}       # order_id -> {"user_id", "symbol", "t"}
+liquidadas = {}    # order_id -> {"status", "t"}
+prontas = {}       # id da ordem na corretora -> t em que o resultado ficou disponível
+
+_saldos = {}
+_abertas = {}      # símbolo -> [(email, valor)] (avalon/polarium: liquidadas pelo injetor)
+_trades = {}       # id -> {"valor", "resultado", "pronto_em"} (xofre/HB)
+_etapas = {}       # (corretora, usuário, símbolo) -> ordens já recebidas
+_ids = itertools.count(1)
+
+
+async def _atraso(tipo: str):
+    media = config[f"latencia_{tipo}"] / 1000
+    if media > 0:
+        await asyncio.sleep(max(0.0, random.uniform(1 - config["jitter"], 1 + config["jitter"]) * media))
+
+
+def _falhar() -> bool:
+    return random.random() < config["taxa_erro"]
+
+
+def _resultado(symbol: str, etapa: int) -> str:
+    plano = planos.get(symbol)
+    if plano:
+        return plano[min(etapa, len(plano) - 1)]
+    return "LOSS" if random.random() < config["taxa_loss"] else "WIN"
+
+
+def _registrar_ordem(corretora: str, usuario: str, symbol: str) -> tuple[str, int]:
+    ordem_id = f"{corretora}-{next(_ids)}"
+    etapa = _etapas.get((corretora, usuario, symbol), 0)
+    _etapas[(corretora, usuario, symbol)] = etapa + 1
+    ordens.append({"corretora": corretora, "usuario": usuario, "symbol": symbol, "id": ordem_id,
+                   "etapa": etapa, "t": time.time()})
+    return ordem_id, etapa
+
+
+def liquidar_simbolo(symbol: str, resultado: str):
+    """Avalon/polarium: o resultado chega pelo canal; o saldo das ordens abertas acompanha."""
+    for email, valor in _abertas.pop(symbol, []):
+        if resultado == "WIN":
+            _saldos[email] = _saldos.get(email, config["saldo_inicial"]) + valor * (1 + config["payout"])
+
+
+def liquidar_abertas(resultado: str):
+    """Como liquidar_simbolo para todas as ordens abertas (resultados gravados não trazem o ativo)."""
+    for symbol in list(_abertas):
+        liquidar_simbolo(symbol, resultado)
+
+
+# --------- backend (api.multitradingob.com) ---------
+
+async def bot_options(request):
+    await _atraso("backend")
+    user_id = request.match_info["user_id"]
+    dados = opcoes.setdefault(user_id, {**opcoes_base, "win_value": 0, "loss_value": 0})
+    if request.method == "PUT":
+        dados.update(await request.json())
+    return web.json_response(dados)
+
+
+async def user_brokerages(request):
+    await _atraso("backend")
+    return web.json_response({"brokerage_username": "", "brokerage_password": ""})
+
+
+async def criar_trade_order(request):
+    await _atraso("backend")
+    dados = await request.json()
+    criadas.setdefault(str(dados["order_id"]), {"user_id": str(dados["user_id"]), "symbol": dados["symbol"], "t": time.time()})
+    return web.json_response(dados)
+
+
+async def atualizar_trade_order(request):
+    await _atraso("backend")
+    dados = await request.json()
+    liquidadas.setdefault(request.match_info["order_id"], {"status": dados.get("status"), "t": time.time()})
+    return web.json_response(dados)
+
+
+# --------- avalon_api / polarium_api ---------
+
+def _digital(corretora: str):
+    async def saldo(request):
+        await _atraso("corretora")
+        email = (await request.json()).get("email")
+        valor = _saldos.setdefault(email, config["saldo_inicial"])
+        return web.json_response({"balances": [{"type": "demo", "amount": valor}, {"type": "real", "amount": valor}]})
+
+    async def comprar(request):
+        await _atraso("corretora")
+        dados = await request.json()
+        if _falhar():
+            return web.json_response({"message": "erro simulado"}, status=500)
+        email, symbol, valor = dados.get("email"), dados.get("assetName"), float(dados.get("operationValue", 0))
+        ordem_id, _ = _registrar_ordem(corretora, email, symbol)
+        _saldos[email] = _saldos.get(email, config["saldo_inicial"]) - valor
+        _abertas.setdefault(symbol, []).append((email, valor))
+        return web.json_response({"message": "ok", "order": {"id": ordem_id}}, status=201)
+
+    return saldo, comprar
+
+
+async def ativos(request):
+    await _atraso("corretora")
+    return web.json_response({"data": [{"symbol": s, "is_open": True} for s in simbolos]})
+
+
+# --------- mybroker.dev (xofre) ---------
+
+def _novo_trade(ordem_id: str, valor: float, resultado: str):
+    pronto_em = time.time() + config["duracao"]
+    _trades[ordem_id] = {"valor": valor, "resultado": resultado, "pronto_em": pronto_em}
+    prontas[ordem_id] = pronto_em
+
+
+async def xofre_abrir(request):
+    await _atraso("corretora")
+    dados = await request.json()
+    if _falhar():
+        return web.json_response({"message": "erro simulado"}, status=500)
+    ordem_id, etapa = _registrar_ordem("xofre", request.headers.get("api-token", ""), dados["symbol"])
+    _novo_trade(ordem_id, float(dados["amount"]), _resultado(dados["symbol"], etapa))
+    return web.json_response({"id": ordem_id, "result": "OPEN", "openPrice": 1.0})
+
+
+async def xofre_trade(request):
+    await _atraso("corretora")
+    trade = _trades.get(request.match_info["id"])
+    if trade is None:
+        return web.json_response({}, status=404)
+    if time.time() < trade["pronto_em"]:
+        return web.json_response({"id": request.match_info["id"], "result": "OPEN"})
+    ganhou = trade["resultado"] == "WIN"
+    pnl = round(trade["valor"] * config["payout"], 2) if ganhou else -trade["valor"]
+    return web.json_response({"id": request.match_info["id"], "result": "WON" if ganhou else "LOST", "pnl": pnl})
+
+
+# --------- Home Broker ---------
+
+def _jwt(usuario: str) -> str:
+    def parte(dados):
+        return base64.urlsafe_b64encode(json.dumps(dados).encode()).decode().rstrip("=")
+    return f"{parte({'alg': 'none'})}.{parte({'sub': usuario, 'exp': time.time() + 3600})}.x"
+
+
+def _usuario_hb(request) -> str:
+    try:
+        corpo = request.headers.get("Authorization", "").split(" ", 1)[1].split(".")[1]
+        return json.loads(base64.urlsafe_b64decode(corpo + "=" * (-len(corpo) % 4)))["sub"]
+    except Exception:
+        return ""
+
+
+async def hb_login(request):
+    await _atraso("corretora")
+    usuario = (await request.json()).get("username", "")
+    return web.json_response({"access_token": _jwt(usuario), "refresh_token": "refresh"})
+
+
+async def hb_abrir(request):
+    await _atraso("corretora")
+    dados = await request.json()
+    if _falhar():
+        return web.json_response({"message": "erro simulado"}, status=500)
+    ordem_id, etapa = _registrar_ordem("home_broker", _usuario_hb(request), dados["ticker_symbol"])
+    _novo_trade(ordem_id, dados["bet_value_usd_cents"] / 100, _resultado(dados["ticker_symbol"], etapa))
+    return web.json_response({"id": ordem_id})
+
+
+async def hb_trade(request):
+    await _atraso("corretora")
+    trade = _trades.get(request.match_info["id"])
+    if trade is None:
+        return web.json_response({}, status=404)
+    if time.time() < trade["pronto_em"]:
+        return web.json_response({"result": "Open"})
+    ganhou = trade["resultado"] == "WIN"
+    lucro = trade["valor"] * config["payout"] if ganhou else -trade["valor"]
+    return web.json_response({"result": "Gain" if ganhou else "Loss", "profit_usd_cents": int(lucro * 100)})
+
+
+async def qualquer(request):
+    """HEAD/GET na raiz: aquecimento de conexão dos workers (conexao.aquecer)."""
+    return web.Response(text="ok")
+
+
+def criar_app() -> web.Application:
+    app = web.Application()
+    rotas = [
+        web.route("*", "/", qualquer),
+        web.get("/backend/bot-options/admin/{user_id}/{brokerage_id}", bot_options),
+        web.put("/backend/bot-options/admin/{user_id}/{brokerage_id}", bot_options),
+        web.get("/backend/user-brokerages/admin/{user_id}/{brokerage_id}", user_brokerages),
+        web.post("/backend/trade-order-info", criar_trade_order),
+        web.put("/backend/trade-order-info/{order_id}", atualizar_trade_order),
+        web.get("/xofre/token/assets", ativos),
+        web.post("/xofre/token/trades/open", xofre_abrir),
+        web.get("/xofre/token/trades/{id}", xofre_trade),
+        web.post("/hb-account/v3/login", hb_login),
+        web.get("/hb-edge/assets", ativos),
+        web.post("/hb-edge/op", hb_abrir),
+        web.get("/hb-trade/op/get/{id}", hb_trade),
+    ]
+    for corretora in ("avalon", "polarium"):
+        saldo, comprar = _digital(corretora)
+        rotas += [
+            web.post(f"/{corretora}/api/account/balance", saldo),
+            web.post(f"/{corretora}/api/trade/digital/buy", comprar),
+            web.get(f"/{corretora}/api/assets", ativos),
+            web.post(f"/{corretora}/api/assets", ativos),
+        ]
+    app.add_routes(rotas)
+    return app
+
+
+def variaveis(base: str) -> dict:
+    """Variáveis de ambiente que apontam os workers para os stubs em base (ex.: http://127.0.0.1:9000)."""
+    return {
+        "BACKEND_URL": f"{base}/backend",
+        "AVALON_API_URL": f"{base}/avalon",
+        "POLARIUM_API_URL": f"{base}/polarium",
+        "XOFRE_API_URL": f"{base}/xofre",
+        "HB_EDGE_URL": f"{base}/hb-edge",
+        "HB_ACCOUNT_URL": f"{base}/hb-account",
+        "HB_TRADE_URL": f"{base}/hb-trade",
+    }
+
+
+async def iniciar(host: str, porta: int) -> web.AppRunner:
+    runner = web.AppRunner(criar_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, porta).start()
+    return runner
+
+
+def adicionar_argumentos(parser: argparse.ArgumentParser):
+    parser.add_argument("--latencia-backend", type=float, default=config["latencia_backend"], help="ms")
+    parser.add_argument("--latencia-corretora", type=float, default=config["latencia_corretora"], help="ms")
+    parser.add_argument("--jitter", type=float, default=config["jitter"])
+    parser.add_argument("--taxa-erro", type=float, default=config["taxa_erro"])
+    parser.add_argument("--taxa-loss", type=float, default=config["taxa_loss"])
+    parser.add_argument("--duracao-ordem", type=float, default=config["duracao"],
+                        help="s até o resultado de uma ordem xofre/HB ficar disponível")
+
+
+def configurar(args):
+    config.update(
+        latencia_backend=args.latencia_backend, latencia_corretora=args.latencia_corretora,
+        jitter=args.jitter, taxa_erro=args.taxa_erro, taxa_loss=args.taxa_loss, duracao=args.duracao_ordem,
+    )
+
+
+async def _servir(args):
+    configurar(args)
+    simbolos.extend(args.simbolos)
+    await iniciar(args.host, args.porta)
+    base = f"http://{args.host}:{args.porta}"
+    print(f"✅ Stubs em {base}")
+    for nome, valor in variaveis(base).items():
+        print(f"   {nome}={valor}")
+    await asyncio.Future()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=9000)
+    parser.add_argument("--simbolos", nargs="*", default=["EURUSD", "EURUSD-OTC", "GBPUSD"])
+    adicionar_argumentos(parser)
+    asyncio.run(_servir(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Harness do ingress de webhook (sinal_webhook) e comparação de latência com o polling.
+
+replay: posta updates gravados (JSONL no formato do WEBHOOK_RECORD_PATH) no
+        ingress local e mede o tempo até a mensagem chegar no exchange.
+        Sem --rabbitmq-url mede só a resposta HTTP.
+telegram: envia os textos dos updates por um bot remetente (sendMessage) num
+        canal de teste onde o bot publisher é admin e mede até a chegada no
+        exchange. Rodar uma vez com os publisher_* (polling) no ar e outra com
+        o publisher_webhook para comparar os dois modos de ingestão.
+
+Uso:
+    python benchmarks/webhook.py replay --updates benchmarks/updates_sample.jsonl --rabbitmq-url amqp://u:p@localhost/
+    python benchmarks/webhook.py telegram --bot avalon --chat-id -100123 --rotulo polling --rabbitmq-url ...
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+
+# bot -> variável com o token (mesmos nomes do docker-compose)
+TOKENS = {
+    "avalon": "TOKEN_TELEGRAM_AVALON",
+    "polarium": "TOKEN_TELEGRAM_POLARIUM",
+    "xofre": "TOKEN_TELEGRAM_XOFRE",
+    "home_broker": "TOKEN_TELEGRAM_HOMEBROKER",
+}
+
+
+def ler_updates(caminho: str):
+    with open(caminho, encoding="utf-8") as f:
+        return [json.loads(linha) for linha in f if linha.strip()]
+
+
+def texto(update: dict) -> str:
+    for campo in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        if campo in update:
+            return update[campo].get("text", "")
+    return ""
+
+
+async def escutar(rabbitmq_url: str, bots):
+    """Fila exclusiva ligada a cada exchange; devolve (conexão, asyncio.Queue de (bot, t_chegada))."""
+    import aio_pika
+    connection = await aio_pika.connect_robust(rabbitmq_url)
+    channel = await connection.channel()
+    chegadas = asyncio.Queue()
+    for bot in set(bots):
+        exchange = await channel.declare_exchange(f"{bot}_signals", aio_pika.ExchangeType.FANOUT)
+        queue = await channel.declare_queue(exclusive=True)
+        await queue.bind(exchange)
+
+        async def ao_chegar(message, bot=bot):
+            chegadas.put_nowait((bot, time.perf_counter()))
+            await message.ack()
+        await queue.consume(ao_chegar)
+    return connection, chegadas
+
+
+async def esperar_chegada(chegadas, bot, timeout):
+    try:
+        while True:
+            origem, t = await asyncio.wait_for(chegadas.get(), timeout)
+            if origem == bot:
+                return t
+    except asyncio.TimeoutError:
+        return None
+
+
+def resumo(rotulo: str, amostras: dict):
+    print(f"\n=== {rotulo} ===")
+    print(f"{'bot':<12} {'n':>4} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'sem publicação':>15}")
+    for bot, (ms, perdidos) in amostras.items():
+        if not ms:
+            print(f"{bot:<12} {0:>4} {'-':>9} {'-':>9} {'-':>9} {perdidos:>15}")
+            continue
+        ordenadas = sorted(ms)
+        p95 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))]
+        print(f"{bot:<12} {len(ms):>4} {statistics.median(ms):>9.1f} {p95:>9.1f} {max(ms):>9.1f} {perdidos:>15}")
+
+
+async def replay(args):
+    from aiohttp import ClientSession
+    gravados = ler_updates(args.updates)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret} if args.secret else {}
+    connection, chegadas = (None, None)
+    if args.rabbitmq_url:
+        connection, chegadas = await escutar(args.rabbitmq_url, [g["bot"] for g in gravados])
+
+    amostras = {}
+    async with ClientSession() as session:
+        for _ in range(args.repeticoes):
+            for gravado in gravados:
+                bot = gravado["bot"]
+                token = os.getenv(TOKENS[bot], bot)
+                ms, perdidos = amostras.setdefault(bot, ([], 0))
+                inicio = time.perf_counter()
+                async with session.post(f"{args.url}/webhook/{token}", json=gravado["update"], headers=headers) as resp:
+                    if resp.status != 200:
+                        print(f"❌ {bot}: status {resp.status}")
+                        continue
+                    fim = time.perf_counter()
+                if chegadas is not None:
+                    # ingress publica antes de responder: a mensagem já deve estar a caminho
+                    fim = await esperar_chegada(chegadas, bot, args.timeout)
+                    if fim is None:
+                        amostras[bot] = (ms, perdidos + 1)
+                        continue
+                ms.append((fim - inicio) * 1000)
+
+    if connection:
+        await connection.close()
+    resumo(f"replay {args.updates} ({'até o exchange' if chegadas is not None else 'resposta HTTP'})", amostras)
+
+
+async def telegram(args):
+    from aiohttp import ClientSession
+    if not args.sender_token:
+        sys.exit("❌ --sender-token (ou SENDER_TOKEN_TELEGRAM) é obrigatório")
+    if not args.rabbitmq_url:
+        sys.exit("❌ --rabbitmq-url (ou RABBITMQ_URL) é obrigatório")
+    textos = [texto(g["update"]) for g in ler_updates(args.updates) if g["bot"] == args.bot]
+    textos = [t for t in textos if t]
+    connection, chegadas = await escutar(args.rabbitmq_url, [args.bot])
+
+    ms, perdidos = [], 0
+    url = f"https://api.telegram.org/bot{args.sender_token}/sendMessage"
+    async with ClientSession() as session:
+        for _ in range(args.repeticoes):
+            for t in textos:
+                inicio = time.perf_counter()
+                async with session.post(url, json={"chat_id": args.chat_id, "text": t}) as resp:
+                    if resp.status != 200:
+                        print(f"❌ sendMessage: status {resp.status}")
+                        continue
+                fim = await esperar_chegada(chegadas, args.bot, args.timeout)
+                if fim is None:
+                    perdidos += 1
+                else:
+                    ms.append((fim - inicio) * 1000)
+                await asyncio.sleep(args.intervalo)
+
+    await connection.close()
+    resumo(f"telegram → {args.bot}_signals ({args.rotulo})", {args.bot: (ms, perdidos)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="modo", required=True)
+
+    p_replay = sub.add_parser("replay")
+    p_replay.add_argument("--url", default="http://localhost:8080")
+    p_replay.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""))
+
+    p_tg = sub.add_parser("telegram")
+    p_tg.add_argument("--bot", choices=list(TOKENS), required=True)
+    p_tg.add_argument("--chat-id", required=True)
+    p_tg.add_argument("--sender-token", default=os.getenv("SENDER_TOKEN_TELEGRAM"))
+    p_tg.add_argument("--rotulo", default="", help="ex.: polling ou webhook, só para o relatório")
+    p_tg.add_argument("--intervalo", type=float, default=2, help="pausa entre envios (rate limit do Telegram)")
+
+    for p in (p_replay, p_tg):
+        p.add_argument("--updates", default=os.path.join(os.path.dirname(__file__), "updates_sample.jsonl"))
+        p.add_argument("--rabbitmq-url", default=os.getenv("RABBITMQ_URL"))
+        p.add_argument("--repeticoes", type=int, default=1)
+        p.add_argument("--timeout", type=float, default=30)
+
+    args = parser.parse_args()
+    asyncio.run(replay(args) if args.modo == "replay" else telegram(args))
+
+
+if __name__ == "__main__":
+    main()
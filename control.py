@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import asyncio
+import aio_pika
+import api
+import estado
+import historico
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Exchange onde os workers publicam mensagens de controle (tipo.user_id.brokerage_id)
+CONTROL_EXCHANGE = "bot_control"
+
+# Fila durável dos trades liquidados: os que chegam com o orquestrador fora do ar
+# são gravados no histórico local (historico.py) quando ele volta
+TRADES_QUEUE = "bot_control.trades"
+# Fila durável dos encerramentos: um stop_win/stop_loss publicado com o orquestrador
+# fora do ar ainda grava o bot_status e o estado desejado PARADO quando ele volta
+STOPS_QUEUE = "bot_control.stops"
+# Mensagens de estado (voláteis): só interessam enquanto o orquestrador está no ar
+TIPOS_VOLATEIS = ("heartbeat", "draining")
+
+# bot_status gravado quando o worker encerra sozinho por stop
+STOP_STATUS = {"stop_win": 2, "stop_loss": 3}
+
+# Heartbeat mais velho que isso: o processo do bot morreu ou perdeu o RabbitMQ
+HEARTBEAT_TIMEOUT = float(os.getenv("BOT_HEARTBEAT_TIMEOUT", "35"))
+# Ordem aberta há mais tempo que isso: bot preso esperando um resultado que não vem
+ORDER_STUCK_AFTER = float(os.getenv("BOT_ORDER_STUCK_AFTER", "1200"))
+# Atraso do event loop acima disso: algo está bloqueando o worker
+MAX_LOOP_LAG_MS = float(os.getenv("BOT_MAX_LOOP_LAG_MS", "2000"))
+
+_consumidor = None
+# Último progresso de drenagem reportado por bot: "user_id:brokerage_id" -> dados
+drenagens = {}
+# Último heartbeat de cada bot: "user_id:brokerage_id" -> dados + recebido_em
+batimentos = {}
+
+
+def _chave(user_id, brokerage_id):
+    return f"{user_id}:{brokerage_id}"
+
+
+def drenagem(user_id: int, brokerage_id: int):
+    """Progresso da drenagem do bot (None se não estiver drenando)."""
+    return drenagens.get(_chave(user_id, brokerage_id))
+
+
+def limpar_drenagem(user_id: int, brokerage_id: int):
+    drenagens.pop(_chave(user_id, brokerage_id), None)
+
+
+def saude(user_id: int, brokerage_id: int):
+    """Saúde do bot a partir do último heartbeat (None se ele nunca reportou)."""
+    dados = batimentos.get(_chave(user_id, brokerage_id))
+    return _avaliar(dados) if dados else None
+
+
+def saude_todos() -> dict:
+    return {chave: _avaliar(dados) for chave, dados in batimentos.items()}
+
+
+def _avaliar(dados: dict) -> dict:
+    """
+    ok: heartbeat em dia e consumidor ativo | stuck: vivo, mas sem consumir/preso numa ordem
+    stale: sem heartbeat há mais de HEARTBEAT_TIMEOUT | stopped: encerrou pelo canal de controle
+    """
+    idade = time.time() - dados["recebido_em"]
+    problemas = []
+    if dados.get("finished"):
+        estado = "stopped"
+    elif idade > HEARTBEAT_TIMEOUT:
+        estado = "stale"
+    else:
+        if dados.get("consumer") not in ("running", "starting"):
+            problemas.append(f"consumer {dados.get('consumer')}")
+        if (dados.get("oldest_order_age") or 0) + idade > ORDER_STUCK_AFTER:
+            problemas.append("order without result")
+        if (dados.get("loop_lag_ms") or 0) > MAX_LOOP_LAG_MS:
+            problemas.append("event loop lag")
+        estado = "stuck" if problemas else "ok"
+    return {
+        "state": estado,
+        "problems": problemas,
+        "heartbeat_age": round(idade, 1),
+        **{k: v for k, v in dados.items() if k not in ("type", "user_id", "brokerage_id", "recebido_em")},
+    }
+
+
+def _bot_batimento(data: dict):
+    batimentos[_chave(data["user_id"], data["brokerage_id"])] = {**data, "recebido_em": time.time()}
+
+
+def _rabbit_url():
+    url = os.getenv("CONTROL_RABBITMQ_URL")
+    if url:
+        return url
+    user = os.getenv("RABBITMQ_USER", "")
+    password = os.getenv("RABBITMQ_PASS", "")
+    host = os.getenv("CONTROL_RABBITMQ_HOST", "localhost")
+    return f"amqp://{user}:{password}@{host}:5672/"
+
+
+def _bot_drenando(data: dict):
+    drenagens[_chave(data["user_id"], data["brokerage_id"])] = {
+        "reason": data.get("reason"),
+        "pending": data.get("pending"),
+        "open_orders": data.get("open_orders"),
+        "deadline_in": data.get("deadline_in"),
+        "finished": False,
+        "ts": data.get("ts"),
+    }
+
+
+async def _bot_parado(data: dict):
+    """Worker terminou a drenagem; em stop_win/stop_loss ainda falta registrar o status."""
+    drenagens[_chave(data["user_id"], data["brokerage_id"])] = {
+        "reason": data.get("reason"),
+        "pending": 0,
+        "open_orders": 0,
+        "interrupted": data.get("interrupted", 0),
+        "finished": True,
+        "ts": data.get("ts"),
+    }
+    batimento = batimentos.get(_chave(data["user_id"], data["brokerage_id"]))
+    if batimento:
+        batimento.update(finished=True, consumer="stopped", open_orders=0, oldest_order_age=None)
+    status = STOP_STATUS.get(data.get("reason"))
+    if status is None:
+        return
+    user_id = data["user_id"]
+    brokerage_id = data["brokerage_id"]
+    print(f"🛑 bot_{user_id}_{brokerage_id} encerrado por {data['reason']} "
+          f"(win={data.get('win_value')} loss={data.get('loss_value')})")
+    await registrar_stop(user_id, brokerage_id, data["reason"])
+
+
+async def registrar_stop(user_id: int, brokerage_id: int, motivo: str):
+    """O bot parou sozinho por stop_win/stop_loss: fica PARADO (a reconciliação não o reinicia) e bot_status 2/3."""
+    estado.desejar(user_id, brokerage_id, estado.PARADO, motivo)
+    await api.update_status_bot(user_id, STOP_STATUS[motivo], brokerage_id)
+
+
+async def _processar(message: aio_pika.abc.AbstractIncomingMessage):
+    async with message.process():
+        try:
+            data = json.loads(message.body.decode())
+            tipo = data.get("type")
+            if tipo == "heartbeat":
+                _bot_batimento(data)
+            elif tipo == "draining":
+                _bot_drenando(data)
+            elif tipo == "stopped":
+                await _bot_parado(data)
+            elif tipo == "trade":
+                historico.registrar(data)
+        except Exception as e:
+            print(f"❌ Erro ao processar mensagem de controle: {e}")
+
+
+async def _consumir():
+    while True:
+        try:
+            connection = await aio_pika.connect_robust(_rabbit_url())
+            channel = await connection.channel()
+            exchange = await channel.declare_exchange(CONTROL_EXCHANGE, aio_pika.ExchangeType.TOPIC)
+            queue = await channel.declare_queue(exclusive=True)
+            for tipo in TIPOS_VOLATEIS:
+                await queue.bind(exchange, routing_key=f"{tipo}.#")
+            await queue.consume(_processar)
+            trades = await channel.declare_queue(TRADES_QUEUE, durable=True)
+            await trades.bind(exchange, routing_key="trade.#")
+            await trades.consume(_processar)
+            stops = await channel.declare_queue(STOPS_QUEUE, durable=True)
+            await stops.bind(exchange, routing_key="stopped.#")
+            await stops.consume(_processar)
+            print("✅ Canal de controle dos bots conectado")
+            await asyncio.Future()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Canal de controle indisponível ({e}), tentando novamente em 5s...")
+            await asyncio.sleep(5)
+
+
+def iniciar():
+    """Inicia o consumidor do canal de controle em segundo plano."""
+    global _consumidor
+    if _consumidor is None or _consumidor.done():
+        _consumidor = asyncio.create_task(_consumir())
+    return _consumidor
@@ -0,0 +1,155 @@
+import os
+import time
+import sqlite3
+
+# Estado desejado de cada bot, guardado localmente pelo orquestrador: é o que a
+# reconciliação (reconciliacao.py) compara com os containers para iniciar/parar bots,
+# inclusive depois de um reboot do host. Também guarda as janelas de sessão (agenda.py).
+BOT_STATE_DB_PATH = os.getenv("BOT_STATE_DB_PATH", "bots.sqlite3")
+
+RODANDO = "running"
+PARADO = "stopped"
+
+_db = None
+
+
+def _conectar():
+    global _db
+    if _db is None:
+        _db = sqlite3.connect(BOT_STATE_DB_PATH)
+        _db.row_factory = sqlite3.Row
+        _db.execute("""
+            CREATE TABLE IF NOT EXISTS bots (
+                user_id INTEGER NOT NULL,
+                brokerage_id INTEGER NOT NULL,
+                desejado TEXT NOT NULL,
+                motivo TEXT,
+                atualizado_em REAL NOT NULL,
+                ultima_partida REAL NOT NULL DEFAULT 0,
+                falhas INTEGER NOT NULL DEFAULT 0,
+                proxima_tentativa REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, brokerage_id)
+            )
+        """)
+        _db.execute("""
+            CREATE TABLE IF NOT EXISTS sessoes (
+                user_id INTEGER NOT NULL,
+                brokerage_id INTEGER NOT NULL,
+                inicio TEXT,
+                fim TEXT,
+                dias TEXT NOT NULL DEFAULT '0123456',
+                fuso TEXT NOT NULL,
+                reset_diario INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY (user_id, brokerage_id)
+            )
+        """)
+        # bordas de janela já executadas (não repete depois de um restart do orquestrador)
+        _db.execute("""
+            CREATE TABLE IF NOT EXISTS disparos (
+                user_id INTEGER NOT NULL,
+                brokerage_id INTEGER NOT NULL,
+                evento TEXT NOT NULL,
+                dia TEXT NOT NULL,
+                PRIMARY KEY (user_id, brokerage_id, evento, dia)
+            )
+        """)
+        _db.commit()
+    return _db
+
+
+def desejar(user_id: int, brokerage_id: int, desejado: str, motivo: str | None = None):
+    """Grava se o bot deve estar rodando ou parado (zera o backoff de falhas)."""
+    db = _conectar()
+    db.execute("""
+        INSERT INTO bots (user_id, brokerage_id, desejado, motivo, atualizado_em)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, brokerage_id) DO UPDATE SET
+            desejado = excluded.desejado, motivo = excluded.motivo,
+            atualizado_em = excluded.atualizado_em, falhas = 0, proxima_tentativa = 0
+    """, (int(user_id), int(brokerage_id), desejado, motivo, time.time()))
+    db.commit()
+
+
+def bot(user_id: int, brokerage_id: int) -> dict | None:
+    linha = _conectar().execute(
+        "SELECT * FROM bots WHERE user_id = ? AND brokerage_id = ?", (int(user_id), int(brokerage_id))
+    ).fetchone()
+    return dict(linha) if linha else None
+
+
+def todos() -> list[dict]:
+    return [dict(linha) for linha in _conectar().execute("SELECT * FROM bots").fetchall()]
+
+
+def vazio() -> bool:
+    return _conectar().execute("SELECT 1 FROM bots LIMIT 1").fetchone() is None
+
+
+def registrar_partida(user_id: int, brokerage_id: int):
+    """A reconciliação acabou de iniciar o bot (base para detectar crash loop)."""
+    db = _conectar()
+    db.execute("UPDATE bots SET ultima_partida = ? WHERE user_id = ? AND brokerage_id = ?",
+               (time.time(), int(user_id), int(brokerage_id)))
+    db.commit()
+
+
+def registrar_falha(user_id: int, brokerage_id: int, espera: float):
+    """Bot caiu logo depois de iniciado (ou não iniciou): próxima tentativa só depois da espera."""
+    db = _conectar()
+    db.execute("""
+        UPDATE bots SET falhas = falhas + 1, proxima_tentativa = ?, ultima_partida = 0
+        WHERE user_id = ? AND brokerage_id = ?
+    """, (time.time() + espera, int(user_id), int(brokerage_id)))
+    db.commit()
+
+
+def zerar_falhas(user_id: int, brokerage_id: int):
+    db = _conectar()
+    db.execute("UPDATE bots SET falhas = 0, proxima_tentativa = 0 WHERE user_id = ? AND brokerage_id = ?",
+               (int(user_id), int(brokerage_id)))
+    db.commit()
+
+
+def salvar_sessao(user_id: int, brokerage_id: int, inicio: str | None, fim: str | None,
+                  dias: str, fuso: str, reset_diario: bool):
+    db = _conectar()
+    db.execute("""
+        INSERT OR REPLACE INTO sessoes (user_id, brokerage_id, inicio, fim, dias, fuso, reset_diario)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (int(user_id), int(brokerage_id), inicio, fim, dias, fuso, int(reset_diario)))
+    db.commit()
+
+
+def remover_sessao(user_id: int, brokerage_id: int) -> bool:
+    db = _conectar()
+    apagadas = db.execute("DELETE FROM sessoes WHERE user_id = ? AND brokerage_id = ?",
+                          (int(user_id), int(brokerage_id))).rowcount
+    db.commit()
+    return apagadas > 0
+
+
+def sessao(user_id: int, brokerage_id: int) -> dict | None:
+    linha = _conectar().execute(
+        "SELECT * FROM sessoes WHERE user_id = ? AND brokerage_id = ?", (int(user_id), int(brokerage_id))
+    ).fetchone()
+    return dict(linha) if linha else None
+
+
+def sessoes() -> list[dict]:
+    return [dict(linha) for linha in _conectar().execute("SELECT * FROM sessoes").fetchall()]
+
+
+def disparado(user_id: int, brokerage_id: int, evento: str, dia: str) -> bool:
+    return _conectar().execute(
+        "SELECT 1 FROM disparos WHERE user_id = ? AND brokerage_id = ? AND evento = ? AND dia = ?",
+        (int(user_id), int(brokerage_id), evento, dia)
+    ).fetchone() is not None
+
+
+def marcar_disparos(disparos: list[tuple]):
+    """disparos: (user_id, brokerage_id, evento, dia); limpa os registros com mais de uma semana."""
+    db = _conectar()
+    db.executemany("INSERT OR IGNORE INTO disparos (user_id, brokerage_id, evento, dia) VALUES (?, ?, ?, ?)",
+                   disparos)
+    db.execute("DELETE FROM disparos WHERE dia < date('now', '-7 day')")
+    db.commit()
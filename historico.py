@@ -0,0 +1,180 @@
+import os
+import re
+import time
+import sqlite3
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Histórico local dos trades liquidados, alimentado pelas mensagens "trade" que os
+# workers publicam no canal de controle. Além da tabela de trades (índice por usuário,
+# corretora e horário), mantém agregados incrementais por bot e por dia: /stats lê uma
+# linha pronta em vez de buscar trade-order-info no backend.
+# pnl de cada trade = win_value - loss_value (a mesma conta dos totais de stop).
+TRADE_HISTORY_DB_PATH = os.getenv("TRADE_HISTORY_DB_PATH", "trades.sqlite3")
+TRADE_HISTORY_TZ = ZoneInfo(os.getenv("TRADE_HISTORY_TZ", "America/Sao_Paulo"))
+
+_db = None
+
+
+def _conectar():
+    global _db
+    if _db is None:
+        _db = sqlite3.connect(TRADE_HISTORY_DB_PATH)
+        _db.row_factory = sqlite3.Row
+        # um INSERT por trade: WAL evita fsync do arquivo inteiro a cada commit
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.execute("PRAGMA synchronous=NORMAL")
+        _db.execute("""
+            CREATE TABLE IF NOT EXISTS trades (
+                brokerage_id INTEGER NOT NULL,
+                order_id TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                liquidado_em REAL NOT NULL,
+                aberto_em REAL,
+                symbol TEXT,
+                etapa INTEGER NOT NULL DEFAULT 0,
+                valor REAL,
+                status TEXT,
+                pnl REAL NOT NULL,
+                PRIMARY KEY (brokerage_id, order_id)
+            )
+        """)
+        _db.execute("CREATE INDEX IF NOT EXISTS trades_bot ON trades (user_id, brokerage_id, liquidado_em)")
+        _db.execute("""
+            CREATE TABLE IF NOT EXISTS agregados (
+                user_id INTEGER NOT NULL,
+                brokerage_id INTEGER NOT NULL,
+                trades INTEGER NOT NULL,
+                wins INTEGER NOT NULL,
+                losses INTEGER NOT NULL,
+                lucro_bruto REAL NOT NULL,
+                perda_bruta REAL NOT NULL,
+                saldo REAL NOT NULL,
+                pico REAL NOT NULL,
+                max_drawdown REAL NOT NULL,
+                volume REAL NOT NULL,
+                gale1 INTEGER NOT NULL,
+                gale2 INTEGER NOT NULL,
+                wins_gale1 INTEGER NOT NULL,
+                wins_gale2 INTEGER NOT NULL,
+                primeiro REAL NOT NULL,
+                ultimo REAL NOT NULL,
+                PRIMARY KEY (user_id, brokerage_id)
+            )
+        """)
+        _db.execute("""
+            CREATE TABLE IF NOT EXISTS agregados_dia (
+                user_id INTEGER NOT NULL,
+                brokerage_id INTEGER NOT NULL,
+                dia TEXT NOT NULL,
+                trades INTEGER NOT NULL,
+                wins INTEGER NOT NULL,
+                losses INTEGER NOT NULL,
+                pnl REAL NOT NULL,
+                PRIMARY KEY (user_id, brokerage_id, dia)
+            )
+        """)
+        _db.commit()
+    return _db
+
+
+def etapa(texto) -> int:
+    """'Entrada Principal' -> 0, 'Gale 1' -> 1, 'Gale 2' -> 2 (workers sem gale: 0)."""
+    m = re.search(r"gale\s*(\d)", str(texto or ""), re.IGNORECASE)
+    return int(m.group(1)) if m else 0
+
+
+def registrar(data: dict) -> bool:
+    """
+    Grava um trade liquidado e atualiza os agregados na mesma transação.
+    Reentregas do mesmo order_id são ignoradas (False).
+    """
+    user_id, brokerage_id = int(data["user_id"]), int(data["brokerage_id"])
+    win = float(data.get("win_value") or 0)
+    loss = float(data.get("loss_value") or 0)
+    pnl = win - loss
+    n_etapa = etapa(data.get("stage"))
+    quando = float(data.get("ts") or time.time())
+    valor = float(data.get("amount") or 0)
+    ganhou, perdeu = int(win > 0), int(loss > 0)
+    dia = datetime.fromtimestamp(quando, TRADE_HISTORY_TZ).date().isoformat()
+
+    db = _conectar()
+    with db:
+        inseridas = db.execute("""
+            INSERT OR IGNORE INTO trades
+                (brokerage_id, order_id, user_id, liquidado_em, aberto_em, symbol, etapa, valor, status, pnl)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (brokerage_id, str(data["order_id"]), user_id, quando, data.get("opened_at"), data.get("symbol"),
+              n_etapa, valor, data.get("status"), pnl)).rowcount
+        if not inseridas:
+            return False
+        # no UPDATE as colunas à direita ainda têm os valores antigos da linha
+        db.execute("""
+            INSERT INTO agregados (user_id, brokerage_id, trades, wins, losses, lucro_bruto, perda_bruta,
+                                   saldo, pico, max_drawdown, volume, gale1, gale2, wins_gale1, wins_gale2,
+                                   primeiro, ultimo)
+            VALUES (:u, :b, 1, :ganhou, :perdeu, :win, :loss, :pnl, max(0, :pnl), max(0, -:pnl), :valor,
+                    :g1, :g2, :g1 * :ganhou, :g2 * :ganhou, :t, :t)
+            ON CONFLICT (user_id, brokerage_id) DO UPDATE SET
+                trades = trades + 1,
+                wins = wins + excluded.wins,
+                losses = losses + excluded.losses,
+                lucro_bruto = lucro_bruto + excluded.lucro_bruto,
+                perda_bruta = perda_bruta + excluded.perda_bruta,
+                saldo = saldo + :pnl,
+                pico = max(pico, saldo + :pnl),
+                max_drawdown = max(max_drawdown, max(pico, saldo + :pnl) - (saldo + :pnl)),
+                volume = volume + excluded.volume,
+                gale1 = gale1 + excluded.gale1,
+                gale2 = gale2 + excluded.gale2,
+                wins_gale1 = wins_gale1 + excluded.wins_gale1,
+                wins_gale2 = wins_gale2 + excluded.wins_gale2,
+                primeiro = min(primeiro, excluded.primeiro),
+                ultimo = max(ultimo, excluded.ultimo)
+        """, {"u": user_id, "b": brokerage_id, "ganhou": ganhou, "perdeu": perdeu, "win": win, "loss": loss,
+              "pnl": pnl, "valor": valor, "g1": int(n_etapa == 1), "g2": int(n_etapa == 2), "t": quando})
+        db.execute("""
+            INSERT INTO agregados_dia (user_id, brokerage_id, dia, trades, wins, losses, pnl)
+            VALUES (?, ?, ?, 1, ?, ?, ?)
+            ON CONFLICT (user_id, brokerage_id, dia) DO UPDATE SET
+                trades = trades + 1, wins = wins + excluded.wins,
+                losses = losses + excluded.losses, pnl = pnl + excluded.pnl
+        """, (user_id, brokerage_id, dia, ganhou, perdeu, pnl))
+    return True
+
+
+def estatisticas(user_id: int, brokerage_id: int, dias: int = 7) -> dict | None:
+    """Agregados do bot e os últimos `dias` dias com trades (None se nunca liquidou nada)."""
+    db = _conectar()
+    linha = db.execute("SELECT * FROM agregados WHERE user_id = ? AND brokerage_id = ?",
+                       (int(user_id), int(brokerage_id))).fetchone()
+    if linha is None:
+        return None
+    a = dict(linha)
+    diario = db.execute("""
+        SELECT dia AS day, trades, wins, losses, pnl FROM agregados_dia
+        WHERE user_id = ? AND brokerage_id = ? ORDER BY dia DESC LIMIT ?
+    """, (int(user_id), int(brokerage_id), int(dias))).fetchall()
+    decididos = a["wins"] + a["losses"]
+    return {
+        "trades": a["trades"],
+        "wins": a["wins"],
+        "losses": a["losses"],
+        "win_rate": round(a["wins"] / decididos, 4) if decididos else None,
+        "pnl": round(a["saldo"], 2),
+        "gross_profit": round(a["lucro_bruto"], 2),
+        "gross_loss": round(a["perda_bruta"], 2),
+        "max_drawdown": round(a["max_drawdown"], 2),
+        "volume": round(a["volume"], 2),
+        "gale": {
+            "gale1": a["gale1"],
+            "gale2": a["gale2"],
+            "gale1_wins": a["wins_gale1"],
+            "gale2_wins": a["wins_gale2"],
+            "usage": round((a["gale1"] + a["gale2"]) / a["trades"], 4),
+        },
+        "first_trade": a["primeiro"],
+        "last_trade": a["ultimo"],
+        "daily": [{**dict(d), "pnl": round(d["pnl"], 2)} for d in diario],
+    }
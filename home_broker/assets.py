@@ -0,0 +1,105 @@
+import os
+import re
+import time
+import asyncio
+
+# Catálogo de ativos negociáveis agora na corretora: sinais para ativos fechados ou
+# desconhecidos são rejeitados localmente, sem gastar uma ordem (nem rate limit).
+# ATENÇÃO: o endpoint (ASSETS_URL) e o formato da resposta não foram confirmados na
+# documentação da corretora; _extrair aceita as formas mais comuns. Resposta que não
+# traz nenhum símbolo reconhecível (FORMATO_SIMBOLO) não vira catálogo: os sinais
+# passam sem validação (falha aberta) e o problema fica no log.
+ASSETS_REFRESH_INTERVAL = float(os.getenv("ASSETS_REFRESH_INTERVAL", "300"))
+ASSETS_URL = os.getenv("HB_ASSETS_URL", os.getenv("HB_EDGE_URL", "https://trade-api-edge.homebroker.com").rstrip("/") + "/assets")
+
+# par de moedas/cripto na forma canônica (EURUSD, BTCUSDT, USDJPYOTC...); nomes de
+# categorias (FOREX, CRYPTO...) não casam
+FORMATO_SIMBOLO = re.compile(r"^([A-Z]{3,5}(USD|USDT|EUR|GBP|JPY|CHF|CAD|AUD|NZD|BRL)|USD[A-Z]{3})(OTC)?$")
+
+catalogo = {}
+atualizado_em = 0.0
+_obter_headers = None
+
+
+def chave(symbol: str) -> str:
+    """Forma canônica para comparar grafias (EUR/USD, EURUSD-OTC, EURUSD.OTC...)."""
+    return re.sub(r"[^A-Z0-9]", "", (symbol or "").upper())
+
+
+def validar(symbol: str) -> str | None:
+    """
+    Símbolo na grafia da corretora, ou None se o ativo não está aberto.
+    Sem catálogo carregado (falha na corretora) o sinal passa como veio.
+    """
+    if not catalogo:
+        return symbol
+    return catalogo.get(chave(symbol))
+
+
+def _extrair(payload) -> list[str]:
+    """Símbolos abertos de uma lista de strings (só os abertos) ou objetos com flag, ou de {data|assets: [...]}."""
+    if isinstance(payload, dict):
+        payload = payload.get("data") or payload.get("assets") or []
+    abertos = []
+    for item in payload:
+        if isinstance(item, str):
+            abertos.append(item)
+        elif isinstance(item, dict):
+            simbolo = item.get("symbol") or item.get("name") or item.get("ticker_symbol")
+            # sem flag de aberto o item não conta: melhor nenhum catálogo que aceitar ativo fechado
+            aberto = item.get("is_open", item.get("open", item.get("enabled", False)))
+            if simbolo and aberto:
+                abertos.append(simbolo)
+    return abertos
+
+
+async def atualizar() -> bool:
+    global catalogo, atualizado_em
+    simbolos = await _buscar()
+    if simbolos is None:
+        return False
+    if not any(FORMATO_SIMBOLO.match(chave(s)) for s in simbolos):
+        print(f"⚠️ Catálogo de ativos sem nenhum símbolo reconhecível ({len(simbolos)} itens abertos) — "
+              f"resposta fora do formato esperado; sinais seguem sem validação de ativo.")
+        catalogo = {}
+        return False
+    catalogo = {chave(s): s for s in simbolos}
+    atualizado_em = time.time()
+    print(f"📚 Catálogo de ativos atualizado: {len(catalogo)} abertos")
+    return True
+
+
+async def manter_atualizado():
+    """Carrega o catálogo no startup e renova a cada ASSETS_REFRESH_INTERVAL segundos."""
+    while True:
+        await atualizar()
+        await asyncio.sleep(ASSETS_REFRESH_INTERVAL)
+
+
+async def _buscar() -> list[str] | None:
+    """Ativos abertos na Home Broker (usa o mesmo token Bearer das ordens)."""
+    import aiohttp
+    if _obter_headers is None:
+        return None
+    try:
+        headers = await _obter_headers()
+        async with aiohttp.ClientSession() as session:
+            async with session.get(ASSETS_URL, headers=headers) as response:
+                if response.status != 200:
+                    print(f"⚠️ Catálogo de ativos indisponível: status {response.status}")
+                    return None
+                return _extrair(await response.json())
+    except Exception as e:
+        print(f"⚠️ Erro ao carregar catálogo de ativos: {e}")
+        return None
+
+
+_tarefa = None
+
+
+def iniciar(obter_headers):
+    """Sobe a atualização periódica em segundo plano (fora da drenagem do worker)."""
+    global _tarefa, _obter_headers
+    _obter_headers = obter_headers
+    _tarefa = asyncio.create_task(manter_atualizado())
+    return _tarefa
@@ -1,22 +1,21 @@
+import time
+INICIO_PROCESSO = time.perf_counter()  # antes dos demais imports: mede o caminho até consumir
 import os
 import json
 import asyncio
 import aio_pika
-import aiohttp
+import control
+import dispatcher
+import filtros
+import assets
+import conexao
+import relogio
 import base64
-from dotenv import load_dotenv
-from api import (
-    get_bot_options,
-    update_win_value,
-    update_loss_value,
-    update_trade_order_info,
-    verify_stop_values,
-    create_trade_order_info
-)
 from datetime import datetime
-import pytz
 
-load_dotenv()
+if os.path.exists(".env"):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 USER_ID = os.getenv("USER_ID")
 BROKERAGE_ID = os.getenv("BROKERAGE_ID")
@@ -39,12 +38,46 @@ print("🔗 RabbitMQ URL:", RABBITMQ_URL)
 # variáveis de sessão
 ACCESS_TOKEN = None
 REFRESH_TOKEN = None
+# o token precisa durar pelo menos isso além do aquecimento (entrada + verificação)
+TOKEN_MIN_TTL = float(os.getenv("HB_TOKEN_MIN_TTL", "300"))
+
+# Bases das APIs da Home Broker (sobrescritas nos testes de carga)
+HB_EDGE_URL = os.getenv("HB_EDGE_URL", "https://trade-api-edge.homebroker.com").rstrip("/")
+HB_ACCOUNT_URL = os.getenv("HB_ACCOUNT_URL", "https://bot-account-manager-api.homebroker.com").rstrip("/")
+HB_TRADE_URL = os.getenv("HB_TRADE_URL", "https://bot-trade-api.homebroker.com").rstrip("/")
+URL_OP = f"{HB_EDGE_URL}/op"
+
+
+# --------- Liquidação em segundo plano ---------
+
+def _liquidacao_concluida(task: asyncio.Task):
+    if task.cancelled():
+        return
+    if task.exception():
+        print(f"❌ Erro na liquidação: {task.exception()}")
+        return
+    control.registrar_liquidacao(task.result())
+
+def liquidar_em_segundo_plano(order_id: str, status: str, pnl: float, win_value: float = 0, loss_value: float = 0):
+    """
+    Agenda a liquidação (totais + trade-order-info + stop) sem bloquear o worker:
+    o próximo sinal é aceito enquanto as escritas no backend ocorrem em paralelo.
+    Se os novos totais atingirem o stop, o próprio worker para (control.acionar_stop).
+    """
+    control.fechar_ordem(order_id, status, pnl=pnl, win_value=win_value, loss_value=loss_value)
+    from api import settle_trade_order
+    task = control.rastrear(asyncio.create_task(settle_trade_order(
+        USER_ID, BROKERAGE_ID, order_id, status, pnl, win_value=win_value, loss_value=loss_value
+    )))
+    task.add_done_callback(_liquidacao_concluida)
+    return task
 
 
 async def login_homebroker():
     """Realiza login e atualiza tokens globais"""
     global ACCESS_TOKEN, REFRESH_TOKEN
-    url = "https://bot-account-manager-api.homebroker.com/v3/login"
+    import aiohttp
+    url = f"{HB_ACCOUNT_URL}/v3/login"
 
     auth_string = f"{HB_LOGIN_APP}:{HB_PASSWORD_APP}"
     basic_auth = base64.b64encode(auth_string.encode()).decode()
@@ -69,25 +102,54 @@ async def login_homebroker():
                 return False
 
 
-async def ensure_login():
-    """Garante que o token está válido, caso contrário reloga"""
+def expiracao_token(token: str) -> float | None:
+    """Campo exp do JWT (sem validar assinatura); None se não for possível ler"""
+    try:
+        corpo = token.split(".")[1]
+        corpo += "=" * (-len(corpo) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(corpo))["exp"])
+    except Exception:
+        return None
+
+
+async def ensure_login(margem: float = 0):
+    """Garante que o token está válido (e dura ao menos `margem` segundos), caso contrário reloga"""
     global ACCESS_TOKEN
     if not ACCESS_TOKEN:
         return await login_homebroker()
-    # opcional: validar expiração do JWT
+    expira = expiracao_token(ACCESS_TOKEN)
+    if expira is not None and expira - time.time() < margem:
+        print("🔑 Token perto de expirar, renovando login...")
+        return await login_homebroker()
     return True
 
 
-async def realizar_compra(isDemo: bool, close_type: str, direction: str, symbol: str, amount: float, start_time: str):
+async def headers_homebroker():
+    """Cabeçalho autenticado para chamadas de leitura (ex.: catálogo de ativos)"""
+    await ensure_login()
+    return {"Authorization": f"Bearer {ACCESS_TOKEN}"}
+
+
+def duracao_ms(expiracao) -> int:
+    """Expiração do sinal em ms: minutos ("1", 5) ou MM:SS ("01:00", como vem no xofre_signals)"""
+    texto = str(expiracao)
+    if ":" in texto:
+        minutos, segundos = texto.split(":", 1)
+        return (int(minutos) * 60 + int(segundos)) * 1000
+    return int(texto) * 60000
+
+
+async def realizar_compra(isDemo: bool, close_type: str, direction: str, symbol: str, amount: float, start_time: str,
+                          etapa: str = "", alvo: float | None = None):
     """Abre ordem na Home Broker"""
+    from api import create_trade_order_info
     await ensure_login()
 
-    url = "https://trade-api-edge.homebroker.com/op"
     payload = {
         "id": f"op-{datetime.utcnow().timestamp()}",
         "direction": direction,
         "bet_value_usd_cents": int(amount * 100),
-        "duration_milliseconds": int(close_type) * 60000,
+        "duration_milliseconds": duracao_ms(close_type),
         "start_time_utc": start_time,
         "ticker_symbol": symbol,
         "account_type": "demo" if isDemo else "real",
@@ -95,62 +157,65 @@ async def realizar_compra(isDemo: bool, close_type: str, direction: str, symbol:
     }
     headers = {"Authorization": f"Bearer {ACCESS_TOKEN}", "Content-Type": "application/json"}
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(url, headers=headers, json=payload) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    print("📤 Ordem enviada:", data)
-                    # Criar registro da ordem imediatamente
-                    await create_trade_order_info(
-                        user_id=USER_ID,
-                        order_id=data["id"],
-                        symbol=symbol,
-                        order_type=direction,
-                        quantity=amount,
-                        price=None,  # preço não fornecido pelo HB
-                        status="OPEN",
-                        brokerage_id=BROKERAGE_ID
-                    )
-                    await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
-                    return data
-                else:
-                    print(f"❌ Erro ao enviar ordem: status {resp.status}")
-                    return {}
-        except Exception as e:
-            print(f"⚠️ Erro ao enviar ordem: {e}")
-            return {}
+    # sessão persistente: a conexão já foi aquecida antes do horário (conexao.aguardar)
+    session = conexao.sessao()
+    try:
+        conexao.registrar("envio", alvo, etapa)
+        async with session.post(URL_OP, headers=headers, json=payload) as resp:
+            conexao.registrar("resposta", alvo, etapa)
+            if resp.status == 200:
+                data = await resp.json()
+                print("📤 Ordem enviada:", data)
+                # Criar registro da ordem imediatamente
+                await create_trade_order_info(
+                    user_id=USER_ID,
+                    order_id=data["id"],
+                    symbol=symbol,
+                    order_type=direction,
+                    quantity=amount,
+                    price=None,  # preço não fornecido pelo HB
+                    status="OPEN",
+                    brokerage_id=BROKERAGE_ID
+                )
+                control.abrir_ordem(data["id"], symbol=symbol, amount=amount, etapa=etapa)
+                return data
+            else:
+                print(f"❌ Erro ao enviar ordem: status {resp.status}")
+                return {}
+    except Exception as e:
+        print(f"⚠️ Erro ao enviar ordem: {e}")
+        return {}
 
 
 async def verificar_resultado(op_id: str, etapa: str):
     """Consulta resultado da operação"""
     await ensure_login()
-    url = f"https://bot-trade-api.homebroker.com/op/get/{op_id}"
+    url = f"{HB_TRADE_URL}/op/get/{op_id}"
     headers = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
 
-    async with aiohttp.ClientSession() as session:
-        while True:
-            await asyncio.sleep(5)
-            async with session.get(url, headers=headers) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    result = data.get("result")
-                    print(f"📊 Status {etapa}: {result}")
-                    if result in ["Gain", "Loss", "Draw"]:
-                        return data
-                else:
-                    print(f"⚠️ Erro ao checar ordem {op_id}: {resp.status}")
+    session = conexao.sessao()
+    while True:
+        await relogio.dormir(5)
+        async with session.get(url, headers=headers) as resp:
+            if resp.status == 200:
+                data = await resp.json()
+                result = data.get("result")
+                print(f"📊 Status {etapa}: {result}")
+                if result in ["Gain", "Loss", "Draw"]:
+                    return data
+            else:
+                print(f"⚠️ Erro ao checar ordem {op_id}: {resp.status}")
 
 
-async def aguardar_horario(horario: str, etapa: str):
-    print(f"⏳ Aguardando horário {horario} ({etapa})")
-    tz_brasilia = pytz.timezone("America/Sao_Paulo")
-    target_time = datetime.strptime(horario, "%H:%M").time()
-    while True:
-        agora = datetime.now(tz_brasilia).time()
-        if agora >= target_time:
-            return
-        await asyncio.sleep(1)
+async def aquecer_ordem():
+    """Renova o token se estiver perto de expirar e abre a conexão com o endpoint de ordens"""
+    await ensure_login(margem=TOKEN_MIN_TTL)
+    await conexao.aquecer(URL_OP, {"Authorization": f"Bearer {ACCESS_TOKEN}"})
+
+
+async def aguardar_horario(horario: str, etapa: str) -> float:
+    """Dorme até o horário exato, aquecendo conexão e token alguns segundos antes"""
+    return await conexao.aguardar(horario, etapa, preparar=aquecer_ordem)
 
 
 async def aguardar_e_executar_entradas(data):
@@ -161,6 +226,7 @@ async def aguardar_e_executar_entradas(data):
     direction = data["direction"]
     symbol = data["symbol"]
 
+    from api import get_bot_options
     bot_options = await get_bot_options(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
     amount = bot_options["entry_price"]
     isDemo = bot_options["is_demo"]
@@ -169,8 +235,12 @@ async def aguardar_e_executar_entradas(data):
     is_auto = bot_options.get("is_auto")
 
     # Entrada principal
-    await aguardar_horario(entrada, "Entrada Principal")
-    order = await realizar_compra(isDemo, close_type, direction, symbol, amount, datetime.utcnow().isoformat() + "Z")
+    alvo = await aguardar_horario(entrada, "Entrada Principal")
+    if control.parado.is_set():
+        print("🛑 Stop atingido — entrada cancelada.")
+        return
+    order = await realizar_compra(isDemo, close_type, direction, symbol, amount, datetime.utcnow().isoformat() + "Z",
+                                   "Entrada Principal", alvo)
 
     if not order.get("id"):
         print("❌ Falha ao abrir ordem principal")
@@ -182,68 +252,110 @@ async def aguardar_e_executar_entradas(data):
     pnl = result_data.get("profit_usd_cents", 0) / 100
 
     if result == "Gain":
-        await update_win_value(user_id=USER_ID, win_value=pnl, brokerage_id=BROKERAGE_ID)
-        await update_trade_order_info(order_id=op_id, user_id=USER_ID, status="WON", pnl=pnl)
-        await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
+        liquidar_em_segundo_plano(op_id, "WON", pnl, win_value=pnl)
         return
 
-    await update_loss_value(user_id=USER_ID, loss_value=amount, brokerage_id=BROKERAGE_ID)
-    await update_trade_order_info(order_id=op_id, user_id=USER_ID, status="LOST", pnl=pnl)
-    await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
+    liquidar_em_segundo_plano(op_id, "LOST", pnl, loss_value=amount)
 
     if is_auto:
         # Gale 1
         if (result in ["Loss", "Draw"]) and gale1 and gale_one_value:
-            await aguardar_horario(gale1, "Gale 1")
-            order_g1 = await realizar_compra(isDemo, close_type, direction, symbol, gale_one_value, datetime.utcnow().isoformat() + "Z")
+            alvo = await aguardar_horario(gale1, "Gale 1")
+            if control.parado.is_set():
+                print("🛑 Stop atingido — Gale 1 cancelado.")
+                return
+            order_g1 = await realizar_compra(isDemo, close_type, direction, symbol, gale_one_value, datetime.utcnow().isoformat() + "Z",
+                                       "Gale 1", alvo)
             if order_g1.get("id"):
                 res_g1 = await verificar_resultado(order_g1["id"], "Gale 1")
                 res_g1_pnl = res_g1.get("profit_usd_cents", 0) / 100
                 if res_g1.get("result") == "Gain":
-                    await update_win_value(user_id=USER_ID, win_value=res_g1_pnl, brokerage_id=BROKERAGE_ID)
-                    await update_trade_order_info(order_id=order_g1["id"], user_id=USER_ID, status="WON NA GALE 1", pnl=res_g1_pnl)
-                    await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
+                    liquidar_em_segundo_plano(order_g1["id"], "WON NA GALE 1", res_g1_pnl, win_value=res_g1_pnl)
                 else:
-                    await update_loss_value(user_id=USER_ID, loss_value=gale_one_value, brokerage_id=BROKERAGE_ID)
-                    await update_trade_order_info(order_id=order_g1["id"], user_id=USER_ID, status="LOST", pnl=res_g1_pnl)
-                    await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
+                    liquidar_em_segundo_plano(order_g1["id"], "LOST", res_g1_pnl, loss_value=gale_one_value)
 
         # Gale 2
         if (result in ["Loss", "Draw"]) and gale2 and gale_two_value:
-            await aguardar_horario(gale2, "Gale 2")
-            order_g2 = await realizar_compra(isDemo, close_type, direction, symbol, gale_two_value, datetime.utcnow().isoformat() + "Z")
+            alvo = await aguardar_horario(gale2, "Gale 2")
+            if control.parado.is_set():
+                print("🛑 Stop atingido — Gale 2 cancelado.")
+                return
+            order_g2 = await realizar_compra(isDemo, close_type, direction, symbol, gale_two_value, datetime.utcnow().isoformat() + "Z",
+                                       "Gale 2", alvo)
             if order_g2.get("id"):
                 res_g2 = await verificar_resultado(order_g2["id"], "Gale 2")
                 res_g2_pnl = res_g2.get("profit_usd_cents", 0) / 100
                 if res_g2.get("result") == "Gain":
-                    await update_win_value(user_id=USER_ID, win_value=res_g2_pnl, brokerage_id=BROKERAGE_ID)
-                    await update_trade_order_info(order_id=order_g2["id"], user_id=USER_ID, status="WON NA GALE 2", pnl=res_g2_pnl)
-                    await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
+                    liquidar_em_segundo_plano(order_g2["id"], "WON NA GALE 2", res_g2_pnl, win_value=res_g2_pnl)
                 else:
-                    await update_loss_value(user_id=USER_ID, loss_value=gale_two_value, brokerage_id=BROKERAGE_ID)
-                    await update_trade_order_info(order_id=order_g2["id"], user_id=USER_ID, status="LOST", pnl=res_g2_pnl)
-                    await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
+                    liquidar_em_segundo_plano(order_g2["id"], "LOST", res_g2_pnl, loss_value=gale_two_value)
     else:
         print("📌 Modo manual: não executando gales.")
 
 
 # consumer
+async def consumir(queue):
+    async with queue.iterator() as queue_iter:
+        async for message in queue_iter:
+            async with message.process():
+                try:
+                    data = json.loads(message.body.decode())
+                    control.sinal_recebido()
+                    print("📥 Sinal recebido:", data)
+                    if not data.get("entry_time"):
+                        print(f"ℹ️ Mensagem ignorada (tipo: {data.get('type')}, sem entry_time).")
+                        continue
+                    if control.parado.is_set():
+                        print("🛑 Bot parado — sinal descartado.")
+                        continue
+                    if dispatcher.repetido(data):
+                        continue
+                    simbolo = assets.validar(data.get("symbol"))
+                    if not simbolo:
+                        print(f"🚫 Ativo {data.get('symbol')} fechado ou indisponível na corretora — sinal descartado.")
+                        continue
+                    data["symbol"] = simbolo
+                    # confirma na hora e entrega ao pool: a fila não espera o ciclo entrada/gale1/gale2
+                    dispatcher.despachar(data)
+                except Exception as e:
+                    print(f"❌ Erro ao processar mensagem: {e}")
+
+
 async def main():
-    await login_homebroker()
+    control.instalar_sinais()
     connection = await aio_pika.connect_robust(RABBITMQ_URL)
     channel = await connection.channel()
-    exchange = await channel.declare_exchange("xofre_signals", aio_pika.ExchangeType.FANOUT)
+    await control.conectar(channel)
+    # já no stop (ex.: reiniciado depois de stop_win/stop_loss): publica "stopped" e sai sem consumir
+    if await control.verificar_stop():
+        await control.encerrar()
+        await conexao.fechar()
+        await connection.close()
+        return
+    exchange = await channel.declare_exchange("xofre_signals.topic", aio_pika.ExchangeType.TOPIC)
     queue = await channel.declare_queue(exclusive=True)
-    await queue.bind(exchange)
-
-    print("✅ Aguardando sinais...")
-
-    async with queue.iterator() as queue_iter:
-        async for message in queue_iter:
-            async with message.process():
-                data = json.loads(message.body.decode())
-                print("📥 Sinal recebido:", data)
-                await aguardar_e_executar_entradas(data)
+    # começa recebendo tudo; o filtro das opções do bot é aplicado em segundo plano
+    await filtros.aplicar(queue, exchange, {filtros.TUDO})
+
+    print(f"✅ Aguardando sinais... ({(time.perf_counter() - INICIO_PROCESSO) * 1000:.0f} ms desde o start)")
+
+    dispatcher.iniciar(aguardar_e_executar_entradas)
+    consumo = asyncio.create_task(consumir(queue))
+    # heartbeat no canal de controle: o orquestrador sabe se o bot está vivo de verdade
+    control.iniciar_heartbeat(consumo, dispatcher.snapshot)
+    # Módulos adiados (api/aiohttp) são carregados só depois que a fila já está sendo consumida
+    control.rastrear(asyncio.create_task(control.aquecer_imports("api")))
+    control.rastrear(asyncio.create_task(login_homebroker()))
+    # filtro de sinais pelas opções do bot (religa a fila quando elas mudam)
+    filtros.iniciar(queue, exchange, USER_ID, BROKERAGE_ID)
+    # catálogo de ativos: loop contínuo, fora da drenagem (control.rastrear)
+    assets.iniciar(headers_homebroker)
+    # Stop local ou SIGTERM: para de aceitar entradas, drena o que está aberto e sai
+    await control.parado.wait()
+    await control.encerrar()
+    consumo.cancel()
+    await conexao.fechar()
+    await connection.close()
 
 
 if __name__ == "__main__":
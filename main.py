@@ -1,11 +1,23 @@
 import os
+import json
+import time
+import asyncio
 import secrets
 import docker
 import api
+import control
+import estado
+import reconciliacao
+import agenda
+import backtest
+import historico
+import qualidade
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.security import HTTPBasicCredentials, HTTPBasic
 from fastapi import Depends, HTTPException, status
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 import base64
 
@@ -33,6 +45,26 @@ client = docker.from_env()
 # Rede padrão compartilhada entre bots/APIs (ajuste via .env se quiser outro nome)
 DOCKER_NETWORK = os.getenv("DOCKER_NETWORK", "botnet")
 
+# Prazo do docker stop: o worker drena no SIGTERM (DRAIN_TIMEOUT) e só leva SIGKILL depois disso
+BOT_STOP_TIMEOUT = int(os.getenv("BOT_STOP_TIMEOUT", "120"))
+BOT_DRAIN_TIMEOUT = max(BOT_STOP_TIMEOUT - 10, 1)
+
+# Quantos bots uma chamada /bulk executa ao mesmo tempo (backend + Docker)
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "16"))
+
+_paradas = set()
+
+def parar_container(container, reiniciar: bool = False):
+    """
+    Envia SIGTERM (docker stop/restart com timeout) em segundo plano.
+    O worker drena as ordens abertas e reporta o progresso pelo canal de controle.
+    """
+    acao = container.restart if reiniciar else container.stop
+    task = asyncio.create_task(asyncio.to_thread(acao, timeout=BOT_STOP_TIMEOUT))
+    _paradas.add(task)
+    task.add_done_callback(_paradas.discard)
+    return task
+
 def ensure_network(name: str):
     """Garante que a rede existe. Se for externa já criada via CLI, apenas ignora."""
     try:
@@ -87,28 +119,18 @@ def get_basic_credentials(credentials: HTTPBasicCredentials = Depends(security))
         )
     return credentials.username
 
-@app.get("/start/{user_id}/{brokerage_id}")
-async def start_container(
-    user_id: int,
-    brokerage_id: int,
-    credentials: HTTPBasicCredentials = Depends(get_basic_credentials)
-):
-    if brokerage_id not in BROKERAGE_CONFIGS:
-        return {"message": "Corretora não suportada."}
+@app.on_event("startup")
+async def iniciar_canal_controle():
+    # Workers reportam heartbeat e stop_win/stop_loss pelo canal de controle e encerram sozinhos
+    control.iniciar()
+    # Win rate, ritmo e latência de cada canal de sinais, direto dos exchanges dos publishers
+    qualidade.iniciar()
 
+async def montar_ambiente(user_id: int, brokerage_id: int):
+    """Variáveis de ambiente do container do bot: (env_vars, None) ou (None, resposta de erro)."""
     config = BROKERAGE_CONFIGS[brokerage_id]
-    image_name = config["image"]
-
-    status_bot = await api.get_status_bot(user_id, brokerage_id)
-    bot_options = await api.get_bot_options(user_id, brokerage_id)
-    await api.reset_stop_values(user_id, brokerage_id)
-
-    user_brokerages = await api.get_user_brokerages(user_id, brokerage_id)
-
-    if bot_options['stop_loss'] <= 0 or bot_options['stop_win'] <= 0 or bot_options['entry_price'] <= 0:
-        return {'message': 'Configurações base faltando'}
-
     usa_api_key = config.get("auth_type") == "apikey"
+    user_brokerages = await api.get_user_brokerages(user_id, brokerage_id)
 
     rabbit_user = os.environ.get('RABBITMQ_USER', '')
     rabbit_pass = os.environ.get('RABBITMQ_PASS', '')
@@ -124,6 +146,7 @@ async def start_container(
         'API_USER': os.environ.get("API_USER"),
         'API_PASS': os.environ.get("API_PASS"),
         'TOKEN_TELEGRAM': os.environ.get("TOKEN_TELEGRAM"),
+        'DRAIN_TIMEOUT': str(BOT_DRAIN_TIMEOUT),
     }
 
     # Passa HB_LOGIN_APP e HB_PASSWORD_APP apenas se corretora for 4
@@ -133,8 +156,8 @@ async def start_container(
         print("✅ HB_LOGIN_APP e HB_PASSWORD_APP adicionados ao container")
 
     if usa_api_key:
-        get_api_key = await api.get_api_key(user_id, brokerage_id)
-        api_key = get_api_key.get('api_key')
+        # api_key vem no mesmo user-brokerages já lido acima
+        api_key = user_brokerages.get('api_key')
         if api_key:
             try:
                 decoded_api_key = base64.b64decode(api_key).decode('utf-8')
@@ -142,7 +165,7 @@ async def start_container(
                 print('✅ API_TOKEN decodificada.')
             except Exception as e:
                 print(f"⚠️ Erro ao decodificar api_key: {e}")
-                return {'message': 'Falha ao decodificar api_key'}
+                return None, {'message': 'Falha ao decodificar api_key'}
         else:
             print("ℹ️ Nenhuma API Key fornecida (não necessária para essa corretora)")
     else:
@@ -156,67 +179,178 @@ async def start_container(
                 print('✅ Senha decodificada com sucesso')
             except Exception as e:
                 print(f"⚠️ Erro ao decodificar senha: {e}")
-                return {'message': 'Falha ao decodificar senha da corretora'}
+                return None, {'message': 'Falha ao decodificar senha da corretora'}
         else:
             print("ℹ️ Nenhuma senha fornecida (não necessária para essa corretora)")
 
         env_vars['BROKERAGE_USERNAME'] = username
         env_vars['BROKERAGE_PASSWORD'] = decoded_password
 
-    container_name = f"bot_{user_id}_{brokerage_id}"
-    containers = client.containers.list(all=True)
-
-    for container in containers:
-        if container.name == container_name:
-            if container.status == 'running' and status_bot == 1:
-                return {'message': 'App já iniciado!'}
-            if container.status == 'exited':
-                await api.update_status_bot(user_id, 1, brokerage_id)
-                container.start()
-                return {'message': 'App iniciado!'}
+    return env_vars, None
 
+def criar_container(user_id: int, brokerage_id: int, env_vars: dict):
     ensure_network(DOCKER_NETWORK)
-
-    await api.update_status_bot(user_id, 1, brokerage_id)
+    container_name = f"bot_{user_id}_{brokerage_id}"
     client.containers.create(
-        image=image_name,
+        image=BROKERAGE_CONFIGS[brokerage_id]["image"],
         name=container_name,
         detach=True,
         environment=env_vars,
         network=DOCKER_NETWORK
     )
     client.containers.get(container_name).start()
+
+async def recriar_container(user_id: int, brokerage_id: int):
+    """Usado pela reconciliação quando o container de um bot que deveria rodar não existe."""
+    env_vars, erro = await montar_ambiente(user_id, brokerage_id)
+    if erro:
+        raise RuntimeError(erro['message'])
+    await asyncio.to_thread(criar_container, user_id, brokerage_id, env_vars)
+
+@app.on_event("startup")
+async def iniciar_reconciliacao():
+    # Estado desejado local: bots que deveriam estar rodando voltam sozinhos (ex.: reboot do host)
+    reconciliacao.iniciar(client, recriar_container, parar_container)
+    # Janelas de sessão: starts, drenagens e resets diários em lote nas bordas
+    agenda.iniciar(executar_lote)
+
+async def _container(container_name: str, containers: dict | None):
+    """Container pelo nome; em lote usa a listagem única feita no início (containers)."""
+    if containers is not None:
+        return containers.get(container_name)
+    try:
+        return await asyncio.to_thread(client.containers.get, container_name)
+    except docker.errors.NotFound:
+        return None
+
+def listar_containers() -> dict:
+    return {c.name: c for c in client.containers.list(all=True, filters={"name": "bot_"})}
+
+async def iniciar_bot(user_id: int, brokerage_id: int, containers: dict | None = None):
+    if brokerage_id not in BROKERAGE_CONFIGS:
+        return {"message": "Corretora não suportada."}
+
+    # bot_status vem no mesmo bot-options: uma leitura só
+    bot_options = await api.get_bot_options(user_id, brokerage_id)
+    status_bot = bot_options.get('bot_status')
+
+    if bot_options['stop_loss'] <= 0 or bot_options['stop_win'] <= 0 or bot_options['entry_price'] <= 0:
+        return {'message': 'Configurações base faltando'}
+
+    (env_vars, erro), _ = await asyncio.gather(
+        montar_ambiente(user_id, brokerage_id),
+        api.reset_stop_values(user_id, brokerage_id),
+    )
+    if erro:
+        return erro
+
+    container_name = f"bot_{user_id}_{brokerage_id}"
+    container = await _container(container_name, containers)
+
+    if container is not None:
+        if container.status == 'running' and status_bot == 1:
+            estado.desejar(user_id, brokerage_id, estado.RODANDO, "start")
+            return {'message': 'App já iniciado!'}
+        if container.status == 'exited':
+            await api.update_status_bot(user_id, 1, brokerage_id)
+            estado.desejar(user_id, brokerage_id, estado.RODANDO, "start")
+            control.limpar_drenagem(user_id, brokerage_id)
+            await asyncio.to_thread(container.start)
+            return {'message': 'App iniciado!'}
+
+    await api.update_status_bot(user_id, 1, brokerage_id)
+    estado.desejar(user_id, brokerage_id, estado.RODANDO, "start")
+    await asyncio.to_thread(criar_container, user_id, brokerage_id, env_vars)
     return {'message': 'Bot created and started'}
 
-@app.get("/stop/{user_id}/{brokerage_id}")
-async def stop_container(user_id: int, brokerage_id: int, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+async def parar_bot(user_id: int, brokerage_id: int, containers: dict | None = None):
     status_bot = await api.get_status_bot(user_id, brokerage_id)
     if status_bot == 0:
+        estado.desejar(user_id, brokerage_id, estado.PARADO, "stop")
         return {'message': 'App já parado!'}
 
-    container_name = f'bot_{user_id}_{brokerage_id}'
-    containers = client.containers.list(all=True)
+    container = await _container(f'bot_{user_id}_{brokerage_id}', containers)
+    if container is None:
+        return {'message': 'Container not found'}
 
-    for container in containers:
-        if container.name == container_name:
-            await api.update_status_bot(user_id, 0, brokerage_id)
-            if container.status == 'running':
-                container.kill()
-                return {'message': 'App parado!'}
-            return {'message': 'App já parado!'}
+    await api.update_status_bot(user_id, 0, brokerage_id)
+    estado.desejar(user_id, brokerage_id, estado.PARADO, "stop")
+    if container.status == 'running':
+        parar_container(container)
+        return {'message': 'App parando! Drenando ordens abertas.'}
+    return {'message': 'App já parado!'}
+
+async def reiniciar_bot(user_id: int, brokerage_id: int, containers: dict | None = None):
+    container = await _container(f'bot_{user_id}_{brokerage_id}', containers)
+    if container is None:
+        return {'message': 'Container not found'}
 
+    await api.update_status_bot(user_id, 1, brokerage_id)
+    estado.desejar(user_id, brokerage_id, estado.RODANDO, "restart")
+    if container.status == 'running':
+        parar_container(container, reiniciar=True)
+        return {'message': 'App reiniciando! Drenando ordens abertas.'}
+    elif container.status == 'exited':
+        control.limpar_drenagem(user_id, brokerage_id)
+        await asyncio.to_thread(container.start)
+        return {'message': 'App iniciado!'}
     return {'message': 'Container not found'}
 
-@app.get("/status/{user_id}/{brokerage_id}")
-async def status_container(user_id: int, brokerage_id: int, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
-    container_name = f'bot_{user_id}_{brokerage_id}'
-    containers = client.containers.list(all=True)
+async def zerar_bot(user_id: int, brokerage_id: int, containers: dict | None = None):
+    """Reset diário dos contadores; bot que parou por stop_win/stop_loss volta a operar."""
+    await api.reset_stop_values(user_id, brokerage_id)
+    desejado = estado.bot(user_id, brokerage_id)
+    if desejado and desejado['desejado'] == estado.PARADO and desejado['motivo'] in control.STOP_STATUS:
+        return await iniciar_bot(user_id, brokerage_id, containers)
+    return {'message': 'Contadores zerados!'}
 
-    for container in containers:
-        if container.name == container_name:
-            return {'message': 'App rodando!' if container.status == 'running' else 'App parado!'}
+@app.get("/start/{user_id}/{brokerage_id}")
+async def start_container(
+    user_id: int,
+    brokerage_id: int,
+    credentials: HTTPBasicCredentials = Depends(get_basic_credentials)
+):
+    return await iniciar_bot(user_id, brokerage_id)
 
-    return {'message': 'Container not found'}
+@app.get("/stop/{user_id}/{brokerage_id}")
+async def stop_container(user_id: int, brokerage_id: int, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    return await parar_bot(user_id, brokerage_id)
+
+MENSAGENS_SAUDE = {
+    "ok": 'App rodando!',
+    "stuck": 'App travado!',
+    "stale": 'App sem resposta!',
+    "stopped": 'App parado!',
+}
+
+@app.get("/status/{user_id}/{brokerage_id}")
+async def status_container(user_id: int, brokerage_id: int, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    # Responde pelo heartbeat agregado do canal de controle; Docker só para bot que nunca reportou
+    saude = control.saude(user_id, brokerage_id)
+    if saude is not None:
+        resposta = {'message': MENSAGENS_SAUDE[saude['state']], 'health': saude}
+    else:
+        try:
+            container = client.containers.get(f'bot_{user_id}_{brokerage_id}')
+        except docker.errors.NotFound:
+            return {'message': 'Container not found'}
+        resposta = {'message': 'App rodando!' if container.status == 'running' else 'App parado!'}
+
+    progresso = control.drenagem(user_id, brokerage_id)
+    if progresso:
+        resposta['drain'] = progresso
+    return resposta
+
+@app.get("/health")
+async def health_bots(state: str | None = None, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    """Saúde de todos os bots que reportam heartbeat (sem chamadas ao Docker)."""
+    bots = control.saude_todos()
+    contagem = {}
+    for saude in bots.values():
+        contagem[saude['state']] = contagem.get(saude['state'], 0) + 1
+    if state:
+        bots = {chave: saude for chave, saude in bots.items() if saude['state'] == state}
+    return {'total': sum(contagem.values()), 'states': contagem, 'bots': bots}
 
 @app.get("/stop_loss/{user_id}/{brokerage_id}")
 async def stop_loss_container(user_id: int, brokerage_id: int, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
@@ -230,8 +364,9 @@ async def stop_loss_container(user_id: int, brokerage_id: int, credentials: HTTP
     for container in containers:
         if container.name == container_name:
             await api.update_status_bot(user_id, 3, brokerage_id)
+            estado.desejar(user_id, brokerage_id, estado.PARADO, "stop_loss")
             if container.status == 'running':
-                container.kill()
+                parar_container(container)
             return {'message': 'Stop loss ativado!'}
 
     return {'message': 'Container not found'}
@@ -248,25 +383,179 @@ async def stop_win_container(user_id: int, brokerage_id: int, credentials: HTTPB
     for container in containers:
         if container.name == container_name:
             await api.update_status_bot(user_id, 2, brokerage_id)
+            estado.desejar(user_id, brokerage_id, estado.PARADO, "stop_win")
             if container.status == 'running':
-                container.kill()
+                parar_container(container)
             return {'message': 'Stop win ativado!'}
 
     return {'message': 'Container not found'}
 
 @app.get("/restart/{user_id}/{brokerage_id}")
 async def restart_container(user_id: int, brokerage_id: int, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
-    container_name = f'bot_{user_id}_{brokerage_id}'
-    containers = client.containers.list(all=True)
+    return await reiniciar_bot(user_id, brokerage_id)
 
-    for container in containers:
-        if container.name == container_name:
-            await api.update_status_bot(user_id, 1, brokerage_id)
-            if container.status == 'running':
-                container.restart()
-                return {'message': 'App reiniciado!'}
-            elif container.status == 'exited':
-                container.start()
-                return {'message': 'App iniciado!'}
+class BotAlvo(BaseModel):
+    user_id: int
+    brokerage_id: int
 
-    return {'message': 'Container not found'}
+class Lote(BaseModel):
+    bots: list[BotAlvo]
+
+ACOES_EM_LOTE = {
+    "start": iniciar_bot,
+    "stop": parar_bot,
+    "restart": reiniciar_bot,
+    "reset": zerar_bot,
+}
+
+async def executar_lote(acao: str, bots: list[tuple[int, int]], containers: dict | None = None):
+    """
+    Executa a ação em todos os bots com no máximo BULK_CONCURRENCY ao mesmo tempo e
+    produz uma linha NDJSON por bot assim que ele termina, e um resumo no final.
+    Os containers são listados uma vez só para o lote inteiro (ou vêm prontos em containers);
+    se a listagem falhar, a única linha é o resumo com o erro.
+    """
+    inicio = time.perf_counter()
+    executar = ACOES_EM_LOTE[acao]
+    if containers is None:
+        try:
+            containers = await asyncio.to_thread(listar_containers)
+        except Exception as e:
+            print(f"❌ Lote {acao}: falha ao listar containers ({e})")
+            total = len(set(bots))
+            yield json.dumps({'done': True, 'action': acao, 'total': total, 'failed': total, 'error': str(e)}) + "\n"
+            return
+    sem = asyncio.Semaphore(BULK_CONCURRENCY)
+
+    async def um(user_id: int, brokerage_id: int):
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                resposta = await executar(user_id, brokerage_id, containers)
+                ok = True
+            except Exception as e:
+                resposta, ok = {'message': f'Erro: {e}'}, False
+            return {'user_id': user_id, 'brokerage_id': brokerage_id, 'action': acao, 'ok': ok,
+                    **resposta, 'ms': round((time.perf_counter() - t0) * 1000)}
+
+    # pares repetidos no corpo viram uma execução só
+    unicos = list(dict.fromkeys(bots))
+    falhas = 0
+    for tarefa in asyncio.as_completed([um(*b) for b in unicos]):
+        resultado = await tarefa
+        falhas += not resultado['ok']
+        yield json.dumps(resultado, ensure_ascii=False) + "\n"
+
+    resumo = {'done': True, 'action': acao, 'total': len(unicos), 'failed': falhas,
+              'elapsed_ms': round((time.perf_counter() - inicio) * 1000)}
+    print(f"📦 Lote {acao}: {resumo}")
+    yield json.dumps(resumo) + "\n"
+
+@app.post("/bulk/{acao}")
+async def bulk_action(acao: str, lote: Lote, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    if acao not in ACOES_EM_LOTE:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Ação inválida")
+    bots = [(b.user_id, b.brokerage_id) for b in lote.bots]
+    # antes do StreamingResponse: depois do 200 um erro só cortaria o corpo
+    try:
+        containers = await asyncio.to_thread(listar_containers)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=f"Docker indisponível: {e}")
+    return StreamingResponse(executar_lote(acao, bots, containers), media_type="application/x-ndjson")
+
+class Sessao(BaseModel):
+    start: str | None = Field(None, pattern=r"^([01]\d|2[0-3]):[0-5]\d$")
+    end: str | None = Field(None, pattern=r"^([01]\d|2[0-3]):[0-5]\d$")
+    days: list[int] = [0, 1, 2, 3, 4, 5, 6]
+    timezone: str = agenda.SESSION_DEFAULT_TZ
+    daily_reset: bool = True
+
+def _sessao_json(sessao: dict) -> dict:
+    return {
+        'start': sessao['inicio'], 'end': sessao['fim'],
+        'days': [int(d) for d in sessao['dias']],
+        'timezone': sessao['fuso'], 'daily_reset': bool(sessao['reset_diario']),
+    }
+
+@app.put("/session/{user_id}/{brokerage_id}")
+async def set_session(user_id: int, brokerage_id: int, sessao: Sessao, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    """Janela diária do bot (start/end em HH:MM no fuso); sem janela, só o reset diário."""
+    if (sessao.start is None) != (sessao.end is None) or sessao.start == sessao.end and sessao.start:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Janela inválida")
+    if any(d not in range(7) for d in sessao.days):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Dias inválidos (0=segunda ... 6=domingo)")
+    try:
+        hoje = agenda.hoje(sessao.timezone)
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Fuso inválido")
+    estado.salvar_sessao(user_id, brokerage_id, sessao.start, sessao.end,
+                         "".join(str(d) for d in sorted(set(sessao.days))), sessao.timezone, sessao.daily_reset)
+    # o reset de hoje conta como feito: salvar a sessão no meio do dia não zera os contadores
+    estado.marcar_disparos([(user_id, brokerage_id, "reset", hoje)])
+    return {'message': 'Sessão salva!', 'session': _sessao_json(estado.sessao(user_id, brokerage_id))}
+
+@app.get("/session/{user_id}/{brokerage_id}")
+async def get_session(user_id: int, brokerage_id: int, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    sessao = estado.sessao(user_id, brokerage_id)
+    if sessao is None:
+        return {'message': 'Sessão não encontrada'}
+    return {'session': _sessao_json(sessao)}
+
+@app.delete("/session/{user_id}/{brokerage_id}")
+async def delete_session(user_id: int, brokerage_id: int, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    if estado.remover_sessao(user_id, brokerage_id):
+        return {'message': 'Sessão removida!'}
+    return {'message': 'Sessão não encontrada'}
+
+@app.get("/stats/{user_id}/{brokerage_id}")
+async def get_stats(user_id: int, brokerage_id: int, days: int = 7, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    """Win rate, PnL, drawdown e uso de gale a partir do histórico local (sem chamar o backend)."""
+    stats = historico.estatisticas(user_id, brokerage_id, max(0, min(days, 366)))
+    if stats is None:
+        return {'message': 'Nenhum trade registrado'}
+    return {'user_id': user_id, 'brokerage_id': brokerage_id, 'stats': stats}
+
+@app.get("/quality")
+async def get_quality(bot: str | None = None, level: str = "channel", min_samples: int = 0, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    """Qualidade dos canais (ou canal+ativo / canal+timeframe), do melhor win rate para o pior."""
+    if level not in qualidade.NIVEIS:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Nível inválido")
+    return {'level': level, 'window': qualidade.QUALITY_WINDOW, 'items': qualidade.listar(bot, level, min_samples)}
+
+@app.get("/quality/gate/{bot}/{channel}")
+async def get_quality_gate(bot: str, channel: str, symbol: str | None = None, min_win_rate: float | None = None,
+                           min_samples: int | None = None, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    """Se sinais do canal (e do ativo) devem passar, pelo win rate da janela recente."""
+    return qualidade.gate(bot, channel, symbol, min_win_rate, min_samples)
+
+@app.get("/quality/metrics", response_class=PlainTextResponse)
+async def get_quality_metrics(credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    return qualidade.metricas()
+
+class Backtest(BaseModel):
+    brokerage: str = Field("xofre", pattern=r"^(xofre|home_broker|avalon|polarium)$")
+    entry_price: list[float] = [5]
+    gale_one: list[bool] = [True]
+    gale_two: list[bool] = [True]
+    gale_one_value: list[float] = [10]
+    gale_two_value: list[float] = [20]
+    stop_win: list[float] = [50]
+    stop_loss: list[float] = [50]
+    payout: float = Field(backtest.BACKTEST_PAYOUT, gt=0)
+    since: str | None = Field(None, pattern=r"^\d{4}-\d{2}-\d{2}$")
+    until: str | None = Field(None, pattern=r"^\d{4}-\d{2}-\d{2}$")
+    top: int = Field(20, ge=1, le=500)
+    order_by: str = Field("profit", pattern="^(" + "|".join(backtest.ORDENACOES) + ")$")
+
+@app.post("/backtest")
+async def run_backtest(config: Backtest, credentials: HTTPBasicCredentials = Depends(get_basic_credentials)):
+    """Cada campo de parâmetro é uma lista de valores; a grade inteira é simulada nos sinais gravados."""
+    valores = {nome: getattr(config, nome) for nome in backtest.PARAMETROS}
+    try:
+        # NumPy fora do event loop: o resto da API continua respondendo
+        return await asyncio.to_thread(backtest.avaliar, config.brokerage, valores, config.payout,
+                                       config.since, config.until, config.top, config.order_by)
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Gravação de sinais não encontrada")
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
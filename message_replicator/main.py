@@ -1,7 +1,15 @@
 import os
 import re
+import json
+import time
+import asyncio
+import importlib.util
+from datetime import datetime, timezone
 from telethon import TelegramClient, events
+from telethon.errors import FloodWaitError
 from dotenv import load_dotenv
+import dedup
+import gravacao
 
 # Carrega o .env dentro do container
 load_dotenv()
@@ -19,27 +27,43 @@ def get_env_var(key, cast_func=str):
 API_ID = get_env_var("API_ID", int)
 API_HASH = get_env_var("API_HASH")
 
-FROM_CHAT_AVALON = get_env_var("FROM_CHAT_AVALON", int)
-TO_CHAT_AVALON   = get_env_var("TO_CHAT_AVALON", int)
-
-FROM_CHAT_POLARIUM = get_env_var("FROM_CHAT_POLARIUM", int)
-TO_CHAT_POLARIUM   = get_env_var("TO_CHAT_POLARIUM", int)
-
-FROM_CHAT_XOFRE = get_env_var("FROM_CHAT_XOFRE", int)
-TO_CHAT_XOFRE   = get_env_var("TO_CHAT_XOFRE", int)
-
-FROM_CHAT_HOME_BROKER = get_env_var("FROM_CHAT_HOME_BROKER", int)
-TO_CHAT_HOME_BROKER   = get_env_var("TO_CHAT_HOME_BROKER", int)
+# Tabela de rotas (chat de origem -> destinos + parser), recarregada quando o arquivo muda.
+# Sem o arquivo, as rotas vêm das variáveis FROM_CHAT_*/TO_CHAT_* das quatro corretoras.
+ROUTES_PATH = os.getenv("ROUTES_PATH", "routes.json")
+ROUTES_RELOAD_INTERVAL = float(os.getenv("ROUTES_RELOAD_INTERVAL", "5"))
+ROTAS_LEGADAS = ("AVALON", "POLARIUM", "XOFRE", "HOME_BROKER")
 
 # Encaminhar tudo? (padrão: False -> filtra pelos formatos novos)
 FORWARD_ALL = os.getenv("FORWARD_ALL", "false").strip().lower() in ("1","true","yes","y")
 
 print(f'api_id: {API_ID} api_hash: {API_HASH}')
-print(f'avalon:   from={FROM_CHAT_AVALON} to={TO_CHAT_AVALON}')
-print(f'polarium: from={FROM_CHAT_POLARIUM} to={TO_CHAT_POLARIUM}')
-print(f'xofre:    from={FROM_CHAT_XOFRE} to={TO_CHAT_XOFRE}')
-print(f'home_brk: from={FROM_CHAT_HOME_BROKER} to={TO_CHAT_HOME_BROKER}')
+# Publicação direta no exchange (parser compartilhado dos sinal_*), sem o segundo salto
+# pelo Telegram até o bot publisher. Lista de parsers ou "all" (ex.: avalon,xofre);
+# vale para as rotas que não definem "direto" no arquivo de rotas.
+_direct = os.getenv("DIRECT_PUBLISH", "").strip().lower()
+DIRECT_PUBLISH = {"avalon", "polarium", "xofre", "home_broker"} if _direct == "all" else \
+    {b.strip() for b in _direct.split(",") if b.strip()}
+# Rota com publicação direta só encaminha ao TO_CHAT_* se pedir ("encaminhar": true na
+# rota ou este padrão ligado): o publisher_* desse chat publicaria o sinal de novo.
+FORWARD_TO_TELEGRAM = os.getenv("FORWARD_TO_TELEGRAM", "false").strip().lower() in ("1","true","yes","y")
+# Parsers cujo publisher_* (ou webhook) está no ar, além dos que servem rotas sem
+# publicação direta; rota direta que encaminha para eles é recusada (sinal duplicado)
+PUBLISHERS_LIVE = {b.strip() for b in os.getenv("PUBLISHERS_LIVE", "").lower().split(",") if b.strip()}
+RABBITMQ_URL = os.getenv("RABBITMQ_URL")
+# Raiz onde ficam as pastas sinal_*/parser.py
+PARSERS_ROOT = os.getenv("PARSERS_ROOT", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 print(f'forward_all: {FORWARD_ALL}')
+print(f'direct_publish: {sorted(DIRECT_PUBLISH) or "-"} forward_to_telegram: {FORWARD_TO_TELEGRAM} '
+      f'publishers_live: {sorted(PUBLISHERS_LIVE) or "-"}')
+# Limites de encaminhamento (Telegram: ~20 msgs/min por grupo e ~30 msgs/s por conta).
+# Cada destino tem fila própria e token bucket próprio; o bucket global cobre a conta.
+FORWARD_RATE_PER_CHAT = float(os.getenv("FORWARD_RATE_PER_CHAT", "0.33"))   # msgs/s
+FORWARD_BURST_PER_CHAT = float(os.getenv("FORWARD_BURST_PER_CHAT", "3"))
+FORWARD_GLOBAL_RATE = float(os.getenv("FORWARD_GLOBAL_RATE", "25"))          # msgs/s
+FORWARD_QUEUE_SIZE = int(os.getenv("FORWARD_QUEUE_SIZE", "100"))
+FORWARD_MAX_RETRIES = int(os.getenv("FORWARD_MAX_RETRIES", "5"))
+print(f'forward_rate: {FORWARD_RATE_PER_CHAT}/s por chat (burst {FORWARD_BURST_PER_CHAT:g}), {FORWARD_GLOBAL_RATE}/s global')
 
 # ---------------- Filtros de conteúdo ----------------
 # Aceita pares com -, ex.: EURUSD-OTC, e timeframe em vários formatos (1, 5, M1, 1m, 1 min)
@@ -98,10 +122,254 @@ def is_relevant_text(text: str) -> tuple[bool, str]:
 
     return True, ""
 
+# ---------------- Publicação direta ----------------
+def _carregar_parser(bot: str):
+    """Importa sinal_<bot>/parser.py pelo caminho (os quatro módulos se chamam parser)."""
+    caminho = os.path.join(PARSERS_ROOT, f"sinal_{bot}", "parser.py")
+    spec = importlib.util.spec_from_file_location(f"parser_{bot}", caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+parsers = {}
+
+def parser_de(bot: str):
+    if bot not in parsers:
+        parsers[bot] = _carregar_parser(bot)
+    return parsers[bot]
+
+_rabbit = {"connection": None, "channel": None, "exchanges": {}}
+_rabbit_lock = asyncio.Lock()
+
+async def _exchange(bot: str):
+    """Exchange do bot numa conexão RabbitMQ única, aberta no primeiro sinal."""
+    import aio_pika
+    async with _rabbit_lock:
+        if _rabbit["connection"] is None:
+            _rabbit["connection"] = await aio_pika.connect_robust(RABBITMQ_URL)
+            _rabbit["channel"] = await _rabbit["connection"].channel()
+        if bot not in _rabbit["exchanges"]:
+            parser = parser_de(bot)
+            exchange = await _rabbit["channel"].declare_exchange(parser.TOPIC_EXCHANGE, aio_pika.ExchangeType.TOPIC)
+            # fanout legado recebe tudo do topic
+            legado = await _rabbit["channel"].declare_exchange(parser.EXCHANGE, aio_pika.ExchangeType.FANOUT)
+            await legado.bind(exchange, routing_key="#")
+            _rabbit["exchanges"][bot] = exchange
+        return _rabbit["exchanges"][bot]
+
+async def publicar(bot: str, payload: dict, origem: str):
+    """Publica no exchange topic do parser; origem (canal de onde veio o sinal) entra na routing key."""
+    import aio_pika
+    parser = parser_de(bot)
+    chave = parser.routing_key(payload, origem)
+    gravacao.gravar(parser.TOPIC_EXCHANGE, chave, payload)
+    exchange = await _exchange(bot)
+    await exchange.publish(
+        aio_pika.Message(
+            body=json.dumps(payload).encode(),
+            delivery_mode=aio_pika.DeliveryMode.NOT_PERSISTENT,
+            headers=parser.headers(payload, origem)
+        ),
+        routing_key=chave
+    )
+
+# ---------------- Rotas ----------------
+def _rota(nome: str, de, para, parser: str | None = None, direto: bool | None = None,
+          encaminhar: bool | None = None) -> dict:
+    parser = (parser or "").strip().lower() or None
+    if direto is None:
+        direto = parser in DIRECT_PUBLISH
+    if encaminhar is None:
+        # rota sem publicação direta existe para encaminhar; a direta só se pedir
+        encaminhar = FORWARD_TO_TELEGRAM if direto else True
+    if direto and not parser:
+        raise ValueError(f"rota {nome}: publicação direta exige parser")
+    if direto and not RABBITMQ_URL:
+        raise ValueError(f"rota {nome}: publicação direta exige RABBITMQ_URL")
+    return {
+        "nome": nome.upper(),
+        "de": int(de),
+        "para": [int(p) for p in (para if isinstance(para, list) else [para])],
+        "parser": parser,
+        "direto": bool(direto),
+        "encaminhar": bool(encaminhar),
+    }
+
+def carregar_rotas() -> dict:
+    """chat de origem -> [rotas]. Lê ROUTES_PATH ou, na falta dele, as variáveis legadas."""
+    if os.path.exists(ROUTES_PATH):
+        with open(ROUTES_PATH, encoding="utf-8") as f:
+            lista = [_rota(**r) for r in json.load(f)["rotas"]]
+    else:
+        lista = [
+            _rota(nome, get_env_var(f"FROM_CHAT_{nome}", int), get_env_var(f"TO_CHAT_{nome}", int), nome.lower())
+            for nome in ROTAS_LEGADAS
+        ]
+    # publisher no ar: o das rotas que só encaminham (ele publica o que chega no destino)
+    ao_vivo = PUBLISHERS_LIVE | {r["parser"] for r in lista if not r["direto"] and r["parser"]}
+    for rota in lista:
+        if rota["direto"] and rota["encaminhar"] and rota["parser"] in ao_vivo:
+            raise ValueError(f"rota {rota['nome']}: publicação direta e encaminhamento para o publisher "
+                             f"{rota['parser']} no ar publicariam cada sinal duas vezes")
+    tabela = {}
+    for rota in lista:
+        if rota["direto"]:
+            parser_de(rota["parser"])  # falha aqui (e mantém a tabela anterior) se o parser não existir
+        tabela.setdefault(rota["de"], []).append(rota)
+    return tabela
+
+def _mostrar_rotas(tabela: dict):
+    for lista in tabela.values():
+        for rota in lista:
+            modo = f"direto:{rota['parser']}{'+encaminha' if rota['encaminhar'] else ''}" if rota["direto"] else "encaminha"
+            print(f"🧭 {rota['nome']:<12} from={rota['de']} to={rota['para']} ({modo})")
+
+def _mtime_rotas():
+    try:
+        return os.stat(ROUTES_PATH).st_mtime
+    except FileNotFoundError:
+        return None
+
+rotas = carregar_rotas()
+_rotas_mtime = _mtime_rotas()
+print(f"🧭 {sum(len(v) for v in rotas.values())} rotas carregadas ({ROUTES_PATH if _rotas_mtime else 'variáveis FROM_CHAT_*/TO_CHAT_*'})")
+_mostrar_rotas(rotas)
+
+async def vigiar_rotas():
+    """Recarrega a tabela quando o arquivo muda; arquivo inválido mantém a tabela atual."""
+    global rotas, _rotas_mtime
+    while True:
+        await asyncio.sleep(ROUTES_RELOAD_INTERVAL)
+        mtime = _mtime_rotas()
+        if mtime is None or mtime == _rotas_mtime:
+            continue
+        _rotas_mtime = mtime
+        try:
+            nova = carregar_rotas()
+        except Exception as e:
+            print(f"❌ {ROUTES_PATH} inválido, mantendo rotas atuais: {e}")
+            continue
+        rotas = nova  # troca atômica: o handler sempre vê uma tabela completa
+        print(f"🔄 Rotas recarregadas: {sum(len(v) for v in rotas.values())} rotas")
+        _mostrar_rotas(rotas)
+
+_vigia_rotas = None  # referência forte: o event loop só guarda uma fraca
+
+def _vigia_encerrada(task: asyncio.Task):
+    if task.cancelled():
+        return
+    if task.exception():
+        print(f"❌ Recarga de rotas parou: {task.exception()}")
+
 # ---------------- Client ----------------
-client = TelegramClient('user_session', API_ID, API_HASH)
+# flood_sleep_threshold=0: FloodWait sobe como exceção e é tratado na fila do destino,
+# em vez de o Telethon dormir dentro da chamada
+client = TelegramClient('user_session', API_ID, API_HASH, flood_sleep_threshold=0)
+
+# ---------------- Fila de encaminhamento ----------------
+filas = {}          # dest_chat -> asyncio.Queue de (msg_obj, dest_name)
+_baldes = {}        # dest_chat -> token bucket do destino
+_trabalhadores = {} # dest_chat -> task que esvazia a fila
+_balde_global = None
+
+def _novo_balde(taxa: float, capacidade: float) -> dict:
+    return {"taxa": taxa, "capacidade": capacidade, "tokens": capacidade, "ts": time.monotonic()}
+
+async def _consumir_token(balde: dict):
+    """Espera até o bucket ter 1 token e o consome."""
+    while True:
+        agora = time.monotonic()
+        balde["tokens"] = min(balde["capacidade"], balde["tokens"] + (agora - balde["ts"]) * balde["taxa"])
+        balde["ts"] = agora
+        if balde["tokens"] >= 1:
+            balde["tokens"] -= 1
+            return
+        await asyncio.sleep((1 - balde["tokens"]) / balde["taxa"])
+
+def encaminhar(msg_obj, dest_name: str, dest_chat: int):
+    """Enfileira o encaminhamento sem bloquear o handler; cada destino tem sua fila ordenada."""
+    global _balde_global
+    if _balde_global is None:
+        _balde_global = _novo_balde(FORWARD_GLOBAL_RATE, FORWARD_GLOBAL_RATE)
+    if dest_chat not in filas:
+        filas[dest_chat] = asyncio.Queue(maxsize=FORWARD_QUEUE_SIZE)
+        _baldes[dest_chat] = _novo_balde(FORWARD_RATE_PER_CHAT, FORWARD_BURST_PER_CHAT)
+        _trabalhadores[dest_chat] = asyncio.create_task(_esvaziar_fila(dest_chat))
+    try:
+        filas[dest_chat].put_nowait((msg_obj, dest_name))
+    except asyncio.QueueFull:
+        print(f"⚠️ [{dest_name}] Fila de encaminhamento cheia ({FORWARD_QUEUE_SIZE}) — mensagem descartada.")
+
+async def _esvaziar_fila(dest_chat: int):
+    fila = filas[dest_chat]
+    balde = _baldes[dest_chat]
+    while True:
+        msg_obj, dest_name = await fila.get()
+        tentativas = 0
+        while True:
+            await _consumir_token(balde)
+            await _consumir_token(_balde_global)
+            try:
+                await client.forward_messages(dest_chat, msg_obj)
+                print(f"📤 [{dest_name}] Mensagem encaminhada com sucesso -> {dest_chat} (fila: {fila.qsize()}).")
+                break
+            except FloodWaitError as e:
+                tentativas += 1
+                if tentativas > FORWARD_MAX_RETRIES:
+                    print(f"❌ [{dest_name}] FloodWait persistente — mensagem descartada após {FORWARD_MAX_RETRIES} tentativas.")
+                    break
+                # reagenda a MESMA mensagem (mantém a ordem); só este destino fica parado
+                print(f"⏳ [{dest_name}] FloodWait de {e.seconds}s em {dest_chat} — reenvio agendado (tentativa {tentativas}).")
+                balde["tokens"] = 0
+                await asyncio.sleep(e.seconds + 1)
+            except Exception as e:
+                print(f"❌ [{dest_name}] Erro ao encaminhar: {e}")
+                break
+
+def _encaminhar_rota(msg_obj, rota: dict):
+    for dest_chat in rota["para"]:
+        encaminhar(msg_obj, rota["nome"], dest_chat)
+
+async def _publicar_direto(event, rota: dict):
+    msg_obj = event.message
+    bot, dest_name = rota["parser"], rota["nome"]
+    text = getattr(msg_obj, "message", None) or ""
+    payload = parser_de(bot).parse(text)
+    if not payload:
+        print(f"ℹ️ [{dest_name}] Ignorado: formato não reconhecido pelo parser.")
+        if FORWARD_ALL and rota["encaminhar"]:
+            _encaminhar_rota(msg_obj, rota)
+        return
+
+    signal_id = dedup.registrar(bot, payload, event.chat_id, msg_obj.id)
+    if not signal_id:
+        print(f"♻️ [{dest_name}] Sinal duplicado ignorado: {payload}")
+        return
+    payload["signal_id"] = signal_id
+
+    inicio = time.perf_counter()
+    try:
+        await publicar(bot, payload, parser_de(bot).canal(getattr(event.chat, "username", None), event.chat_id))
+    except Exception as e:
+        print(f"❌ [{dest_name}] Erro ao publicar no RabbitMQ: {e}")
+        # não publicado: uma reentrega da mesma mensagem ainda deve passar
+        dedup.liberar(bot, payload, event.chat_id, msg_obj.id)
+        return
+    idade = (datetime.now(timezone.utc) - msg_obj.date).total_seconds() * 1000 if msg_obj.date else 0
+    print(f"⚡ [{dest_name}] Publicado direto em {(time.perf_counter() - inicio) * 1000:.1f} ms "
+          f"({idade:.0f} ms desde a mensagem de origem): {payload}")
+
+    # só depois de publicar: o encaminhamento não atrasa o sinal
+    if rota["encaminhar"]:
+        _encaminhar_rota(msg_obj, rota)
+
+async def _forward_if_relevant(event, rota: dict):
+    if rota["direto"]:
+        await _publicar_direto(event, rota)
+        return
+
+    dest_name = rota["nome"]
 
-async def _forward_if_relevant(event, dest_name: str, dest_chat: int):
     msg_obj = event.message
     text = getattr(msg_obj, "message", None)
 
@@ -115,30 +383,27 @@ async def _forward_if_relevant(event, dest_name: str, dest_chat: int):
                 print(f"   Conteúdo (preview): {preview}...")
             return
 
-    try:
-        print(f"📥 [{dest_name}] Mensagem recebida de chat_id={event.chat_id}")
-        await client.forward_messages(dest_chat, msg_obj)
-        print(f"📤 [{dest_name}] Mensagem encaminhada com sucesso -> {dest_chat}.")
-    except Exception as e:
-        print(f"❌ [{dest_name}] Erro ao encaminhar: {e}")
-
-# ---------------- Handlers ----------------
-@client.on(events.NewMessage(chats=FROM_CHAT_AVALON))
-async def handler_avalon(event):
-    await _forward_if_relevant(event, "AVALON", TO_CHAT_AVALON)
-
-@client.on(events.NewMessage(chats=FROM_CHAT_POLARIUM))
-async def handler_polarium(event):
-    await _forward_if_relevant(event, "POLARIUM", TO_CHAT_POLARIUM)
+    print(f"📥 [{dest_name}] Mensagem recebida de chat_id={event.chat_id}")
+    # reconexão do Telethon pode reentregar a mesma mensagem
+    if not dedup.registrar(f"fwd:{rota['nome']}", None, event.chat_id, msg_obj.id):
+        print(f"♻️ [{dest_name}] Mensagem {msg_obj.id} já encaminhada — ignorada.")
+        return
+    _encaminhar_rota(msg_obj, rota)
 
-@client.on(events.NewMessage(chats=FROM_CHAT_XOFRE))
-async def handler_xofre(event):
-    await _forward_if_relevant(event, "XOFRE", TO_CHAT_XOFRE)
+# ---------------- Handler ----------------
+# Um único handler sem filtro de chat: o custo por update é um lookup no dict,
+# independente de quantos canais estão na tabela de rotas.
+@client.on(events.NewMessage())
+async def handler(event):
+    for rota in rotas.get(event.chat_id, ()):
+        await _forward_if_relevant(event, rota)
 
-@client.on(events.NewMessage(chats=FROM_CHAT_HOME_BROKER))
-async def handler_home_broker(event):
-    await _forward_if_relevant(event, "HOME_BROKER", TO_CHAT_HOME_BROKER)
+async def main():
+    await client.start()
+    global _vigia_rotas
+    _vigia_rotas = asyncio.create_task(vigiar_rotas())
+    _vigia_rotas.add_done_callback(_vigia_encerrada)
+    print("🤖 Bot com Telethon iniciado... aguardando mensagens.")
+    await client.run_until_disconnected()
 
-print("🤖 Bot com Telethon iniciado... aguardando mensagens.")
-client.start()
-client.run_until_disconnected()
+client.loop.run_until_complete(main())
@@ -1,17 +1,27 @@
+import asyncio
 import aiohttp
 import os
-from dotenv import load_dotenv
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
 
-load_dotenv()
+if os.path.exists('.env'):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+TZ_BRASILIA = ZoneInfo('America/Sao_Paulo')
+
+# Base do backend; os testes de carga (benchmarks/carga.py) apontam para um stub local
+BACKEND_URL = os.getenv("BACKEND_URL", "https://api.multitradingob.com").rstrip("/")
+
+# serializa leitura+escrita dos totais de win/loss entre liquidações concorrentes
+_settle_lock = asyncio.Lock()
 
 
 async def get_bot_options(user_id:int, brokerage_id: int):
     async with aiohttp.ClientSession() as session:
         auth = aiohttp.BasicAuth(os.getenv('API_USER'), os.getenv('API_PASS'))
         headers = {'Authorization': auth.encode()}
-        async with session.get(f'https://api.multitradingob.com/bot-options/admin/{user_id}/{brokerage_id}', headers=headers) as response:
+        async with session.get(f'{BACKEND_URL}/bot-options/admin/{user_id}/{brokerage_id}', headers=headers) as response:
             return await response.json()
         
 
@@ -19,8 +29,7 @@ async def create_trade_order_info(user_id: int, order_id: str, symbol: str, orde
     async with aiohttp.ClientSession() as session:
         auth = aiohttp.BasicAuth(os.getenv('API_USER'), os.getenv('API_PASS'))
         headers = {'Authorization': auth.encode()}
-        hora_brasilia = pytz.timezone('America/Sao_Paulo')
-        hora_now = datetime.now(hora_brasilia)
+        hora_now = datetime.now(TZ_BRASILIA)
         print(f'hora: {hora_now.isoformat()}')
         data = {
             'user_id': user_id,
@@ -34,7 +43,7 @@ async def create_trade_order_info(user_id: int, order_id: str, symbol: str, orde
             'brokerage_id': brokerage_id,
             'pnl': 0
         }
-        async with session.post('https://api.multitradingob.com/trade-order-info', json=data, headers=headers) as response:
+        async with session.post(f'{BACKEND_URL}/trade-order-info', json=data, headers=headers) as response:
             return await response.json()
         
 
@@ -43,70 +52,64 @@ async def update_trade_order_info(order_id: str, user_id: int,  status: str, pnl
         auth = aiohttp.BasicAuth(os.getenv('API_USER'), os.getenv('API_PASS'))
         headers = {'Authorization': auth.encode()}
         data = {'user_id': user_id, 'order_id': order_id, 'status': status, 'pnl': pnl }
-        async with session.put(f'https://api.multitradingob.com/trade-order-info/{order_id}', json=data, headers=headers) as response:
+        async with session.put(f'{BACKEND_URL}/trade-order-info/{order_id}', json=data, headers=headers) as response:
             return await response.json()
 
 
-async def update_win_value(user_id: int, win_value: float, brokerage_id: int):
-    data = await get_bot_options(user_id, brokerage_id)
-
-    win_data_value = data['win_value']
-
-    if win_data_value >= 0:
-        win_data_value += win_value
-
-        async with aiohttp.ClientSession() as session:
-            auth = aiohttp.BasicAuth(os.getenv('API_USER'), os.getenv('API_PASS'))
-            headers = {'Authorization': auth.encode()}
-            data = {'win_value': win_data_value}
-            async with session.put(f'https://api.multitradingob.com/bot-options/admin/{user_id}/{brokerage_id}', json=data, headers=headers) as response:
-                return await response.json()
-
-
-async def update_loss_value(user_id: int, loss_value: float, brokerage_id: int):
-    data = await get_bot_options(user_id, brokerage_id)
-
-    loss_data_value = data['loss_value']
+def decide_stop(win_value: float, loss_value: float, stop_win: float, stop_loss: float):
+    """Decide localmente se os totais atingiram o stop. Retorna 'stop_win', 'stop_loss' ou None."""
+    if win_value >= stop_win:
+        print(f"🛑 Stop Win atingido: {win_value} >= {stop_win}")
+        return 'stop_win'
+    if loss_value >= stop_loss:
+        print(f"🛑 Stop Loss atingido: {loss_value} >= {stop_loss}")
+        return 'stop_loss'
+    return None
 
-    if loss_data_value >= 0:
-        loss_data_value += loss_value
 
-        async with aiohttp.ClientSession() as session:
-            auth = aiohttp.BasicAuth(os.getenv('API_USER'), os.getenv('API_PASS'))
-            headers = {'Authorization': auth.encode()}
-            data = {'loss_value': loss_data_value}
-            async with session.put(f'https://api.multitradingob.com/bot-options/admin/{user_id}/{brokerage_id}', json=data, headers=headers) as response:
-                return await response.json()
-        
-
-
-async def verify_stop_values(user_id: int, brokerage_id: int):
-            data = await get_bot_options(user_id, brokerage_id)
+async def update_stop_totals(user_id: int, brokerage_id: int, totals: dict):
+    async with aiohttp.ClientSession() as session:
+        auth = aiohttp.BasicAuth(os.getenv('API_USER'), os.getenv('API_PASS'))
+        headers = {'Authorization': auth.encode()}
+        async with session.put(f'{BACKEND_URL}/bot-options/admin/{user_id}/{brokerage_id}', json=totals, headers=headers) as response:
+            return await response.json()
 
-            stop_loss = data['stop_loss']
-            stop_win = data['stop_win']
-            win_value = data['win_value']
-            loss_value = data['loss_value']
 
-            if win_value >= stop_win:
-                print(f"🛑 Stop Win atingido: {win_value} >= {stop_win}")
-                async with aiohttp.ClientSession() as session:
-                    auth = aiohttp.BasicAuth(os.getenv('API_USER'), os.getenv('API_PASS'))
-                    headers = {'Authorization': auth.encode()}
-                    async with session.get(f'https://bot.multitradingob.com/stop_win/{user_id}/{brokerage_id}', headers=headers) as response:
-                        return await response.json()
-            elif loss_value >= stop_loss:
-                print(f"🛑 Stop Loss atingido: {loss_value} >= {stop_loss}")
-                async with aiohttp.ClientSession() as session:
-                    auth = aiohttp.BasicAuth(os.getenv('API_USER'), os.getenv('API_PASS'))
-                    headers = {'Authorization': auth.encode()}
-                    async with session.get(f'https://bot.multitradingob.com/stop_loss/{user_id}/{brokerage_id}', headers=headers) as response:
-                        return await response.json()
+async def settle_trade_order(user_id: int, brokerage_id: int, order_id: str, status: str, pnl: float, win_value: float = 0, loss_value: float = 0):
+    """
+    Liquida uma ordem com uma única leitura de bot-options:
+    calcula os novos totais, envia em paralelo os totais e o trade-order-info
+    e decide stop_win/stop_loss localmente a partir desses totais.
+    Retorna {'stop': 'stop_win'|'stop_loss'|None, 'win_value': ..., 'loss_value': ...};
+    o próprio worker aplica o stop (ver control.py).
+    """
+    async with _settle_lock:
+        data = await get_bot_options(user_id, brokerage_id)
+
+        win_total = data['win_value']
+        loss_total = data['loss_value']
+        totals = {}
+        if win_value and win_total >= 0:
+            win_total += win_value
+            totals['win_value'] = win_total
+        if loss_value and loss_total >= 0:
+            loss_total += loss_value
+            totals['loss_value'] = loss_total
+
+        writes = [update_trade_order_info(order_id, user_id, status, pnl)]
+        if totals:
+            writes.append(update_stop_totals(user_id, brokerage_id, totals))
+        for result in await asyncio.gather(*writes, return_exceptions=True):
+            if isinstance(result, Exception):
+                print(f"❌ Erro ao liquidar ordem {order_id}: {result}")
+
+    stop = decide_stop(win_total, loss_total, data['stop_win'], data['stop_loss'])
+    return {'stop': stop, 'win_value': win_total, 'loss_value': loss_total}
 
 
 async def get_user_brokerages(user_id: int, brokerage_id: int):
     async with aiohttp.ClientSession() as session:
         auth = aiohttp.BasicAuth(os.getenv('API_USER'), os.getenv('API_PASS'))
         headers = {'Authorization': auth.encode()}
-        async with session.get(f'https://api.multitradingob.com/user-brokerages/admin/{user_id}/{brokerage_id}', headers=headers) as response:
-            return await response.json()
\ No newline at end of file
+        async with session.get(f'{BACKEND_URL}/user-brokerages/admin/{user_id}/{brokerage_id}', headers=headers) as response:
+            return await response.json()
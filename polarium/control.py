@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import signal
+import asyncio
+import importlib
+import aio_pika
+
+# Exchange de controle compartilhado entre workers e orquestrador
+CONTROL_EXCHANGE = "bot_control"
+# Tempo máximo para concluir ordens abertas depois de um stop
+STOP_DRAIN_TIMEOUT = float(os.getenv("STOP_DRAIN_TIMEOUT", "300"))
+# Prazo de drenagem no SIGTERM (o orquestrador usa docker stop com timeout maior)
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "110"))
+# Intervalo entre os relatórios de progresso da drenagem
+DRAIN_REPORT_INTERVAL = 5
+# Intervalo do heartbeat publicado no canal de controle (estado real do worker)
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "10"))
+# Mensagens que não podem se perder com o orquestrador fora do ar (filas duráveis dele):
+# trades liquidados e o "stopped" que leva o motivo do stop (bot_status 2/3)
+TIPOS_DURAVEIS = {"trade", "stopped"}
+
+USER_ID = os.getenv("USER_ID")
+BROKERAGE_ID = os.getenv("BROKERAGE_ID")
+
+parado = asyncio.Event()
+motivo_parada = None
+totais = {}
+tarefas = set()
+ordens_abertas = {}
+ultimo_sinal = None
+_exchange = None
+_consumo = None
+_metricas = None
+_heartbeat = None
+
+
+async def conectar(channel):
+    """Declara o exchange de controle no canal do worker."""
+    global _exchange
+    _exchange = await channel.declare_exchange(CONTROL_EXCHANGE, aio_pika.ExchangeType.TOPIC)
+
+
+async def publicar(tipo: str, **dados):
+    """Publica uma mensagem de controle compacta (routing key: tipo.user.brokerage)."""
+    if _exchange is None:
+        return
+    body = {"type": tipo, "user_id": USER_ID, "brokerage_id": BROKERAGE_ID, "ts": time.time(), **dados}
+    try:
+        await _exchange.publish(
+            aio_pika.Message(
+                body=json.dumps(body).encode(),
+                delivery_mode=(aio_pika.DeliveryMode.PERSISTENT if tipo in TIPOS_DURAVEIS
+                               else aio_pika.DeliveryMode.NOT_PERSISTENT)
+            ),
+            routing_key=f"{tipo}.{USER_ID}.{BROKERAGE_ID}"
+        )
+    except Exception as e:
+        print(f"⚠️ Falha ao publicar controle '{tipo}': {e}")
+
+
+async def aquecer_imports(*modulos: str):
+    """
+    Importa em segundo plano os módulos adiados do caminho de startup
+    (api/aiohttp), depois que o worker já está consumindo a fila.
+    """
+    for nome in modulos:
+        await asyncio.to_thread(importlib.import_module, nome)
+
+
+def sinal_recebido():
+    """Marca a chegada de uma mensagem na fila de sinais (vai no heartbeat)."""
+    global ultimo_sinal
+    ultimo_sinal = time.time()
+
+
+def _estado_consumidor() -> str:
+    if _consumo is None:
+        return "starting"
+    if not _consumo.done():
+        return "running"
+    if _consumo.cancelled():
+        return "stopped"
+    return "dead" if _consumo.exception() else "stopped"
+
+
+def batimento(lag: float = 0) -> dict:
+    """Estado compacto do worker: consumidor, ordens abertas, último sinal e atraso do loop."""
+    agora = time.time()
+    mais_antiga = min((o["aberta_em"] for o in ordens_abertas.values()), default=None)
+    return {
+        "consumer": _estado_consumidor(),
+        "open_orders": len(ordens_abertas),
+        "oldest_order_age": round(agora - mais_antiga, 1) if mais_antiga else None,
+        "last_signal": ultimo_sinal,
+        "loop_lag_ms": round(lag * 1000, 1),
+        "pending": sum(1 for t in tarefas if not t.done()),
+        "stopping": parado.is_set(),
+        "dispatch": _metricas() if _metricas else None,
+    }
+
+
+async def _bater():
+    loop = asyncio.get_running_loop()
+    lag = 0
+    while True:
+        await publicar("heartbeat", **batimento(lag))
+        inicio = loop.time()
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        # quanto o loop demorou além do sleep: callbacks bloqueando o event loop
+        lag = max(loop.time() - inicio - HEARTBEAT_INTERVAL, 0)
+
+
+def iniciar_heartbeat(consumo: asyncio.Task, metricas=None):
+    """
+    Publica o heartbeat a cada HEARTBEAT_INTERVAL em segundo plano (fora da drenagem).
+    consumo: tarefa do consumidor AMQP; metricas: função com o snapshot do despacho.
+    """
+    global _consumo, _metricas, _heartbeat
+    _consumo = consumo
+    _metricas = metricas
+    if HEARTBEAT_INTERVAL > 0:
+        _heartbeat = asyncio.create_task(_bater())
+    return _heartbeat
+
+
+def rastrear(task: asyncio.Task):
+    """Mantém referência da tarefa até terminar (ordens e liquidações em andamento)."""
+    tarefas.add(task)
+    task.add_done_callback(tarefas.discard)
+    return task
+
+
+def abrir_ordem(order_id: str, **dados):
+    """Registra uma ordem enviada à corretora e ainda não liquidada."""
+    ordens_abertas[str(order_id)] = {"aberta_em": time.time(), **dados}
+
+
+def fechar_ordem(order_id: str, status: str | None = None, **resultado):
+    """
+    Tira a ordem das abertas. Com status (liquidação), publica o trade para o histórico
+    local do orquestrador (/stats): ativo, valor e etapa de abrir_ordem + pnl/win/loss.
+    """
+    ordem = ordens_abertas.pop(str(order_id), None) or {}
+    if status is None:
+        return
+    rastrear(asyncio.create_task(publicar(
+        "trade", order_id=str(order_id), status=status, symbol=ordem.get("symbol"),
+        amount=ordem.get("amount"), stage=ordem.get("etapa"), opened_at=ordem.get("aberta_em"), **resultado
+    )))
+
+
+def registrar_liquidacao(resultado: dict | None):
+    """Guarda os totais da última liquidação e aciona o stop decidido localmente."""
+    if not resultado:
+        return
+    totais.update(win_value=resultado.get("win_value"), loss_value=resultado.get("loss_value"))
+    if resultado.get("stop"):
+        acionar_stop(resultado["stop"])
+
+
+def acionar_stop(motivo: str):
+    """Para de aceitar sinais imediatamente; o encerramento acontece em encerrar()."""
+    global motivo_parada
+    if parado.is_set():
+        return
+    motivo_parada = motivo
+    print(f"🛑 {motivo} — novos sinais e gales pendentes serão descartados.")
+    parado.set()
+
+
+async def verificar_stop() -> str | None:
+    """
+    Antes de consumir: um worker reiniciado (restart, reconciliação) depois de atingir o
+    stop não volta a operar. Aciona o stop se os totais atuais já passaram dos limites.
+    Falha ao ler as opções não impede a partida (a liquidação volta a checar o stop).
+    """
+    from api import get_bot_options, decide_stop
+    try:
+        opcoes = await get_bot_options(USER_ID, BROKERAGE_ID)
+        motivo = decide_stop(opcoes['win_value'], opcoes['loss_value'], opcoes['stop_win'], opcoes['stop_loss'])
+    except Exception as e:
+        print(f"⚠️ Não foi possível verificar o stop na partida: {e}")
+        return None
+    if motivo:
+        totais.update(win_value=opcoes['win_value'], loss_value=opcoes['loss_value'])
+        acionar_stop(motivo)
+    return motivo
+
+
+def instalar_sinais():
+    """SIGTERM/SIGINT drenam o worker em vez de interrompê-lo no meio de uma ordem."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, acionar_stop, "sigterm")
+
+
+async def encerrar():
+    """
+    Drena o worker: conclui as ordens abertas e liquidações pendentes dentro do prazo
+    (STOP_DRAIN_TIMEOUT no stop, DRAIN_TIMEOUT no SIGTERM), reportando o progresso.
+    O que sobrar é cancelado e as ordens ainda abertas são marcadas como INTERRUPTED.
+    """
+    timeout = DRAIN_TIMEOUT if motivo_parada == "sigterm" else STOP_DRAIN_TIMEOUT
+    prazo = time.monotonic() + timeout
+    atual = asyncio.current_task()
+    while True:
+        pendentes = [t for t in tarefas if not t.done() and t is not atual]
+        if not pendentes:
+            break
+        restante = prazo - time.monotonic()
+        if restante <= 0:
+            for t in pendentes:
+                t.cancel()
+            await asyncio.gather(*pendentes, return_exceptions=True)
+            break
+        print(f"⏳ Drenando: {len(pendentes)} tarefa(s), {len(ordens_abertas)} ordem(ns) aberta(s)...")
+        await publicar("draining", reason=motivo_parada, pending=len(pendentes),
+                       open_orders=len(ordens_abertas), deadline_in=round(restante, 1))
+        await asyncio.wait(pendentes, timeout=min(restante, DRAIN_REPORT_INTERVAL))
+
+    interrompidas = list(ordens_abertas)
+    if interrompidas:
+        from api import update_trade_order_info
+        print(f"⚠️ {len(interrompidas)} ordem(ns) sem resultado no prazo — marcando INTERRUPTED.")
+        await asyncio.gather(*(
+            update_trade_order_info(order_id, USER_ID, "INTERRUPTED (drenagem)", 0)
+            for order_id in interrompidas
+        ), return_exceptions=True)
+        ordens_abertas.clear()
+
+    if _heartbeat:
+        _heartbeat.cancel()
+    await publicar("stopped", reason=motivo_parada, interrupted=len(interrompidas), **totais)
+    print(f"👋 Bot encerrado ({motivo_parada}).")
@@ -0,0 +1,128 @@
+import os
+import asyncio
+import traceback
+import control
+import relogio
+from collections import OrderedDict
+
+# Política para sinais que chegam enquanto outro ainda está em andamento:
+#   queue      -> um sinal por vez; os demais aguardam em fila (FIFO limitada)
+#   skip       -> um sinal por vez; sinais que chegam com o bot ocupado são descartados
+#   concurrent -> até MAX_CONCURRENT_SIGNALS sinais em paralelo; excedentes aguardam em fila
+OVERLAP_POLICY = os.getenv("SIGNAL_OVERLAP_POLICY", "queue").strip().lower()
+MAX_CONCURRENT_SIGNALS = int(os.getenv("MAX_CONCURRENT_SIGNALS", "3"))
+MAX_QUEUED_SIGNALS = int(os.getenv("MAX_QUEUED_SIGNALS", "10"))
+# Intervalo do relatório de métricas do pool no log (0 desliga)
+METRICS_INTERVAL = float(os.getenv("DISPATCH_METRICS_INTERVAL", "60"))
+# Quantos signal_id recentes são lembrados para processar cada sinal uma vez só
+MAX_SIGNAL_IDS = int(os.getenv("MAX_SIGNAL_IDS", "1000"))
+
+fila = None
+ocupados = 0
+idade_maxima = 0
+metricas = {"despachados": 0, "executados": 0, "erros": 0, "descartados": {}}
+_slots = []
+_vistos = OrderedDict()
+
+
+def iniciar(handler, max_idade: float = 0):
+    """
+    Sobe o pool de execução; o consumidor só chama despachar() e confirma a mensagem.
+    max_idade: sinais que esperaram mais que isso (segundos) na fila são descartados
+    em vez de virar ordem atrasada (MAX_SIGNAL_AGE sobrescreve; 0 desliga).
+    """
+    global fila, idade_maxima
+    if OVERLAP_POLICY not in ("queue", "skip", "concurrent"):
+        raise RuntimeError(f"❌ SIGNAL_OVERLAP_POLICY inválida: {OVERLAP_POLICY}")
+    idade_maxima = float(os.getenv("MAX_SIGNAL_AGE", max_idade))
+    fila = asyncio.Queue(maxsize=MAX_QUEUED_SIGNALS)
+    total = MAX_CONCURRENT_SIGNALS if OVERLAP_POLICY == "concurrent" else 1
+    for _ in range(total):
+        _slots.append(asyncio.create_task(_executar(handler)))
+    if METRICS_INTERVAL > 0:
+        _slots.append(asyncio.create_task(_reportar()))
+    print(f"⚙️ Despacho de sinais: política={OVERLAP_POLICY} slots={total} "
+          f"fila={MAX_QUEUED_SIGNALS} idade_max={idade_maxima or '-'}s")
+
+
+def despachar(data: dict) -> bool:
+    """Entrega o sinal ao pool sem bloquear. Retorna False se o sinal foi descartado."""
+    if OVERLAP_POLICY == "skip" and (ocupados or not fila.empty()):
+        return _descartar(data, "ocupado")
+    try:
+        fila.put_nowait((relogio.monotonico(), data))
+    except asyncio.QueueFull:
+        return _descartar(data, "fila_cheia")
+    metricas["despachados"] += 1
+    return True
+
+
+def repetido(data: dict) -> bool:
+    """True se o signal_id já passou por este worker (reentrega do broker ou publicação dupla)."""
+    signal_id = data.get("signal_id")
+    if not signal_id:
+        return False
+    if signal_id in _vistos:
+        _vistos.move_to_end(signal_id)
+        _descartar(data, "repetido")
+        return True
+    _vistos[signal_id] = True
+    if len(_vistos) > MAX_SIGNAL_IDS:
+        _vistos.popitem(last=False)
+    return False
+
+
+def snapshot() -> dict:
+    """Métricas do pool: profundidade da fila, em execução e descartes por motivo."""
+    return {
+        "fila": fila.qsize() if fila else 0,
+        "em_execucao": ocupados,
+        "despachados": metricas["despachados"],
+        "executados": metricas["executados"],
+        "erros": metricas["erros"],
+        "descartados": dict(metricas["descartados"]),
+    }
+
+
+def _descartar(data: dict, motivo: str) -> bool:
+    metricas["descartados"][motivo] = metricas["descartados"].get(motivo, 0) + 1
+    print(f"⏭️ Sinal descartado ({motivo}): {data.get('symbol')} {data.get('direction')}")
+    return False
+
+
+async def _executar(handler):
+    global ocupados
+    while True:
+        recebido_em, data = await fila.get()
+        if control.parado.is_set():
+            _descartar(data, "parado")
+            continue
+        if idade_maxima and relogio.monotonico() - recebido_em > idade_maxima:
+            _descartar(data, "velho")
+            continue
+        ocupados += 1
+        try:
+            # rastreada para que a drenagem aguarde a ordem em andamento
+            await control.rastrear(asyncio.create_task(handler(data)))
+            metricas["executados"] += 1
+        except asyncio.CancelledError:
+            if control.parado.is_set():
+                continue
+            raise
+        except Exception as e:
+            metricas["erros"] += 1
+            print(f"❌ Erro ao executar sinal {data.get('symbol')}: {e}")
+            traceback.print_exc()
+        finally:
+            ocupados -= 1
+
+
+async def _reportar():
+    anterior = None
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        atual = snapshot()
+        if atual != anterior:
+            # o snapshot segue para o orquestrador no heartbeat (control.iniciar_heartbeat)
+            print(f"📊 Despacho: {atual}")
+            anterior = atual
@@ -0,0 +1,80 @@
+import os
+import re
+import asyncio
+
+# Filtro de sinais no próprio RabbitMQ: a fila do worker só é ligada ao exchange topic
+# (<tipo>.<origem>.<ativo>.<timeframe>) com as chaves que o bot opera, então ativos e
+# timeframes desligados nas opções do bot nem chegam a ser entregues/decodificados.
+# As opções são relidas a cada FILTER_REFRESH_INTERVAL segundos e a fila é religada.
+FILTER_REFRESH_INTERVAL = float(os.getenv("FILTER_REFRESH_INTERVAL", "60"))
+# Contrato esperado do bot-options (ASSUMIDO: o backend atual não devolve esses campos,
+# e sem eles o filtro fica em TUDO): lista ou texto separado por vírgula, ex.
+#   "symbols": ["EUR/USD", "GBPJPY-OTC"], "timeframes": ["M1", "5"]
+# Os nomes dos campos podem ser trocados por variável de ambiente.
+FILTER_SYMBOLS_FIELD = os.getenv("FILTER_SYMBOLS_FIELD", "symbols")
+FILTER_TIMEFRAMES_FIELD = os.getenv("FILTER_TIMEFRAMES_FIELD", "timeframes")
+TUDO = "#"
+
+ligadas = set()
+_tarefa = None
+_sem_campos_avisado = False
+
+
+def _lista(valor) -> list[str]:
+    if not valor:
+        return []
+    if isinstance(valor, str):
+        valor = valor.split(",")
+    return [str(v).strip() for v in valor if str(v).strip()]
+
+
+def _timeframe(valor: str) -> str | None:
+    digitos = re.sub(r"\D", "", valor)
+    return str(int(digitos)) if digitos else None
+
+
+def chaves(options: dict) -> set[str]:
+    """Bindings para as opções do bot (ver contrato acima); sem filtro configurado, tudo."""
+    global _sem_campos_avisado
+    if FILTER_SYMBOLS_FIELD not in options and FILTER_TIMEFRAMES_FIELD not in options and not _sem_campos_avisado:
+        _sem_campos_avisado = True
+        print(f"ℹ️ bot-options sem '{FILTER_SYMBOLS_FIELD}'/'{FILTER_TIMEFRAMES_FIELD}': "
+              f"filtro de sinais desligado (recebendo tudo).")
+    simbolos = [re.sub(r"[^A-Z0-9]", "", s.upper()) for s in _lista(options.get(FILTER_SYMBOLS_FIELD))]
+    timeframes = [t for t in map(_timeframe, _lista(options.get(FILTER_TIMEFRAMES_FIELD))) if t]
+    if not simbolos and not timeframes:
+        return {TUDO}
+    # resultados não têm ativo/timeframe na chave: sempre passam
+    return {"result.#"} | {f"*.*.{s}.{t}" for s in simbolos or ["*"] for t in timeframes or ["*"]}
+
+
+async def aplicar(queue, exchange, novas: set[str]):
+    """Liga as chaves novas antes de desligar as antigas: nada se perde durante a troca."""
+    entrar = novas - ligadas
+    sair = ligadas - novas
+    for chave in entrar:
+        await queue.bind(exchange, routing_key=chave)
+        ligadas.add(chave)
+    for chave in sair:
+        await queue.unbind(exchange, routing_key=chave)
+        ligadas.discard(chave)
+    if entrar or sair:
+        print(f"🎯 Filtro de sinais: {', '.join(sorted(ligadas))}")
+
+
+async def manter(queue, exchange, user_id, brokerage_id):
+    from api import get_bot_options
+    while True:
+        try:
+            options = await get_bot_options(user_id=user_id, brokerage_id=brokerage_id)
+            await aplicar(queue, exchange, chaves(options))
+        except Exception as e:
+            print(f"⚠️ Erro ao atualizar filtro de sinais: {e}")
+        await asyncio.sleep(FILTER_REFRESH_INTERVAL)
+
+
+def iniciar(queue, exchange, user_id, brokerage_id):
+    """Religa a fila conforme as opções do bot, em segundo plano (fora da drenagem do worker)."""
+    global _tarefa
+    _tarefa = asyncio.create_task(manter(queue, exchange, user_id, brokerage_id))
+    return _tarefa
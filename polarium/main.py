@@ -1,22 +1,23 @@
+import time
+INICIO_PROCESSO = time.perf_counter()  # antes dos demais imports: mede o caminho até consumir
 import os
 import json
 import asyncio
 import aio_pika
-import aiohttp
-from dotenv import load_dotenv
-from api import (
-    get_bot_options,
-    update_win_value,
-    update_loss_value,
-    update_trade_order_info,
-    verify_stop_values,
-    create_trade_order_info,
-)
+import control
+import dispatcher
+import filtros
+import assets
+import relogio
 from datetime import datetime
-import pytz
+from zoneinfo import ZoneInfo
 import uuid
 
-load_dotenv()
+if os.path.exists(".env"):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+TZ_BRASILIA = ZoneInfo("America/Sao_Paulo")
 
 API_TOKEN = os.getenv("API_TOKEN")
 USER_ID = os.getenv("USER_ID")
@@ -27,6 +28,8 @@ password = os.getenv("RABBITMQ_PASS")
 RABBITMQ_URL = f"amqp://{user}:{password}@{host}:5672/"
 BROKERAGE_USERNAME = os.getenv("BROKERAGE_USERNAME")
 BROKERAGE_PASSWORD = os.getenv("BROKERAGE_PASSWORD")
+# Base da API da corretora (sobrescrita nos testes de carga)
+POLARIUM_API_URL = os.getenv("POLARIUM_API_URL", "http://polarium_api:3002").rstrip("/")
 
 resultado_global = None
 sinais_recebidos = asyncio.Queue()
@@ -35,7 +38,8 @@ lock = asyncio.Lock()
 # --------- Utils Polarium ---------
 
 async def consultar_balance(isDemo: bool):
-    url = "http://polarium_api:3002/api/account/balance"
+    import aiohttp
+    url = f"{POLARIUM_API_URL}/api/account/balance"
     headers = {"Content-Type": "application/json"}
     payload = {"email": BROKERAGE_USERNAME, "password": BROKERAGE_PASSWORD}
     account_type = "demo" if isDemo else "real"
@@ -56,7 +60,8 @@ async def realizar_compra(isDemo: bool, timeframe_minutes: int, direction: str,
     Envia ordem imediata (digital) com período = timeframe_minutes * 60.
     direction: BUY/SELL -> CALL/PUT
     """
-    url = 'http://polarium_api:3002/api/trade/digital/buy'
+    import aiohttp
+    url = f'{POLARIUM_API_URL}/api/trade/digital/buy'
     api_direction = "CALL" if direction == "BUY" else "PUT"
     period_seconds = int(timeframe_minutes) * 60
 
@@ -79,7 +84,7 @@ async def realizar_compra(isDemo: bool, timeframe_minutes: int, direction: str,
                 data = await response.json()
                 if response.status == 201 and "order" in data:
                     print("✅ Ordem enviada com sucesso.")
-                    print(f"🕒 {datetime.now(pytz.timezone('America/Sao_Paulo')).isoformat()}")
+                    print(f"🕒 {datetime.now(TZ_BRASILIA).isoformat()}")
                     return {
                         "result": data.get("message", ""),
                         "openPrice": data.get("order", {}).get("id", 0)
@@ -90,6 +95,30 @@ async def realizar_compra(isDemo: bool, timeframe_minutes: int, direction: str,
             print(f"❌ Erro na ordem: {e}")
     return None
 
+# --------- Liquidação em segundo plano ---------
+
+def _liquidacao_concluida(task: asyncio.Task):
+    if task.cancelled():
+        return
+    if task.exception():
+        print(f"❌ Erro na liquidação: {task.exception()}")
+        return
+    control.registrar_liquidacao(task.result())
+
+def liquidar_em_segundo_plano(order_id: str, status: str, pnl: float, win_value: float = 0, loss_value: float = 0):
+    """
+    Agenda a liquidação (totais + trade-order-info + stop) sem bloquear o worker:
+    o próximo sinal é aceito enquanto as escritas no backend ocorrem em paralelo.
+    Se os novos totais atingirem o stop, o próprio worker para (control.acionar_stop).
+    """
+    control.fechar_ordem(order_id, status, pnl=pnl, win_value=win_value, loss_value=loss_value)
+    from api import settle_trade_order
+    task = control.rastrear(asyncio.create_task(settle_trade_order(
+        USER_ID, BROKERAGE_ID, order_id, status, pnl, win_value=win_value, loss_value=loss_value
+    )))
+    task.add_done_callback(_liquidacao_concluida)
+    return task
+
 # --------- Resultado & PNL ---------
 
 async def aguardar_resultado():
@@ -121,20 +150,18 @@ async def calcular_pnl(ordem, isDemo):
     if resultado_global == "LOSS":
         print("❌ Resultado LOSS — registrando perda.")
         ordem["pnl"] = amount
-        await update_loss_value(USER_ID, amount, BROKERAGE_ID)
-        await update_trade_order_info(ordem["id"], USER_ID, "LOST", amount)
-        await verify_stop_values(USER_ID, BROKERAGE_ID)
+        liquidar_em_segundo_plano(ordem["id"], "LOST", amount, loss_value=amount)
         return -amount
 
     if resultado_global != "WIN":
         print("ℹ️ Resultado indefinido — PNL 0.")
         ordem["pnl"] = 0
-        await update_trade_order_info(ordem["id"], USER_ID, "PENDING (sem resultado)", 0)
+        liquidar_em_segundo_plano(ordem["id"], "PENDING (sem resultado)", 0)
         return 0
 
     print("✅ Resultado WIN — verificando saldo para confirmar PNL...")
     for tentativa in range(1, 6):  # 5 tentativas / 10s
-        await asyncio.sleep(10)
+        await relogio.dormir(10)
         balance_after = await consultar_balance(isDemo)
         if balance_after is None:
             print(f"⚠️ Tentativa {tentativa}: não foi possível ler o saldo.")
@@ -145,9 +172,7 @@ async def calcular_pnl(ordem, isDemo):
             pnl = round(balance_after - balance_before, 2)
             ordem["pnl"] = pnl
             print(f"📈 PNL confirmado: {pnl:.2f}")
-            await update_win_value(USER_ID, pnl, BROKERAGE_ID)
-            await update_trade_order_info(ordem["id"], USER_ID, "WON", pnl)
-            await verify_stop_values(USER_ID, BROKERAGE_ID)
+            liquidar_em_segundo_plano(ordem["id"], "WON", pnl, win_value=pnl)
             return pnl
 
         if balance_after < balance_before:
@@ -155,18 +180,14 @@ async def calcular_pnl(ordem, isDemo):
             resultado_global = "LOSS"
             loss = amount
             ordem["pnl"] = loss
-            await update_loss_value(USER_ID, loss, BROKERAGE_ID)
-            await update_trade_order_info(ordem["id"], USER_ID, "LOST (saldo caiu com WIN)", loss)
-            await verify_stop_values(USER_ID, BROKERAGE_ID)
+            liquidar_em_segundo_plano(ordem["id"], "LOST (saldo caiu com WIN)", loss, loss_value=loss)
             return -loss
 
     print("⚠️ Saldo não mudou após WIN — reclassificando LOSS.")
     resultado_global = "LOSS"
     loss = amount
     ordem["pnl"] = loss
-    await update_loss_value(USER_ID, loss, BROKERAGE_ID)
-    await update_trade_order_info(ordem["id"], USER_ID, "LOST (saldo inalterado após WIN)", loss)
-    await verify_stop_values(USER_ID, BROKERAGE_ID)
+    liquidar_em_segundo_plano(ordem["id"], "LOST (saldo inalterado após WIN)", loss, loss_value=loss)
     return -loss
 
 # --------- Execução ---------
@@ -183,6 +204,7 @@ async def enviar_ordem_imediata(data):
     }
     """
     global resultado_global
+    from api import get_bot_options, create_trade_order_info
     resultado_global = None  # zera estado
 
     symbol = data["symbol"]
@@ -220,6 +242,7 @@ async def enviar_ordem_imediata(data):
         status="PENDING",
         brokerage_id=BROKERAGE_ID
     )
+    control.abrir_ordem(trade_id, symbol=symbol, amount=amount)
 
     ordem = {
         "id": trade_id,
@@ -237,26 +260,24 @@ async def enviar_ordem_imediata(data):
 
 async def processar_entrada(data):
     async with lock:
+        if control.parado.is_set():
+            print("🛑 Stop atingido — entrada em fila cancelada.")
+            return
         await enviar_ordem_imediata(data)
 
 # --------- Main / Rabbit ---------
 
-async def main():
-    print("🔌 Conectando ao RabbitMQ...")
-    connection = await aio_pika.connect_robust(RABBITMQ_URL)
-    channel = await connection.channel()
-    exchange = await channel.declare_exchange("polarium_signals", aio_pika.ExchangeType.FANOUT)
-    queue = await channel.declare_queue(exclusive=True)
-    await queue.bind(exchange)
-    print("✅ Conectado e aguardando sinais...")
-
+async def consumir(queue):
     async with queue.iterator() as queue_iter:
         async for message in queue_iter:
             async with message.process():
                 try:
                     data = json.loads(message.body.decode())
+                    control.sinal_recebido()
+                    if dispatcher.repetido(data):
+                        continue
                     tipo = data.get("type")
-                    timestamp = datetime.now(pytz.timezone("America/Sao_Paulo")).isoformat()
+                    timestamp = datetime.now(TZ_BRASILIA).isoformat()
 
                     if tipo == "entry":
                         print("📨 NOVO SINAL RECEBIDO (POLARIUM)")
@@ -264,7 +285,14 @@ async def main():
                         print(f"🕒 Horário: {timestamp}")
                         print(f"📦 Payload: {json.dumps(data, ensure_ascii=False)}")
                         print("──────────────────────────────────────────────")
-                        asyncio.create_task(processar_entrada(data))
+                        simbolo = assets.validar(data.get("symbol"))
+                        if control.parado.is_set():
+                            print("🛑 Bot parado — sinal descartado.")
+                        elif not simbolo:
+                            print(f"🚫 Ativo {data.get('symbol')} fechado ou indisponível na corretora — sinal descartado.")
+                        else:
+                            data["symbol"] = simbolo
+                            dispatcher.despachar(data)
 
                     elif tipo == "result":
                         print("📩 RESULT RECEBIDO (POLARIUM)")
@@ -272,12 +300,53 @@ async def main():
                         print(f"🕒 Horário: {timestamp}")
                         print(f"📦 {json.dumps(data, ensure_ascii=False)}")
                         print("──────────────────────────────────────────────")
-                        await sinais_recebidos.put(data)
+                        # sem entrada em andamento o resultado é de um sinal que este bot não operou
+                        # (filtrado, descartado ou fechado): guardá-lo pareceria o resultado da próxima ordem
+                        if lock.locked():
+                            await sinais_recebidos.put(data)
+                        else:
+                            print("ℹ️ Resultado sem entrada em andamento — ignorado.")
 
                     else:
                         print(f"ℹ️ Mensagem ignorada (tipo: {tipo}).")
                 except Exception as e:
                     print(f"❌ Erro ao processar mensagem: {e}")
 
+
+async def main():
+    control.instalar_sinais()
+    print("🔌 Conectando ao RabbitMQ...")
+    connection = await aio_pika.connect_robust(RABBITMQ_URL)
+    channel = await connection.channel()
+    await control.conectar(channel)
+    # já no stop (ex.: reiniciado depois de stop_win/stop_loss): publica "stopped" e sai sem consumir
+    if await control.verificar_stop():
+        await control.encerrar()
+        await connection.close()
+        return
+    exchange = await channel.declare_exchange("polarium_signals.topic", aio_pika.ExchangeType.TOPIC)
+    queue = await channel.declare_queue(exclusive=True)
+    # começa recebendo tudo; o filtro das opções do bot é aplicado em segundo plano
+    await filtros.aplicar(queue, exchange, {filtros.TUDO})
+    print(f"✅ Conectado e aguardando sinais... ({(time.perf_counter() - INICIO_PROCESSO) * 1000:.0f} ms desde o start)")
+
+    # Entradas imediatas: sinal que esperou mais que isso na fila já não vale a ordem
+    dispatcher.iniciar(processar_entrada, max_idade=30)
+    consumo = asyncio.create_task(consumir(queue))
+    # heartbeat no canal de controle: o orquestrador sabe se o bot está vivo de verdade
+    control.iniciar_heartbeat(consumo, dispatcher.snapshot)
+    # Módulos adiados (api/aiohttp) são carregados só depois que a fila já está sendo consumida
+    control.rastrear(asyncio.create_task(control.aquecer_imports("api")))
+    # filtro de sinais pelas opções do bot (religa a fila quando elas mudam)
+    filtros.iniciar(queue, exchange, USER_ID, BROKERAGE_ID)
+    # catálogo de ativos: loop contínuo, fora da drenagem (control.rastrear)
+    assets.iniciar()
+    # Stop local ou SIGTERM: para de aceitar entradas, drena o que está aberto e sai
+    await control.parado.wait()
+    await control.encerrar()
+    consumo.cancel()
+    await connection.close()
+
+
 if __name__ == "__main__":
     asyncio.run(main())
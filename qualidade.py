@@ -0,0 +1,252 @@
+import os
+import json
+import re
+import math
+import time
+import asyncio
+from collections import OrderedDict, deque
+import control
+
+# Qualidade de cada canal de sinais, calculada em streaming a partir dos exchanges
+# topic dos publishers (<tipo>.<origem>.<ativo>.<timeframe>). Cada resultado fecha a
+# entrada pendente mais recente do mesmo canal (canais postam entrada e depois o
+# resultado; entrada que nunca recebe resultado expira em vez de deslocar os pares).
+# Por canal, canal+ativo e canal+timeframe ficam só:
+#   - janela circular dos últimos QUALITY_WINDOW resultados (win rate e latência
+#     entrada → resultado sem rodar consulta nenhuma)
+#   - taxa de sinais com decaimento exponencial (QUALITY_RATE_HALF_LIFE)
+# Memória fixa: no máximo QUALITY_MAX_KEYS chaves (LRU) e QUALITY_MAX_PENDING entradas
+# aguardando resultado por canal.
+QUALITY_EXCHANGES = [e.strip() for e in os.getenv(
+    "QUALITY_EXCHANGES",
+    "avalon_signals.topic,polarium_signals.topic,xofre_signals.topic,home_broker_signals.topic"
+).split(",") if e.strip()]
+QUALITY_WINDOW = int(os.getenv("QUALITY_WINDOW", "100"))
+QUALITY_RATE_HALF_LIFE = float(os.getenv("QUALITY_RATE_HALF_LIFE", "3600"))
+QUALITY_MAX_KEYS = int(os.getenv("QUALITY_MAX_KEYS", "5000"))
+QUALITY_MAX_PENDING = int(os.getenv("QUALITY_MAX_PENDING", "20"))
+# entrada sem resultado depois disso conta como "sem resultado" e sai da fila
+QUALITY_RESULT_TIMEOUT = float(os.getenv("QUALITY_RESULT_TIMEOUT", "3600"))
+# gate: canal/ativo com amostras suficientes e win rate abaixo do mínimo é bloqueado (0 desliga)
+QUALITY_MIN_WIN_RATE = float(os.getenv("QUALITY_MIN_WIN_RATE", "0"))
+QUALITY_MIN_SAMPLES = int(os.getenv("QUALITY_MIN_SAMPLES", "20"))
+
+# Publishers marcam o header "kind" ("entry"/"result", ver TIPOS_ENTRADA dos parsers);
+# sem o header (gravações antigas, publishers desatualizados) vale o tipo do payload
+TIPOS_ENTRADA = ("entry", "signal_confirmed", "signal_new")
+NIVEIS = ("channel", "symbol", "timeframe")
+_TAU = QUALITY_RATE_HALF_LIFE / math.log(2)
+
+estatisticas = OrderedDict()  # (nível, bot, canal, valor) -> dados
+pendentes = {}                # (bot, canal) -> deque[(recebida_em, symbol, timeframe)]
+_tarefa = None
+
+
+def _bot(exchange: str) -> str:
+    return exchange.removesuffix(".topic").removesuffix("_signals")
+
+
+def _dados(chave: tuple) -> dict:
+    dados = estatisticas.get(chave)
+    if dados is None:
+        dados = {"entries": 0, "results": 0, "wins": 0, "unresolved": 0, "rate": 0.0, "rate_at": 0.0,
+                 "last_entry": None, "last_result": None, "janela": deque(maxlen=QUALITY_WINDOW)}
+        estatisticas[chave] = dados
+        while len(estatisticas) > QUALITY_MAX_KEYS:
+            estatisticas.popitem(last=False)
+    else:
+        estatisticas.move_to_end(chave)
+    return dados
+
+
+def _chaves(bot: str, canal: str, symbol: str, timeframe: str) -> list[tuple]:
+    chaves = [("channel", bot, canal, "")]
+    if symbol and symbol != "_":
+        chaves.append(("symbol", bot, canal, symbol))
+    if timeframe and timeframe != "_":
+        chaves.append(("timeframe", bot, canal, timeframe))
+    return chaves
+
+
+def _taxa(dados: dict, agora: float) -> float:
+    """Sinais por segundo com decaimento exponencial, trazida até agora."""
+    if not dados["rate_at"]:
+        return 0.0
+    return dados["rate"] * math.exp(-(agora - dados["rate_at"]) / _TAU)
+
+
+def _expirar(fila: deque, bot: str, canal: str, agora: float):
+    while fila and agora - fila[0][0] > QUALITY_RESULT_TIMEOUT:
+        _, symbol, timeframe = fila.popleft()
+        for chave in _chaves(bot, canal, symbol, timeframe):
+            _dados(chave)["unresolved"] += 1
+
+
+def entrada(bot: str, canal: str, symbol: str, timeframe: str, agora: float | None = None):
+    agora = agora or time.time()
+    for chave in _chaves(bot, canal, symbol, timeframe):
+        dados = _dados(chave)
+        dados["entries"] += 1
+        dados["rate"] = _taxa(dados, agora) + 1 / _TAU
+        dados["rate_at"] = dados["last_entry"] = agora
+    fila = pendentes.setdefault((bot, canal), deque())
+    _expirar(fila, bot, canal, agora)
+    if len(fila) >= QUALITY_MAX_PENDING:
+        _, symbol_antigo, timeframe_antigo = fila.popleft()
+        for chave in _chaves(bot, canal, symbol_antigo, timeframe_antigo):
+            _dados(chave)["unresolved"] += 1
+    fila.append((agora, symbol, timeframe))
+
+
+def resultado(bot: str, canal: str, ganhou: bool, agora: float | None = None):
+    """Fecha a entrada pendente mais recente do canal; resultado sem entrada é ignorado."""
+    agora = agora or time.time()
+    fila = pendentes.get((bot, canal))
+    if fila:
+        _expirar(fila, bot, canal, agora)
+    if not fila:
+        return
+    recebida_em, symbol, timeframe = fila.pop()
+    latencia = agora - recebida_em
+    for chave in _chaves(bot, canal, symbol, timeframe):
+        dados = _dados(chave)
+        dados["results"] += 1
+        dados["wins"] += int(ganhou)
+        dados["last_result"] = agora
+        dados["janela"].append((int(ganhou), latencia))
+
+
+def _quantil(ordenados: list[float], q: float):
+    if not ordenados:
+        return None
+    return round(ordenados[min(len(ordenados) - 1, int(len(ordenados) * q))], 1)
+
+
+def resumo(chave: tuple, dados: dict, agora: float | None = None) -> dict:
+    agora = agora or time.time()
+    nivel, bot, canal, valor = chave
+    janela = dados["janela"]
+    latencias = sorted(l for _, l in janela)
+    return {
+        "bot": bot,
+        "channel": canal,
+        "level": nivel,
+        **({nivel: valor} if nivel != "channel" else {}),
+        "entries": dados["entries"],
+        "results": dados["results"],
+        "wins": dados["wins"],
+        "unresolved": dados["unresolved"],
+        "window": len(janela),
+        "win_rate": round(sum(g for g, _ in janela) / len(janela), 4) if janela else None,
+        "signals_per_hour": round(_taxa(dados, agora) * 3600, 2),
+        "latency_p50_s": _quantil(latencias, 0.5),
+        "latency_p95_s": _quantil(latencias, 0.95),
+        "last_entry": dados["last_entry"],
+        "last_result": dados["last_result"],
+    }
+
+
+def listar(bot: str | None = None, nivel: str = "channel", min_amostras: int = 0) -> list[dict]:
+    agora = time.time()
+    itens = [resumo(chave, dados, agora) for chave, dados in list(estatisticas.items())
+             if chave[0] == nivel and (bot is None or chave[1] == bot) and len(dados["janela"]) >= min_amostras]
+    return sorted(itens, key=lambda i: (i["win_rate"] is None, -(i["win_rate"] or 0), -i["entries"]))
+
+
+def gate(bot: str, canal: str, symbol: str | None = None, min_win_rate: float | None = None,
+         min_amostras: int | None = None) -> dict:
+    """
+    Libera ou bloqueia sinais do canal (e do ativo, se informado) pelo win rate da janela.
+    Sem amostras suficientes o sinal passa: o canal ainda não tem histórico.
+    """
+    minimo = QUALITY_MIN_WIN_RATE if min_win_rate is None else min_win_rate
+    amostras = QUALITY_MIN_SAMPLES if min_amostras is None else min_amostras
+    chaves = [("channel", bot, canal, "")]
+    if symbol:
+        # mesma grafia da routing key (EUR/USD-OTC -> EURUSDOTC)
+        chaves.append(("symbol", bot, canal, re.sub(r"[^A-Z0-9]", "", symbol.upper())))
+    avaliados = []
+    for chave in chaves:
+        dados = estatisticas.get(chave)
+        if dados is None:
+            continue
+        r = resumo(chave, dados)
+        avaliados.append(r)
+        if minimo > 0 and r["window"] >= amostras and r["win_rate"] < minimo:
+            return {"allow": False, "reason": f"{r['level']} win rate {r['win_rate']:.2f} < {minimo:.2f}",
+                    "stats": avaliados}
+    return {"allow": True, "reason": None, "stats": avaliados}
+
+
+def _rotulos(item: dict) -> str:
+    rotulos = {"bot": item["bot"], "channel": item["channel"], "symbol": item.get("symbol", ""),
+               "timeframe": item.get("timeframe", "")}
+    return ",".join(f'{k}="{v}"' for k, v in rotulos.items())
+
+
+def metricas() -> str:
+    """Exposição no formato texto do Prometheus."""
+    series = (
+        ("signal_quality_entries_total", "counter", "entries"),
+        ("signal_quality_results_total", "counter", "results"),
+        ("signal_quality_wins_total", "counter", "wins"),
+        ("signal_quality_unresolved_total", "counter", "unresolved"),
+        ("signal_quality_win_rate", "gauge", "win_rate"),
+        ("signal_quality_signals_per_hour", "gauge", "signals_per_hour"),
+        ("signal_quality_latency_p50_seconds", "gauge", "latency_p50_s"),
+        ("signal_quality_latency_p95_seconds", "gauge", "latency_p95_s"),
+    )
+    itens = [i for nivel in NIVEIS for i in listar(nivel=nivel)]
+    linhas = []
+    for nome, tipo, campo in series:
+        linhas.append(f"# TYPE {nome} {tipo}")
+        for item in itens:
+            if item[campo] is not None:
+                linhas.append(f"{nome}{{{_rotulos(item)}}} {item[campo]}")
+    return "\n".join(linhas) + "\n"
+
+
+async def _processar(message):
+    async with message.process():
+        try:
+            partes = (message.routing_key or "").split(".")
+            if len(partes) != 4:
+                return
+            tipo, canal, symbol, timeframe = partes
+            tipo = (message.headers or {}).get("kind") or tipo
+            bot = _bot(message.exchange)
+            if tipo in TIPOS_ENTRADA:
+                entrada(bot, canal, symbol, timeframe)
+            elif tipo == "result":
+                data = json.loads(message.body.decode())
+                resultado(bot, canal, str(data.get("result", "")).upper() == "WIN")
+        except Exception as e:
+            print(f"❌ Erro ao processar sinal para qualidade: {e}")
+
+
+async def _consumir():
+    import aio_pika
+    while True:
+        try:
+            connection = await aio_pika.connect_robust(control._rabbit_url())
+            channel = await connection.channel()
+            queue = await channel.declare_queue(exclusive=True)
+            for nome in QUALITY_EXCHANGES:
+                exchange = await channel.declare_exchange(nome, aio_pika.ExchangeType.TOPIC)
+                await queue.bind(exchange, routing_key="#")
+            await queue.consume(_processar)
+            print(f"✅ Qualidade de sinais acompanhando {', '.join(QUALITY_EXCHANGES)}")
+            await asyncio.Future()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Exchanges de sinais indisponíveis ({e}), tentando novamente em 5s...")
+            await asyncio.sleep(5)
+
+
+def iniciar():
+    """Inicia o acompanhamento dos exchanges de sinais em segundo plano."""
+    global _tarefa
+    if _tarefa is None or _tarefa.done():
+        _tarefa = asyncio.create_task(_consumir())
+    return _tarefa
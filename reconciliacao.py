@@ -0,0 +1,145 @@
+import os
+import time
+import asyncio
+import api
+import control
+import estado
+
+# Loop de reconciliação: compara o estado desejado (estado.py) com os containers e
+# inicia/para os bots em lote, com concorrência limitada. Depois de um reboot do host
+# todos os bots que deveriam estar rodando voltam na primeira passada.
+RECONCILE_INTERVAL = float(os.getenv("RECONCILE_INTERVAL", "30"))
+RECONCILE_CONCURRENCY = int(os.getenv("RECONCILE_CONCURRENCY", "16"))
+# Bot que sai antes disso depois de iniciado conta como falha (crash loop)
+RECONCILE_STABLE_AFTER = float(os.getenv("RECONCILE_STABLE_AFTER", "120"))
+# Backoff exponencial entre tentativas de um bot em crash loop
+RECONCILE_BACKOFF_BASE = float(os.getenv("RECONCILE_BACKOFF_BASE", "30"))
+RECONCILE_BACKOFF_MAX = float(os.getenv("RECONCILE_BACKOFF_MAX", "1800"))
+
+_tarefa = None
+
+
+def _nome(bot: dict) -> str:
+    return f"bot_{bot['user_id']}_{bot['brokerage_id']}"
+
+
+def _espera(falhas: int) -> float:
+    return min(RECONCILE_BACKOFF_BASE * 2 ** falhas, RECONCILE_BACKOFF_MAX)
+
+
+async def _motivo_stop(user_id: int, brokerage_id: int) -> str | None:
+    """
+    Se o bot saiu por stop_win/stop_loss: pelo "stopped" que ele publicou ou, se essa
+    mensagem não chegou, pelos totais do backend. Sem resposta do backend, None (o
+    worker também verifica o stop antes de consumir).
+    """
+    drenagem = control.drenagem(user_id, brokerage_id)
+    if drenagem and drenagem["finished"] and drenagem["reason"] in control.STOP_STATUS:
+        return drenagem["reason"]
+    try:
+        opcoes = await api.get_bot_options(user_id, brokerage_id)
+    except Exception as e:
+        print(f"⚠️ Reconciliação: stop de bot_{user_id}_{brokerage_id} não verificado ({e})")
+        return None
+    if opcoes.get("stop_win") and opcoes["win_value"] >= opcoes["stop_win"]:
+        return "stop_win"
+    if opcoes.get("stop_loss") and opcoes["loss_value"] >= opcoes["stop_loss"]:
+        return "stop_loss"
+    return None
+
+
+async def _iniciar(sem, bot, container, criar):
+    user_id, brokerage_id = bot["user_id"], bot["brokerage_id"]
+    async with sem:
+        motivo = await _motivo_stop(user_id, brokerage_id)
+        if motivo:
+            # parou no stop e o "stopped" se perdeu: registra em vez de reiniciar
+            print(f"🛑 Reconciliação: {_nome(bot)} encerrado por {motivo} — não será reiniciado")
+            try:
+                await control.registrar_stop(user_id, brokerage_id, motivo)
+            except Exception as e:
+                print(f"⚠️ Reconciliação: bot_status de {_nome(bot)} não atualizado ({e})")
+            return
+        estado.registrar_partida(user_id, brokerage_id)
+        control.limpar_drenagem(user_id, brokerage_id)
+        try:
+            if container is not None:
+                await asyncio.to_thread(container.start)
+            else:
+                await criar(user_id, brokerage_id)
+            print(f"🔁 Reconciliação: {_nome(bot)} iniciado")
+        except Exception as e:
+            espera = _espera(bot["falhas"])
+            estado.registrar_falha(user_id, brokerage_id, espera)
+            print(f"❌ Reconciliação: falha ao iniciar {_nome(bot)} ({e}), nova tentativa em {espera:.0f}s")
+
+
+async def reconciliar(client, criar, parar):
+    """
+    Uma passada: uma única listagem de containers e as ações necessárias em paralelo.
+    criar(user_id, brokerage_id): cria o container que não existe; parar(container): docker stop com drenagem.
+    """
+    containers = {
+        c.name: c for c in await asyncio.to_thread(client.containers.list, all=True, filters={"name": "bot_"})
+    }
+    agora = time.time()
+    sem = asyncio.Semaphore(RECONCILE_CONCURRENCY)
+    acoes = []
+    for bot in estado.todos():
+        container = containers.get(_nome(bot))
+        situacao = container.status if container is not None else None
+        user_id, brokerage_id = bot["user_id"], bot["brokerage_id"]
+
+        if bot["desejado"] == estado.PARADO:
+            if situacao == "running" and control.drenagem(user_id, brokerage_id) is None:
+                print(f"🔁 Reconciliação: parando {_nome(bot)}")
+                parar(container)
+            continue
+
+        if situacao == "running":
+            if bot["falhas"] and agora - bot["ultima_partida"] > RECONCILE_STABLE_AFTER:
+                estado.zerar_falhas(user_id, brokerage_id)
+            continue
+        if situacao == "restarting" or agora < bot["proxima_tentativa"]:
+            continue
+        if bot["ultima_partida"] and agora - bot["ultima_partida"] < RECONCILE_STABLE_AFTER:
+            # caiu logo depois da última partida: espera crescente antes de tentar de novo
+            espera = _espera(bot["falhas"])
+            estado.registrar_falha(user_id, brokerage_id, espera)
+            print(f"⚠️ Reconciliação: {_nome(bot)} em crash loop ({bot['falhas'] + 1}x), "
+                  f"nova tentativa em {espera:.0f}s")
+            continue
+        acoes.append(_iniciar(sem, bot, container, criar))
+
+    if acoes:
+        inicio = time.perf_counter()
+        await asyncio.gather(*acoes)
+        print(f"✅ Reconciliação: {len(acoes)} bot(s) iniciado(s) em {time.perf_counter() - inicio:.1f}s")
+
+
+async def _importar(client):
+    """Primeira execução sem estado salvo: adota os bots que já estão rodando."""
+    if not estado.vazio():
+        return
+    for c in await asyncio.to_thread(client.containers.list, filters={"name": "bot_", "status": "running"}):
+        partes = c.name.split("_")
+        if len(partes) == 3 and partes[1].isdigit() and partes[2].isdigit():
+            estado.desejar(int(partes[1]), int(partes[2]), estado.RODANDO, "importado")
+
+
+async def _loop(client, criar, parar):
+    await _importar(client)
+    while True:
+        try:
+            await reconciliar(client, criar, parar)
+        except Exception as e:
+            print(f"⚠️ Erro na reconciliação: {e}")
+        await asyncio.sleep(RECONCILE_INTERVAL)
+
+
+def iniciar(client, criar, parar):
+    """Inicia a reconciliação em segundo plano (a primeira passada é imediata)."""
+    global _tarefa
+    if _tarefa is None or _tarefa.done():
+        _tarefa = asyncio.create_task(_loop(client, criar, parar))
+    return _tarefa
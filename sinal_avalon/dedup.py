@@ -0,0 +1,132 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+# Deduplicação de sinais antes de publicar: reconexões que reentregam updates e o mesmo
+# call postado duas vezes não podem virar duas ordens em cada bot inscrito.
+#   - por mensagem (chat_id:message_id): reentrega/edição da mesma mensagem, DEDUP_TTL
+#   - por conteúdo (entradas): o mesmo sinal repostado em outra mensagem, DEDUP_CONTENT_TTL
+# Memória limitada (LRU com TTL) na frente de um SQLite pequeno que sobrevive a restarts.
+DEDUP_DB_PATH = os.getenv("DEDUP_DB_PATH", "dedup.sqlite3")
+DEDUP_TTL = float(os.getenv("DEDUP_TTL", "86400"))
+DEDUP_CONTENT_TTL = float(os.getenv("DEDUP_CONTENT_TTL", "120"))
+DEDUP_MAX_ITEMS = int(os.getenv("DEDUP_MAX_ITEMS", "5000"))
+
+_lru = OrderedDict()  # chave -> expira_em
+_db = None
+_escritas = 0
+
+
+def _conectar():
+    global _db
+    if _db is None:
+        _db = sqlite3.connect(DEDUP_DB_PATH)
+        _db.execute("CREATE TABLE IF NOT EXISTS vistos (chave TEXT PRIMARY KEY, expira REAL NOT NULL)")
+        _db.execute("DELETE FROM vistos WHERE expira < ?", (time.time(),))
+        _db.commit()
+        # aquece a memória com as chaves mais recentes
+        for chave, expira in _db.execute(
+            "SELECT chave, expira FROM vistos ORDER BY expira DESC LIMIT ?", (DEDUP_MAX_ITEMS,)
+        ).fetchall()[::-1]:
+            _lru[chave] = expira
+    return _db
+
+
+def _visto(chave: str, agora: float) -> bool:
+    expira = _lru.get(chave)
+    if expira is None:
+        # pode ter saído da LRU por tamanho e continuar válida no disco
+        linha = _conectar().execute("SELECT expira FROM vistos WHERE chave = ?", (chave,)).fetchone()
+        expira = linha[0] if linha else None
+    else:
+        _lru.move_to_end(chave)
+    return expira is not None and expira > agora
+
+
+def _marcar(chave: str, ttl: float, agora: float):
+    global _escritas
+    _lru[chave] = agora + ttl
+    _lru.move_to_end(chave)
+    while len(_lru) > DEDUP_MAX_ITEMS:
+        _lru.popitem(last=False)
+    db = _conectar()
+    db.execute("INSERT OR REPLACE INTO vistos (chave, expira) VALUES (?, ?)", (chave, agora + ttl))
+    _escritas += 1
+    if _escritas % 500 == 0:
+        db.execute("DELETE FROM vistos WHERE expira < ?", (agora,))
+    db.commit()
+
+
+def _hash(*partes) -> str:
+    bruto = json.dumps(partes, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(bruto.encode()).hexdigest()[:16]
+
+
+# Campos que identificam um call; o resto (texto, formatação) não entra no signal_id
+CAMPOS_SINAL = ("type", "symbol", "direction", "entry_time", "expiration", "timeframe")
+
+
+def _normalizado(payload: dict | None) -> dict:
+    """Mesmo call, mesma forma: vale para publisher, webhook e replicator (outro chat/mensagem)."""
+    conteudo = {}
+    for campo in CAMPOS_SINAL:
+        valor = (payload or {}).get(campo)
+        if valor in (None, ""):
+            continue
+        valor = str(valor).strip().upper()
+        conteudo[campo] = re.sub(r"[^A-Z0-9]", "", valor) if campo == "symbol" else valor
+    return conteudo
+
+
+def _chaves(origem: str, payload: dict | None, chat_id, message_id) -> tuple:
+    conteudo = _normalizado(payload)
+    chave_msg = f"msg:{origem}:{chat_id}:{message_id}" if message_id is not None else None
+    # resultados (WIN/LOSS) se repetem legitimamente: só a mensagem identifica
+    chave_conteudo = f"cnt:{origem}:{_hash(conteudo)}" if conteudo and conteudo.get("type") != "RESULT" else None
+    return conteudo, chave_msg, chave_conteudo
+
+
+def registrar(origem: str, payload: dict | None = None, chat_id=None, message_id=None) -> str | None:
+    """
+    Registra o sinal e devolve seu signal_id; None se ele já foi visto (duplicado).
+    O signal_id de uma entrada vem só do conteúdo normalizado e da janela de
+    DEDUP_CONTENT_TTL: o mesmo call publicado por dois caminhos (replicator direto e
+    publisher do chat encaminhado, cada um com seu SQLite) tem o mesmo id, e os workers
+    (dispatcher.repetido) operam uma vez só. Call que cai nas duas pontas de uma virada
+    de janela ainda gera dois ids. Resultados se repetem legitimamente (LOSS da entrada
+    e do gale): o id deles continua vindo da mensagem (chat_id:message_id).
+    Chamado antes de publicar (duas entregas simultâneas não passam as duas); se a
+    publicação falhar, liberar() desfaz o registro.
+    """
+    _conectar()
+    agora = time.time()
+    conteudo, chave_msg, chave_conteudo = _chaves(origem, payload, chat_id, message_id)
+
+    if chave_msg and _visto(chave_msg, agora):
+        return None
+    if chave_conteudo and _visto(chave_conteudo, agora):
+        return None
+
+    if chave_msg:
+        _marcar(chave_msg, DEDUP_TTL, agora)
+    if chave_msg and not chave_conteudo:
+        signal_id = _hash(origem, chat_id, message_id, conteudo)
+    else:
+        signal_id = _hash(origem, conteudo, int(agora // DEDUP_CONTENT_TTL))
+    if chave_conteudo:
+        _marcar(chave_conteudo, DEDUP_CONTENT_TTL, agora)
+    return signal_id
+
+
+def liberar(origem: str, payload: dict | None = None, chat_id=None, message_id=None):
+    """Desfaz o registrar() de um sinal que não foi publicado: a reentrega não é descartada."""
+    _, *chaves = _chaves(origem, payload, chat_id, message_id)
+    db = _conectar()
+    for chave in filter(None, chaves):
+        _lru.pop(chave, None)
+        db.execute("DELETE FROM vistos WHERE chave = ?", (chave,))
+    db.commit()
@@ -0,0 +1,30 @@
+import os
+import json
+import time
+
+# Gravação opcional (tap) de todo sinal publicado, com o horário de recebimento, num
+# arquivo JSONL só de acréscimo: {"t": epoch, "ex": exchange, "rk": routing key, "p": payload}.
+# Os exchanges são NOT_PERSISTENT, então é a única forma de guardar um dia de tráfego
+# para reproduzir depois contra um worker (benchmarks/replay.py). Vazio = desligado.
+SIGNAL_TAP_PATH = os.getenv("SIGNAL_TAP_PATH", "")
+
+_arquivo = None
+
+
+def gravar(exchange: str, routing_key: str, payload: dict, recebido_em: float | None = None):
+    """Acrescenta o sinal à gravação; falhas de disco nunca bloqueiam a publicação."""
+    global _arquivo
+    if not SIGNAL_TAP_PATH:
+        return
+    linha = {
+        "t": round(recebido_em if recebido_em is not None else time.time(), 3),
+        "ex": exchange,
+        "rk": routing_key,
+        "p": payload,
+    }
+    try:
+        if _arquivo is None:
+            _arquivo = open(SIGNAL_TAP_PATH, "a", encoding="utf-8", buffering=1)
+        _arquivo.write(json.dumps(linha, ensure_ascii=False, separators=(",", ":")) + "\n")
+    except Exception as e:
+        print(f"⚠️ Falha ao gravar sinal em {SIGNAL_TAP_PATH}: {e}")
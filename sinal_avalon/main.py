@@ -1,11 +1,13 @@
 import os
-import re
 import json
 import asyncio
 import aio_pika
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import ApplicationBuilder, MessageHandler, filters, ContextTypes
+from parser import EXCHANGE, TOPIC_EXCHANGE, parse_entry, parse_result, routing_key, headers, canal
+import dedup
+import gravacao
 
 load_dotenv()
 
@@ -14,87 +16,50 @@ RABBITMQ_URL = os.getenv("RABBITMQ_URL")
 
 
 # === Publicação no RabbitMQ ===
-async def send_to_queue(data: dict):
+async def send_to_queue(data: dict, origem: str):
+    chave = routing_key(data, origem)
+    gravacao.gravar(TOPIC_EXCHANGE, chave, data)
     connection = await aio_pika.connect_robust(RABBITMQ_URL)
     channel = await connection.channel()
 
     exchange = await channel.declare_exchange(
-        "avalon_signals",
-        aio_pika.ExchangeType.FANOUT
+        TOPIC_EXCHANGE,
+        aio_pika.ExchangeType.TOPIC
     )
+    # fanout legado recebe tudo do topic
+    legado = await channel.declare_exchange(EXCHANGE, aio_pika.ExchangeType.FANOUT)
+    await legado.bind(exchange, routing_key="#")
 
     await exchange.publish(
         aio_pika.Message(
             body=json.dumps(data).encode(),
-            delivery_mode=aio_pika.DeliveryMode.NOT_PERSISTENT
+            delivery_mode=aio_pika.DeliveryMode.NOT_PERSISTENT,
+            headers=headers(data, origem)
         ),
-        routing_key=""
+        routing_key=chave
     )
 
     await connection.close()
 
 
-# === Parsers ===
-def _normalize_symbol(sym: str | None) -> str | None:
-    if not sym:
-        return None
-    sym = sym.strip().upper()
-    # remove "/" mas mantém hifens (ex.: EURUSD-OTC)
-    sym = sym.replace("/", "")
-    return sym
-
-
-def _parse_entry(text: str):
-    """
-    Formato esperado:
-    🚀 NOVA ENTRADA
-    • Par: EURUSD
-      ou: EURUSD-OTC
-    • Timeframe: 1
-    • Direção: BUY
-    """
-    if not re.search(r"\bNOVA\s+ENTRADA\b", text, re.IGNORECASE):
-        return None
-
-    # Par
-    par_match = re.search(r"(?i)par\s*:\s*([A-Z/\-]{6,20})", text)
-    symbol = _normalize_symbol(par_match.group(1)) if par_match else None
-
-    # Timeframe
-    tf_match = re.search(r"(?i)(?:time\s*frame|timeframe)\s*:\s*(\d+)", text)
-    timeframe = int(tf_match.group(1)) if tf_match else None
-
-    # Direção
-    dir_match = re.search(r"(?i)dire[cç][aã]o\s*:\s*(BUY|SELL)", text)
-    direction = dir_match.group(1).upper() if dir_match else None
-
-    if not symbol or not timeframe or direction not in ("BUY", "SELL"):
-        return None
-
-    expiration = f"0{timeframe}:00" if timeframe < 10 else f"{timeframe}:00"
-
-    return {
-        "type": "entry",
-        "symbol": symbol,                 # ex.: EURUSD-OTC
-        "timeframe_minutes": timeframe,   # 1, 5, etc.
-        "expiration": expiration,
-        "direction": direction,
-    }
-
-
-def _parse_result(text: str):
-    """
-    Formato esperado:
-    ✅ RESULTADO: WIN
-    ❌ RESULTADO: LOSS
-    """
-    m = re.search(r"(?i)\bRESULTADO\s*:\s*(WIN|LOSS)\b", text)
-    if not m:
-        return None
-    return {
-        "type": "result",
-        "result": m.group(1).upper()
-    }
+# === Deduplicação ===
+def _deduplicar(msg, payload: dict) -> bool:
+    """Marca o payload com signal_id; False se o sinal já foi publicado (reentrega/repost)."""
+    signal_id = dedup.registrar("avalon", payload, msg.chat_id, msg.message_id)
+    if not signal_id:
+        print("♻️ Sinal duplicado ignorado:", payload)
+        return False
+    payload["signal_id"] = signal_id
+    return True
+
+
+async def _publicar(msg, payload: dict):
+    """Publica o sinal; se falhar, libera o registro do dedup para a reentrega não ser descartada."""
+    try:
+        await send_to_queue(payload, canal(msg.chat.username, msg.chat_id))
+    except Exception:
+        dedup.liberar("avalon", payload, msg.chat_id, msg.message_id)
+        raise
 
 
 # === Handler de mensagens do Telegram ===
@@ -111,17 +76,21 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     print(f"📝 {text}")
 
     # Entrada
-    entry_payload = _parse_entry(text)
+    entry_payload = parse_entry(text)
     if entry_payload:
+        if not _deduplicar(update.message, entry_payload):
+            return
         print("📤 Publicando ENTRADA:", entry_payload)
-        await send_to_queue(entry_payload)
+        await _publicar(update.message, entry_payload)
         return
 
     # Resultado
-    result_payload = _parse_result(text)
+    result_payload = parse_result(text)
     if result_payload:
+        if not _deduplicar(update.message, result_payload):
+            return
         print("📤 Publicando RESULTADO:", result_payload)
-        await send_to_queue(result_payload)
+        await _publicar(update.message, result_payload)
         return
 
     print("ℹ️ Mensagem ignorada: formato não reconhecido.")
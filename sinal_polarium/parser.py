@@ -0,0 +1,116 @@
+import re
+
+# Regras de parsing do canal Polarium. Compartilhadas pelo publisher (polling), pela
+# ingestão via webhook (sinal_webhook) e pela publicação direta do message_replicator.
+EXCHANGE = "polarium_signals"
+# chats aceitos (mesmo filtro do MessageHandler do publisher)
+CHAT_TYPES = ("group", "supergroup", "channel")
+# Exchange topic (routing key <tipo>.<origem>.<ativo>.<timeframe>): cada worker liga só o
+# que opera. O fanout EXCHANGE fica ligado a ele com "#" para quem ainda consome tudo.
+TOPIC_EXCHANGE = f"{EXCHANGE}.topic"
+# Tipos de sinal de entrada que este parser emite; o header "kind" normaliza todos
+# para "entry" (resultados: "result"), e consumidores como qualidade.py leem só ele
+TIPOS_ENTRADA = ("entry",)
+
+def _normalize_symbol(sym: str | None) -> str | None:
+    if not sym:
+        return None
+    return sym.strip().upper().replace("/", "")  # remove "/" mas mantém "-"
+
+def parse_entry(text: str) -> dict | None:
+    """
+    Exemplo esperado:
+    🚀 NOVA ENTRADA
+    • Par: EURUSD  ou EURUSD-OTC
+    • Timeframe: 1 | 5 | M1 | M5 | 1m | 5m
+    • Direção: BUY | SELL
+    """
+    if not re.search(r"(?i)\bNOVA\s+ENTRADA\b", text):
+        return None
+
+    par_match = re.search(r"(?i)par\s*:\s*([A-Z/\-]{6,20})", text)
+    symbol = _normalize_symbol(par_match.group(1)) if par_match else None
+
+    tf_match = re.search(
+        r"(?i)(?:time\s*frame|timeframe)\s*:\s*(M?\s*([15])|([15])\s*m?)",
+        text
+    )
+    timeframe = int(tf_match.group(2) or tf_match.group(3)) if tf_match else None
+
+    dir_match = re.search(r"(?i)dire[cç][aã]o\s*:\s*(BUY|SELL)", text)
+    direction = dir_match.group(1).upper() if dir_match else None
+
+    if not symbol or not timeframe or direction not in ("BUY", "SELL"):
+        return None
+    if timeframe not in (1, 5):
+        return None
+
+    expiration = f"0{timeframe}:00" if timeframe < 10 else f"{timeframe}:00"
+
+    return {
+        "type": "entry",
+        "symbol": symbol,
+        "timeframe_minutes": timeframe,
+        "expiration": expiration,
+        "direction": direction,
+    }
+
+def parse_result(text: str) -> dict | None:
+    """
+    Exemplo esperado:
+    ✅ RESULTADO: WIN
+    ❌ RESULTADO: LOSS
+    """
+    m = re.search(r"(?i)\bRESULTADO\s*:\s*(WIN|LOSS)\b", text)
+    if not m:
+        return None
+    return {"type": "result", "result": m.group(1).upper()}
+
+def parse(text: str) -> dict | None:
+    """Payload publicado no exchange (entrada ou resultado) ou None se o formato não for reconhecido."""
+    text = text.strip()
+    return parse_entry(text) or parse_result(text)
+
+
+def _palavra(valor, maiusculas: bool = True) -> str:
+    """Uma palavra da routing key: sem pontos nem espaços; "_" quando ausente."""
+    valor = str(valor or "")
+    valor = re.sub(r"[^A-Z0-9]", "", valor.upper()) if maiusculas else re.sub(r"[^a-z0-9_]", "", valor.lower())
+    return valor or "_"
+
+
+def _timeframe(payload: dict):
+    tf = payload.get("timeframe_minutes") or payload.get("timeframe")
+    if not tf and payload.get("expiration"):
+        m = re.search(r"\d+", str(payload["expiration"]))
+        tf = int(m.group()) if m else None
+    return int(tf) if tf else None
+
+
+def canal(username: str | None, chat_id) -> str:
+    """Origem da routing key: username do chat de onde veio o sinal ou, sem username, o id."""
+    return username or str(chat_id)
+
+
+def routing_key(payload: dict, origem: str) -> str:
+    """
+    <tipo>.<origem>.<ativo>.<timeframe>, ex.: entry.sinaisvip.EURUSDOTC.1 ou result.sinaisvip._._
+    origem é o canal de origem (canal()): cada canal tem sua chave e pode ser filtrado.
+    """
+    return ".".join((
+        _palavra(payload.get("type"), maiusculas=False),
+        _palavra(origem, maiusculas=False),
+        _palavra(payload.get("symbol")),
+        _palavra(_timeframe(payload)),
+    ))
+
+
+def headers(payload: dict, origem: str) -> dict:
+    """Mesmos campos da routing key, para consumidores com exchange headers."""
+    return {
+        "type": payload.get("type"),
+        "kind": "entry" if payload.get("type") in TIPOS_ENTRADA else payload.get("type"),
+        "source": _palavra(origem, maiusculas=False),
+        "symbol": _palavra(payload.get("symbol")),
+        "timeframe": _timeframe(payload),
+    }
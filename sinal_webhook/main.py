@@ -0,0 +1,176 @@
+"""
+Ingestão dos sinais via webhook do Telegram (alternativa ao run_polling dos sinal_*).
+
+Um único servidor aiohttp recebe os updates dos quatro bots publishers em
+/webhook/<token>, aplica o parser do canal correspondente (sinal_*/parser.py) e
+publica direto no exchange, numa conexão RabbitMQ aberta uma vez só.
+
+Com WEBHOOK_BASE_URL definido o setWebhook de cada token é feito no startup.
+Webhook e polling são exclusivos no Telegram: com este serviço no ar os
+containers publisher_* não devem rodar (o run_polling remove o webhook).
+"""
+import os
+import sys
+import json
+import time
+import importlib.util
+import aio_pika
+import dedup
+import gravacao
+from aiohttp import web, ClientSession
+
+if os.path.exists(".env"):
+    from dotenv import load_dotenv
+    load_dotenv()
+
+RABBITMQ_URL = os.getenv("RABBITMQ_URL")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# URL pública (https) que o Telegram usa para chegar neste serviço; vazio = não registra
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "").rstrip("/")
+# Conferido no header X-Telegram-Bot-Api-Secret-Token de cada update
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Se definido, cada update recebido é gravado (JSONL) para replay no harness
+WEBHOOK_RECORD_PATH = os.getenv("WEBHOOK_RECORD_PATH", "")
+# Raiz onde ficam as pastas sinal_*/parser.py
+PARSERS_ROOT = os.getenv("PARSERS_ROOT", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# bot -> variável com o token (mesmos nomes do docker-compose)
+BOTS = {
+    "avalon": "TOKEN_TELEGRAM_AVALON",
+    "polarium": "TOKEN_TELEGRAM_POLARIUM",
+    "xofre": "TOKEN_TELEGRAM_XOFRE",
+    "home_broker": "TOKEN_TELEGRAM_HOMEBROKER",
+}
+# campos do update tratados pelo MessageHandler do python-telegram-bot
+CAMPOS_MENSAGEM = ("message", "edited_message", "channel_post", "edited_channel_post")
+
+rotas = {}       # token -> (bot, parser)
+exchanges = {}   # bot -> exchange declarado
+
+
+def carregar_parser(bot: str):
+    """Importa sinal_<bot>/parser.py pelo caminho (os quatro módulos se chamam parser)."""
+    caminho = os.path.join(PARSERS_ROOT, f"sinal_{bot}", "parser.py")
+    spec = importlib.util.spec_from_file_location(f"parser_{bot}", caminho)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+def mensagem_do_update(update: dict, parser) -> dict | None:
+    for campo in CAMPOS_MENSAGEM:
+        msg = update.get(campo)
+        if msg:
+            if msg.get("chat", {}).get("type") not in parser.CHAT_TYPES or not msg.get("text"):
+                return None
+            return msg
+    return None
+
+
+async def publicar(bot: str, parser, payload: dict, origem: str, recebido_em: float | None = None):
+    chave = parser.routing_key(payload, origem)
+    gravacao.gravar(parser.TOPIC_EXCHANGE, chave, payload, recebido_em)
+    await exchanges[bot].publish(
+        aio_pika.Message(
+            body=json.dumps(payload).encode(),
+            delivery_mode=aio_pika.DeliveryMode.NOT_PERSISTENT,
+            headers=parser.headers(payload, origem)
+        ),
+        routing_key=chave
+    )
+
+
+def gravar(bot: str, update: dict):
+    with open(WEBHOOK_RECORD_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"bot": bot, "recebido_em": time.time(), "update": update}, ensure_ascii=False) + "\n")
+
+
+async def receber(request: web.Request):
+    inicio = time.perf_counter()
+    recebido_em = time.time()
+    rota = rotas.get(request.match_info["token"])
+    if not rota:
+        return web.Response(status=404)
+    if WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+        return web.Response(status=403)
+
+    bot, parser = rota
+    update = await request.json()
+    if WEBHOOK_RECORD_PATH:
+        gravar(bot, update)
+
+    msg = mensagem_do_update(update, parser)
+    if not msg:
+        return web.Response(text="ok")
+
+    payload = parser.parse(msg["text"])
+    if not payload:
+        print(f"ℹ️ [{bot}] Mensagem ignorada: formato não reconhecido.")
+        return web.Response(text="ok")
+
+    # reentrega do Telegram, edição ou repost do mesmo call
+    signal_id = dedup.registrar(bot, payload, msg["chat"].get("id"), msg.get("message_id"))
+    if not signal_id:
+        print(f"♻️ [{bot}] Sinal duplicado ignorado:", payload)
+        return web.Response(text="ok")
+    payload["signal_id"] = signal_id
+
+    # erro de publicação responde 500: o Telegram reenvia o update, que não pode
+    # ser descartado como duplicado
+    try:
+        await publicar(bot, parser, payload, parser.canal(msg["chat"].get("username"), msg["chat"].get("id")),
+                       recebido_em)
+    except Exception:
+        dedup.liberar(bot, payload, msg["chat"].get("id"), msg.get("message_id"))
+        raise
+    print(f"📤 [{bot}] Publicado {payload.get('type')} em {(time.perf_counter() - inicio) * 1000:.1f} ms:", payload)
+    return web.Response(text="ok")
+
+
+async def registrar_webhooks(app: web.Application):
+    if not WEBHOOK_BASE_URL:
+        print("ℹ️ WEBHOOK_BASE_URL vazio: setWebhook não será chamado.")
+        return
+    async with ClientSession() as session:
+        for token, (bot, _) in rotas.items():
+            body = {"url": f"{WEBHOOK_BASE_URL}/webhook/{token}", "allowed_updates": list(CAMPOS_MENSAGEM)}
+            if WEBHOOK_SECRET:
+                body["secret_token"] = WEBHOOK_SECRET
+            async with session.post(f"https://api.telegram.org/bot{token}/setWebhook", json=body) as resp:
+                data = await resp.json()
+                print(f"{'✅' if data.get('ok') else '❌'} setWebhook {bot}: {data.get('description')}")
+
+
+async def conectar_rabbit(app: web.Application):
+    connection = await aio_pika.connect_robust(RABBITMQ_URL)
+    channel = await connection.channel()
+    for bot, parser in {b: p for b, p in rotas.values()}.items():
+        exchanges[bot] = await channel.declare_exchange(parser.TOPIC_EXCHANGE, aio_pika.ExchangeType.TOPIC)
+        # fanout legado recebe tudo do topic
+        legado = await channel.declare_exchange(parser.EXCHANGE, aio_pika.ExchangeType.FANOUT)
+        await legado.bind(exchanges[bot], routing_key="#")
+    yield
+    await connection.close()
+
+
+def montar_app() -> web.Application:
+    for bot, variavel in BOTS.items():
+        token = os.getenv(variavel)
+        if not token:
+            print(f"⚠️ {variavel} não definido: bot {bot} fora do webhook.")
+            continue
+        rotas[token] = (bot, carregar_parser(bot))
+    if not rotas:
+        sys.exit("❌ Nenhum token de bot configurado.")
+
+    app = web.Application()
+    app.router.add_post("/webhook/{token}", receber)
+    app.cleanup_ctx.append(conectar_rabbit)
+    app.on_startup.append(registrar_webhooks)
+    return app
+
+
+if __name__ == "__main__":
+    app = montar_app()
+    print(f"🤖 Webhook de sinais ouvindo na porta {WEBHOOK_PORT} ({', '.join(b for b, _ in rotas.values())})")
+    web.run_app(app, port=WEBHOOK_PORT, print=None)
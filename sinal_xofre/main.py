@@ -1,127 +1,72 @@
 # publisher.py
 import os
-import re
 import json
 import asyncio
 import aio_pika
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import ApplicationBuilder, MessageHandler, filters, ContextTypes
+from parser import EXCHANGE, TOPIC_EXCHANGE, parse, routing_key, headers, canal
+import dedup
+import gravacao
 
 load_dotenv()
 
 TOKEN = os.getenv("TOKEN_TELEGRAM")
 RABBITMQ_URL = os.getenv("RABBITMQ_URL")
 
-async def send_to_queue(data):
+async def send_to_queue(data, origem: str):
+    chave = routing_key(data, origem)
+    gravacao.gravar(TOPIC_EXCHANGE, chave, data)
     connection = await aio_pika.connect_robust(RABBITMQ_URL)
     channel = await connection.channel()
 
-    exchange = await channel.declare_exchange("xofre_signals", aio_pika.ExchangeType.FANOUT)
+    exchange = await channel.declare_exchange(TOPIC_EXCHANGE, aio_pika.ExchangeType.TOPIC)
+    # fanout legado recebe tudo do topic
+    legado = await channel.declare_exchange(EXCHANGE, aio_pika.ExchangeType.FANOUT)
+    await legado.bind(exchange, routing_key="#")
 
     await exchange.publish(
         aio_pika.Message(
             body=json.dumps(data).encode(),
-            delivery_mode=aio_pika.DeliveryMode.NOT_PERSISTENT
+            delivery_mode=aio_pika.DeliveryMode.NOT_PERSISTENT,
+            headers=headers(data, origem)
         ),
-        routing_key=""
+        routing_key=chave
     )
 
     await connection.close()
 
 
+def _deduplicar(msg, payload: dict) -> bool:
+    """Marca o payload com signal_id; False se o sinal já foi publicado (reentrega/repost)."""
+    signal_id = dedup.registrar("xofre", payload, msg.chat_id, msg.message_id)
+    if not signal_id:
+        print("♻️ Sinal duplicado ignorado:", payload)
+        return False
+    payload["signal_id"] = signal_id
+    return True
+
+
+async def _publicar(msg, payload: dict):
+    """Publica o sinal; se falhar, libera o registro do dedup para a reentrega não ser descartada."""
+    try:
+        await send_to_queue(payload, canal(msg.chat.username, msg.chat_id))
+    except Exception:
+        dedup.liberar("xofre", payload, msg.chat_id, msg.message_id)
+        raise
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not update.message or not update.message.text:
         return
 
     text = update.message.text
 
-    # -----------------------------
-    # 1) FORMATO ANTIGO: ENTRADA CONFIRMADA
-    # -----------------------------
-    if "✅ ENTRADA CONFIRMADA ✅" in text:
-        ativo_match = re.search(r"Ativo:\s*(.+)", text)
-        expiracao_match = re.search(r"Expiração:\s*(.+)", text)
-        entrada_match = re.search(r"Entrada:\s*(\d{2}:\d{2})", text)
-        direcao_match = re.search(r"Direção:\s*[\S]+\s+([A-Z]+)", text)
-        gales_match = re.findall(r"\dº GALE: TERMINA EM: (\d{2}:\d{2})", text)
-
-        ativo = ativo_match.group(1).strip() if ativo_match else None
-        if ativo and '/' in ativo:
-            partes = ativo.split('/')
-            ativo = ''.join(partes)
-
-        expiracao = expiracao_match.group(1).strip() if expiracao_match else None
-        entrada = entrada_match.group(1).strip() if entrada_match else None
-        direcao = direcao_match.group(1).strip() if direcao_match else None
-        gale1 = gales_match[0] if len(gales_match) > 0 else None
-        gale2 = gales_match[1] if len(gales_match) > 1 else None
-
-        if expiracao == "M1":
-            expiracao = "01:00"
-        elif expiracao == "M5":
-            expiracao = "05:00"
-
-        if direcao == "COMPRA":
-            direcao = "BUY"
-        elif direcao == "VENDA":
-            direcao = "SELL"
-
-        signal = {
-            "type": "signal_confirmed",
-            "symbol": ativo,
-            "expiration": expiracao,
-            "entry_time": entrada,
-            "direction": direcao,
-            "gale1": gale1,
-            "gale2": gale2
-        }
-
-        print("📤 Publicando sinal (confirmado):", signal)
-        await send_to_queue(signal)
-
-    # -----------------------------
-    # 2) NOVO FORMATO: 🚀 NOVA ENTRADA
-    # -----------------------------
-    elif "🚀 NOVA ENTRADA" in text:
-        par_match = re.search(r"Par:\s*(.+)", text)
-        timeframe_match = re.search(r"Timeframe:\s*(\d+)", text)
-        direcao_match = re.search(r"Direção:\s*([A-Z]+)", text)
-
-        ativo = par_match.group(1).strip() if par_match else None
-        timeframe = timeframe_match.group(1).strip() if timeframe_match else None
-        direcao = direcao_match.group(1).strip() if direcao_match else None
-
-        if direcao == "COMPRA":
-            direcao = "BUY"
-        elif direcao == "VENDA":
-            direcao = "SELL"
-
-        signal = {
-            "type": "signal_new",
-            "symbol": ativo,
-            "timeframe": timeframe,
-            "direction": direcao
-        }
-
-        print("📤 Publicando sinal (nova entrada):", signal)
-        await send_to_queue(signal)
-
-    # -----------------------------
-    # 3) RESULTADO (WIN / LOSS)
-    # -----------------------------
-    elif "RESULTADO" in text:
-        result_match = re.search(r"RESULTADO:\s*(WIN|LOSS)", text)
-        if result_match:
-            resultado = result_match.group(1).strip()
-
-            signal = {
-                "type": "result",
-                "result": resultado
-            }
-
-            print("📤 Publicando resultado:", signal)
-            await send_to_queue(signal)
+    signal = parse(text)
+    if signal and _deduplicar(update.message, signal):
+        print(f"📤 Publicando sinal ({signal['type']}):", signal)
+        await _publicar(update.message, signal)
 
 
 def main():
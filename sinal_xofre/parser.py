@@ -0,0 +1,143 @@
+import re
+
+# Regras de parsing do canal Xofre. Compartilhadas pelo publisher (polling), pela
+# ingestão via webhook (sinal_webhook) e pela publicação direta do message_replicator.
+EXCHANGE = "xofre_signals"
+# chats aceitos (mesmo filtro do MessageHandler do publisher)
+CHAT_TYPES = ("group", "supergroup")
+# Exchange topic (routing key <tipo>.<origem>.<ativo>.<timeframe>): cada worker liga só o
+# que opera. O fanout EXCHANGE fica ligado a ele com "#" para quem ainda consome tudo.
+TOPIC_EXCHANGE = f"{EXCHANGE}.topic"
+# Tipos de sinal de entrada que este parser emite; o header "kind" normaliza todos
+# para "entry" (resultados: "result"), e consumidores como qualidade.py leem só ele
+TIPOS_ENTRADA = ("signal_confirmed", "signal_new")
+
+
+def parse(text: str) -> dict | None:
+    """Sinal publicado no exchange ou None se o formato não for reconhecido."""
+    # -----------------------------
+    # 1) FORMATO ANTIGO: ENTRADA CONFIRMADA
+    # -----------------------------
+    if "✅ ENTRADA CONFIRMADA ✅" in text:
+        ativo_match = re.search(r"Ativo:\s*(.+)", text)
+        expiracao_match = re.search(r"Expiração:\s*(.+)", text)
+        entrada_match = re.search(r"Entrada:\s*(\d{2}:\d{2})", text)
+        direcao_match = re.search(r"Direção:\s*[\S]+\s+([A-Z]+)", text)
+        gales_match = re.findall(r"\dº GALE: TERMINA EM: (\d{2}:\d{2})", text)
+
+        ativo = ativo_match.group(1).strip() if ativo_match else None
+        if ativo and '/' in ativo:
+            partes = ativo.split('/')
+            ativo = ''.join(partes)
+
+        expiracao = expiracao_match.group(1).strip() if expiracao_match else None
+        entrada = entrada_match.group(1).strip() if entrada_match else None
+        direcao = direcao_match.group(1).strip() if direcao_match else None
+        gale1 = gales_match[0] if len(gales_match) > 0 else None
+        gale2 = gales_match[1] if len(gales_match) > 1 else None
+
+        if expiracao == "M1":
+            expiracao = "01:00"
+        elif expiracao == "M5":
+            expiracao = "05:00"
+
+        if direcao == "COMPRA":
+            direcao = "BUY"
+        elif direcao == "VENDA":
+            direcao = "SELL"
+
+        signal = {
+            "type": "signal_confirmed",
+            "symbol": ativo,
+            "expiration": expiracao,
+            "entry_time": entrada,
+            "direction": direcao,
+            "gale1": gale1,
+            "gale2": gale2
+        }
+        return signal
+
+    # -----------------------------
+    # 2) NOVO FORMATO: 🚀 NOVA ENTRADA
+    # -----------------------------
+    elif "🚀 NOVA ENTRADA" in text:
+        par_match = re.search(r"Par:\s*(.+)", text)
+        timeframe_match = re.search(r"Timeframe:\s*(\d+)", text)
+        direcao_match = re.search(r"Direção:\s*([A-Z]+)", text)
+
+        ativo = par_match.group(1).strip() if par_match else None
+        timeframe = timeframe_match.group(1).strip() if timeframe_match else None
+        direcao = direcao_match.group(1).strip() if direcao_match else None
+
+        if direcao == "COMPRA":
+            direcao = "BUY"
+        elif direcao == "VENDA":
+            direcao = "SELL"
+
+        signal = {
+            "type": "signal_new",
+            "symbol": ativo,
+            "timeframe": timeframe,
+            "direction": direcao
+        }
+        return signal
+
+    # -----------------------------
+    # 3) RESULTADO (WIN / LOSS)
+    # -----------------------------
+    elif "RESULTADO" in text:
+        result_match = re.search(r"RESULTADO:\s*(WIN|LOSS)", text)
+        if result_match:
+            resultado = result_match.group(1).strip()
+
+            signal = {
+                "type": "result",
+                "result": resultado
+            }
+            return signal
+
+    return None
+
+
+def _palavra(valor, maiusculas: bool = True) -> str:
+    """Uma palavra da routing key: sem pontos nem espaços; "_" quando ausente."""
+    valor = str(valor or "")
+    valor = re.sub(r"[^A-Z0-9]", "", valor.upper()) if maiusculas else re.sub(r"[^a-z0-9_]", "", valor.lower())
+    return valor or "_"
+
+
+def _timeframe(payload: dict):
+    tf = payload.get("timeframe_minutes") or payload.get("timeframe")
+    if not tf and payload.get("expiration"):
+        m = re.search(r"\d+", str(payload["expiration"]))
+        tf = int(m.group()) if m else None
+    return int(tf) if tf else None
+
+
+def canal(username: str | None, chat_id) -> str:
+    """Origem da routing key: username do chat de onde veio o sinal ou, sem username, o id."""
+    return username or str(chat_id)
+
+
+def routing_key(payload: dict, origem: str) -> str:
+    """
+    <tipo>.<origem>.<ativo>.<timeframe>, ex.: entry.sinaisvip.EURUSDOTC.1 ou result.sinaisvip._._
+    origem é o canal de origem (canal()): cada canal tem sua chave e pode ser filtrado.
+    """
+    return ".".join((
+        _palavra(payload.get("type"), maiusculas=False),
+        _palavra(origem, maiusculas=False),
+        _palavra(payload.get("symbol")),
+        _palavra(_timeframe(payload)),
+    ))
+
+
+def headers(payload: dict, origem: str) -> dict:
+    """Mesmos campos da routing key, para consumidores com exchange headers."""
+    return {
+        "type": payload.get("type"),
+        "kind": "entry" if payload.get("type") in TIPOS_ENTRADA else payload.get("type"),
+        "source": _palavra(origem, maiusculas=False),
+        "symbol": _palavra(payload.get("symbol")),
+        "timeframe": _timeframe(payload),
+    }
@@ -0,0 +1,87 @@
+import os
+import time
+import relogio
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from urllib.parse import urlsplit
+
+# Sessão HTTP persistente com a corretora. Para sinais agendados a conexão é aberta
+# e validada PREWARM_SECONDS antes do horário: DNS, TCP e TLS já estão resolvidos
+# quando a ordem sai, e o tempo medido a partir do horário-alvo é só o da ordem.
+PREWARM_SECONDS = float(os.getenv("PREWARM_SECONDS", "5"))
+KEEPALIVE_SECONDS = float(os.getenv("HTTP_KEEPALIVE_SECONDS", "60"))
+
+TZ_BRASILIA = ZoneInfo("America/Sao_Paulo")
+
+_sessao = None
+# ms entre o horário-alvo e o envio/resposta de cada ordem agendada (últimas 100)
+latencias = {"envio": [], "resposta": []}
+
+
+def sessao():
+    """Sessão compartilhada (keep-alive); criada na primeira chamada."""
+    import aiohttp
+    global _sessao
+    if _sessao is None or _sessao.closed:
+        conector = aiohttp.TCPConnector(keepalive_timeout=KEEPALIVE_SECONDS, ttl_dns_cache=300)
+        _sessao = aiohttp.ClientSession(connector=conector)
+    return _sessao
+
+
+async def aquecer(url: str, headers: dict | None = None) -> bool:
+    """Abre (ou revalida) a conexão com o host da ordem; qualquer resposta HTTP serve."""
+    base = "{0.scheme}://{0.netloc}/".format(urlsplit(url))
+    inicio = time.perf_counter()
+    try:
+        async with sessao().head(base, headers=headers) as resp:
+            await resp.read()
+        print(f"🔥 Conexão com {urlsplit(url).netloc} aquecida em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+        return True
+    except Exception as e:
+        print(f"⚠️ Falha ao aquecer conexão com {urlsplit(url).netloc}: {e}")
+        return False
+
+
+def prazo(horario: str) -> float:
+    """Horário HH:MM de hoje (Brasília) como timestamp."""
+    hora = datetime.strptime(horario, "%H:%M").time()
+    hoje = datetime.fromtimestamp(relogio.agora(), TZ_BRASILIA).date()
+    return datetime.combine(hoje, hora, TZ_BRASILIA).timestamp()
+
+
+async def aguardar(horario: str, etapa: str, preparar=None) -> float:
+    """
+    Dorme até PREWARM_SECONDS antes do horário, roda preparar() (aquecer conexão,
+    renovar token) e dorme até o horário exato. Retorna o prazo para medir o envio.
+    """
+    alvo = prazo(horario)
+    print(f"⏳ Aguardando horário: {horario} para {etapa}")
+    await relogio.dormir(alvo - relogio.agora() - PREWARM_SECONDS)
+    if preparar is not None and alvo - relogio.agora() > 0:
+        try:
+            await preparar()
+        except Exception as e:
+            print(f"⚠️ Erro ao preparar {etapa}: {e}")
+    await relogio.dormir(alvo - relogio.agora())
+    print(f"🚀 Horário atingido, prosseguindo... ({etapa})")
+    return alvo
+
+
+def registrar(tipo: str, alvo: float | None, etapa: str):
+    """Guarda ms desde o horário-alvo ('envio' antes do POST, 'resposta' ao recebê-la)."""
+    if not alvo:
+        return
+    # em segundos reais, também durante o replay acelerado
+    ms = relogio.real(relogio.agora() - alvo) * 1000
+    amostras = latencias[tipo]
+    amostras.append(ms)
+    del amostras[:-100]
+    if tipo == "resposta":
+        ordenadas = sorted(amostras)
+        p50 = ordenadas[len(ordenadas) // 2]
+        print(f"⏱️ {etapa}: resposta da ordem {ms:+.0f} ms do horário (p50 {p50:+.0f} ms em {len(amostras)} ordens)")
+
+
+async def fechar():
+    if _sessao is not None and not _sessao.closed:
+        await _sessao.close()
@@ -1,21 +1,21 @@
+import time
+INICIO_PROCESSO = time.perf_counter()  # antes dos demais imports: mede o caminho até consumir
 import os
 import json
 import asyncio
 import aio_pika
-import aiohttp
-from dotenv import load_dotenv
-from api import (
-    get_bot_options,
-    update_win_value,
-    update_loss_value,
-    update_trade_order_info,
-    verify_stop_values,
-    create_trade_order_info
-)
-from datetime import datetime
-import pytz
-
-load_dotenv()
+import control
+import dispatcher
+import filtros
+import assets
+import conexao
+import relogio
+import symbols
+from symbols import inverter_symbol
+
+if os.path.exists(".env"):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 API_TOKEN = os.getenv("API_TOKEN")
 USER_ID = os.getenv("USER_ID")
@@ -27,19 +27,38 @@ RABBITMQ_URL = f"amqp://{user}:{password}@{host}:5672/"
 
 print("🔗 RabbitMQ URL:", RABBITMQ_URL)
 
+# Base da API da corretora (sobrescrita nos testes de carga)
+XOFRE_API_URL = os.getenv("XOFRE_API_URL", "https://broker-api.mybroker.dev").rstrip("/")
+URL_BUY = f"{XOFRE_API_URL}/token/trades/open"
 
-def inverter_symbol(symbol: str) -> str:
-    if ".OTC" in symbol:
-        base, _ = symbol.split(".OTC")
-        if len(base) == 6:
-            return base[3:] + base[:3] + ".OTC"
-    elif len(symbol) == 6:
-        return symbol[3:] + symbol[:3]
-    return symbol
 
+# --------- Liquidação em segundo plano ---------
 
-async def realizar_compra(isDemo: bool, close_type: str, direction: str, symbol: str, amount: float):
-    url_buy = 'https://broker-api.mybroker.dev/token/trades/open'
+def _liquidacao_concluida(task: asyncio.Task):
+    if task.cancelled():
+        return
+    if task.exception():
+        print(f"❌ Erro na liquidação: {task.exception()}")
+        return
+    control.registrar_liquidacao(task.result())
+
+def liquidar_em_segundo_plano(order_id: str, status: str, pnl: float, win_value: float = 0, loss_value: float = 0):
+    """
+    Agenda a liquidação (totais + trade-order-info + stop) sem bloquear o worker:
+    o próximo sinal é aceito enquanto as escritas no backend ocorrem em paralelo.
+    Se os novos totais atingirem o stop, o próprio worker para (control.acionar_stop).
+    """
+    control.fechar_ordem(order_id, status, pnl=pnl, win_value=win_value, loss_value=loss_value)
+    from api import settle_trade_order
+    task = control.rastrear(asyncio.create_task(settle_trade_order(
+        USER_ID, BROKERAGE_ID, order_id, status, pnl, win_value=win_value, loss_value=loss_value
+    )))
+    task.add_done_callback(_liquidacao_concluida)
+    return task
+
+
+async def realizar_compra(isDemo: bool, close_type: str, direction: str, symbol: str, amount: float,
+                          etapa: str = "", alvo: float | None = None):
     payload = {
         "isDemo": isDemo,
         "closeType": close_type,
@@ -49,26 +68,32 @@ async def realizar_compra(isDemo: bool, close_type: str, direction: str, symbol:
     }
     headers = {"content-type": "application/json", "api-token": API_TOKEN}
 
-    async with aiohttp.ClientSession() as session:
-        try:
-            async with session.post(url_buy, json=payload, headers=headers) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    print("📤 Ordem enviada:", data)
-                    return data
-                else:
-                    print(f"❌ Erro ao enviar ordem: status {response.status}")
-                    return {}
-        except Exception as e:
-            print(f"⚠️ Erro de requisição ao enviar ordem: {e}")
-            return {}
-
-
-async def tentar_ordem_com_inversao(isDemo, close_type, direction, symbol, amount, etapa):
+    # sessão persistente: a conexão já foi aquecida antes do horário (conexao.aguardar)
+    session = conexao.sessao()
+    try:
+        conexao.registrar("envio", alvo, etapa)
+        async with session.post(URL_BUY, json=payload, headers=headers) as response:
+            conexao.registrar("resposta", alvo, etapa)
+            if response.status == 200:
+                data = await response.json()
+                print("📤 Ordem enviada:", data)
+                return data
+            else:
+                print(f"❌ Erro ao enviar ordem: status {response.status}")
+                return {}
+    except Exception as e:
+        print(f"⚠️ Erro de requisição ao enviar ordem: {e}")
+        return {}
+
+
+async def tentar_ordem_com_inversao(isDemo, close_type, direction, symbol, amount, etapa, alvo=None):
+    from api import create_trade_order_info
     if amount > 1000:
         amount = 1000
 
-    order = await realizar_compra(isDemo, close_type, direction, symbol, amount)
+    # orientação já aprendida para o par: evita a ida e volta de uma ordem recusada
+    symbol = symbols.resolver(symbol)
+    order = await realizar_compra(isDemo, close_type, direction, symbol, amount, etapa, alvo)
 
     if not order.get("id"):
         print(f"⚠️ Falha com {symbol}, tentando com par invertido...")
@@ -76,7 +101,7 @@ async def tentar_ordem_com_inversao(isDemo, close_type, direction, symbol, amoun
         print(f"🔁 Tentando com símbolo invertido: {symbol_invertido}")
         if amount > 1000:
             amount = 1000
-        order = await realizar_compra(isDemo, close_type, direction, symbol_invertido, amount)
+        order = await realizar_compra(isDemo, close_type, direction, symbol_invertido, amount, etapa, alvo)
 
         if order.get("id"):
             symbol = symbol_invertido
@@ -85,6 +110,8 @@ async def tentar_ordem_com_inversao(isDemo, close_type, direction, symbol, amoun
         print("❌ Falha ao enviar ordem mesmo após inversão.")
         return None
 
+    symbols.aprender(symbol)
+
     await create_trade_order_info(
         user_id=USER_ID,
         order_id=order["id"],
@@ -95,40 +122,37 @@ async def tentar_ordem_com_inversao(isDemo, close_type, direction, symbol, amoun
         status=order.get("result"),
         brokerage_id=BROKERAGE_ID
     )
+    control.abrir_ordem(order["id"], symbol=symbol, amount=amount, etapa=etapa)
 
-    url_status = f"https://broker-api.mybroker.dev/token/trades/{order['id']}"
+    url_status = f"{XOFRE_API_URL}/token/trades/{order['id']}"
     headers = {"api-token": API_TOKEN}
 
     print(f"🔍 Verificando resultado da ordem {order['id']} para {etapa}...")
 
-    async with aiohttp.ClientSession() as session:
-        while True:
-            await asyncio.sleep(5)
-            try:
-                async with session.get(url_status, headers=headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        result = data.get("result")
-                        print(f"📊 Status atual: {result}")
-                        if result in ["WON", "LOST", "DRAW"]:
-                            return data
-                    else:
-                        print(f"⚠️ Erro ao verificar status da ordem: status {response.status}")
-            except Exception as e:
-                print(f"⚠️ Erro ao verificar status: {e}")
-
-
-async def aguardar_horario(horario: str, etapa: str):
-    print(f"⏳ Aguardando horário: {horario} para {etapa}")
-    tz_brasilia = pytz.timezone('America/Sao_Paulo')
-    target_time = datetime.strptime(horario, "%H:%M").time()
+    session = conexao.sessao()
     while True:
-        agora = datetime.now(tz_brasilia).time()
-        print(f"🕒 Horário atual: {agora.strftime('%H:%M:%S')} para {etapa}")
-        if agora >= target_time:
-            print("🚀 Horário atingido, prosseguindo...")
-            return
-        await asyncio.sleep(5)
+        await relogio.dormir(5)
+        try:
+            async with session.get(url_status, headers=headers) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    result = data.get("result")
+                    print(f"📊 Status atual: {result}")
+                    if result in ["WON", "LOST", "DRAW"]:
+                        return data
+                else:
+                    print(f"⚠️ Erro ao verificar status da ordem: status {response.status}")
+        except Exception as e:
+            print(f"⚠️ Erro ao verificar status: {e}")
+
+
+async def aquecer_ordem():
+    await conexao.aquecer(URL_BUY, {"api-token": API_TOKEN})
+
+
+async def aguardar_horario(horario: str, etapa: str) -> float:
+    """Dorme até o horário exato, aquecendo a conexão da ordem alguns segundos antes."""
+    return await conexao.aguardar(horario, etapa, preparar=aquecer_ordem)
 
 
 async def aguardar_e_executar_entradas(data):
@@ -139,6 +163,7 @@ async def aguardar_e_executar_entradas(data):
     direction = data["direction"]
     symbol = data["symbol"]
 
+    from api import get_bot_options
     bot_options = await get_bot_options(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
     amount = bot_options['entry_price']
     isDemo = bot_options['is_demo']
@@ -146,8 +171,11 @@ async def aguardar_e_executar_entradas(data):
     gale_two = bot_options['gale_two']
     is_auto = bot_options.get('is_auto')  # 👈 pega o novo campo
 
-    await aguardar_horario(entrada, "Entrada Principal")
-    order = await tentar_ordem_com_inversao(isDemo, close_type, direction, symbol, amount, "Entrada Principal")
+    alvo = await aguardar_horario(entrada, "Entrada Principal")
+    if control.parado.is_set():
+        print("🛑 Stop atingido — entrada cancelada.")
+        return
+    order = await tentar_ordem_com_inversao(isDemo, close_type, direction, symbol, amount, "Entrada Principal", alvo)
 
     if not order:
         print("⚠️ Falha na execução da entrada principal.")
@@ -157,65 +185,115 @@ async def aguardar_e_executar_entradas(data):
     pnl = order.get("pnl")
 
     if result == "WON":
-        await update_win_value(user_id=USER_ID, win_value=pnl, brokerage_id=BROKERAGE_ID)
-        await update_trade_order_info(order_id=order["id"], user_id=USER_ID, status="WON", pnl=pnl)
-        await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
+        liquidar_em_segundo_plano(order["id"], "WON", pnl, win_value=pnl)
         return
 
-    await update_loss_value(user_id=USER_ID, loss_value=amount, brokerage_id=BROKERAGE_ID)
-    await update_trade_order_info(order_id=order["id"], user_id=USER_ID, status="LOST", pnl=pnl)
-    await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
+    liquidar_em_segundo_plano(order["id"], "LOST", pnl, loss_value=amount)
 
     # 🔥 Só executa gales se estiver no modo automático
     if is_auto:
         if (result in ["LOST", "DRAW"]) and gale1 and gale_one:
-            await aguardar_horario(gale1, "Gale 1")
+            alvo = await aguardar_horario(gale1, "Gale 1")
+            if control.parado.is_set():
+                print("🛑 Stop atingido — Gale 1 cancelado.")
+                return
             gale1_valor = amount * 2
-            order_g1 = await tentar_ordem_com_inversao(isDemo, close_type, direction, symbol, gale1_valor, "Gale 1")
+            order_g1 = await tentar_ordem_com_inversao(isDemo, close_type, direction, symbol, gale1_valor, "Gale 1", alvo)
+
+            if not order_g1:
+                print("⚠️ Falha na execução do Gale 1.")
+                return
 
-            if order_g1 and order_g1.get("result") == "WON":
-                await update_win_value(user_id=USER_ID, win_value=order_g1["pnl"], brokerage_id=BROKERAGE_ID)
-                await update_trade_order_info(order_id=order_g1["id"], user_id=USER_ID, status="WON NA GALE 1", pnl=pnl)
-                await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
+            if order_g1.get("result") == "WON":
+                liquidar_em_segundo_plano(order_g1["id"], "WON NA GALE 1", order_g1.get("pnl"), win_value=order_g1["pnl"])
                 return
 
-            await update_loss_value(user_id=USER_ID, loss_value=gale1_valor, brokerage_id=BROKERAGE_ID)
-            await update_trade_order_info(order_id=order_g1["id"], user_id=USER_ID, status="LOST", pnl=pnl)
-            await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
+            liquidar_em_segundo_plano(order_g1["id"], "LOST", order_g1.get("pnl"), loss_value=gale1_valor)
 
-            if (order_g1 and order_g1.get("result") in ["LOST", "DRAW"]) and gale2 and gale_two:
-                await aguardar_horario(gale2, "Gale 2")
+            if order_g1.get("result") in ["LOST", "DRAW"] and gale2 and gale_two:
+                alvo = await aguardar_horario(gale2, "Gale 2")
+                if control.parado.is_set():
+                    print("🛑 Stop atingido — Gale 2 cancelado.")
+                    return
                 gale2_valor = amount * 4
-                order_g2 = await tentar_ordem_com_inversao(isDemo, close_type, direction, symbol, gale2_valor, "Gale 2")
+                order_g2 = await tentar_ordem_com_inversao(isDemo, close_type, direction, symbol, gale2_valor, "Gale 2", alvo)
 
-                if order_g2 and order_g2.get("result") == "WON":
-                    await update_win_value(user_id=USER_ID, win_value=order_g2["pnl"], brokerage_id=BROKERAGE_ID)
-                    await update_trade_order_info(order_id=order_g2["id"], user_id=USER_ID, status="WON NA GALE 2", pnl=pnl)
+                if not order_g2:
+                    print("⚠️ Falha na execução do Gale 2.")
+                    return
+
+                if order_g2.get("result") == "WON":
+                    liquidar_em_segundo_plano(order_g2["id"], "WON NA GALE 2", order_g2.get("pnl"), win_value=order_g2["pnl"])
                 else:
-                    await update_loss_value(user_id=USER_ID, loss_value=gale2_valor, brokerage_id=BROKERAGE_ID)
-                    await update_trade_order_info(order_id=order_g2["id"], user_id=USER_ID, status="LOST", pnl=pnl)
-                await verify_stop_values(user_id=USER_ID, brokerage_id=BROKERAGE_ID)
+                    liquidar_em_segundo_plano(order_g2["id"], "LOST", order_g2.get("pnl"), loss_value=gale2_valor)
     else:
         print("📌 Modo manual: não executando gales.")
 
 
 # RabbitMQ fanout consumer
+async def consumir(queue):
+    async with queue.iterator() as queue_iter:
+        async for message in queue_iter:
+            async with message.process():
+                try:
+                    data = json.loads(message.body.decode())
+                    control.sinal_recebido()
+                    print("📥 Sinal recebido:", data)
+                    if not data.get("entry_time"):
+                        print(f"ℹ️ Mensagem ignorada (tipo: {data.get('type')}, sem entry_time).")
+                        continue
+                    if control.parado.is_set():
+                        print("🛑 Bot parado — sinal descartado.")
+                        continue
+                    if dispatcher.repetido(data):
+                        continue
+                    simbolo = assets.validar(data.get("symbol"))
+                    if not simbolo:
+                        print(f"🚫 Ativo {data.get('symbol')} fechado ou indisponível na corretora — sinal descartado.")
+                        continue
+                    data["symbol"] = simbolo
+                    # confirma na hora e entrega ao pool: a fila não espera o ciclo entrada/gale1/gale2
+                    dispatcher.despachar(data)
+                except Exception as e:
+                    print(f"❌ Erro ao processar mensagem: {e}")
+
+
 async def main():
+    control.instalar_sinais()
+    symbols.carregar()
     connection = await aio_pika.connect_robust(RABBITMQ_URL)
     
     channel = await connection.channel()
-    exchange = await channel.declare_exchange("xofre_signals", aio_pika.ExchangeType.FANOUT)
+    await control.conectar(channel)
+    # já no stop (ex.: reiniciado depois de stop_win/stop_loss): publica "stopped" e sai sem consumir
+    if await control.verificar_stop():
+        await control.encerrar()
+        await conexao.fechar()
+        await connection.close()
+        return
+    exchange = await channel.declare_exchange("xofre_signals.topic", aio_pika.ExchangeType.TOPIC)
     queue = await channel.declare_queue(exclusive=True)
-    await queue.bind(exchange)
-
-    print("✅ Aguardando sinais...")
-
-    async with queue.iterator() as queue_iter:
-        async for message in queue_iter:
-            async with message.process():
-                data = json.loads(message.body.decode())
-                print("📥 Sinal recebido:", data)
-                await aguardar_e_executar_entradas(data)
+    # começa recebendo tudo; o filtro das opções do bot é aplicado em segundo plano
+    await filtros.aplicar(queue, exchange, {filtros.TUDO})
+
+    print(f"✅ Aguardando sinais... ({(time.perf_counter() - INICIO_PROCESSO) * 1000:.0f} ms desde o start)")
+
+    dispatcher.iniciar(aguardar_e_executar_entradas)
+    consumo = asyncio.create_task(consumir(queue))
+    # heartbeat no canal de controle: o orquestrador sabe se o bot está vivo de verdade
+    control.iniciar_heartbeat(consumo, dispatcher.snapshot)
+    # Módulos adiados (api/aiohttp) são carregados só depois que a fila já está sendo consumida
+    control.rastrear(asyncio.create_task(control.aquecer_imports("api")))
+    # filtro de sinais pelas opções do bot (religa a fila quando elas mudam)
+    filtros.iniciar(queue, exchange, USER_ID, BROKERAGE_ID)
+    # catálogo de ativos (também ensina a orientação dos pares): loop contínuo, fora da drenagem
+    assets.iniciar()
+    # Stop local ou SIGTERM: para de aceitar entradas, drena o que está aberto e sai
+    await control.parado.wait()
+    await control.encerrar()
+    consumo.cancel()
+    await conexao.fechar()
+    await connection.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+import os
+import json
+
+# Orientação aceita pela corretora para cada par (EURUSD x USDEUR, incluindo .OTC),
+# persistida para que a primeira ordem de cada sinal já saia com o símbolo certo.
+SYMBOL_CACHE_PATH = os.getenv("SYMBOL_CACHE_PATH", "symbol_cache.json")
+
+_orientacao = {}
+
+
+def inverter_symbol(symbol: str) -> str:
+    if ".OTC" in symbol:
+        base, _ = symbol.split(".OTC")
+        if len(base) == 6:
+            return base[3:] + base[:3] + ".OTC"
+    elif len(symbol) == 6:
+        return symbol[3:] + symbol[:3]
+    return symbol
+
+
+def _chave(symbol: str) -> str:
+    """Mesma chave para as duas orientações do par."""
+    return min(symbol, inverter_symbol(symbol))
+
+
+def resolver(symbol: str) -> str:
+    """Símbolo na orientação que a corretora aceitou da última vez (ou o próprio sinal)."""
+    return _orientacao.get(_chave(symbol), symbol)
+
+
+def aprender(symbol: str):
+    """Registra a orientação aceita e persiste se ela mudou."""
+    chave = _chave(symbol)
+    if _orientacao.get(chave) == symbol:
+        return
+    _orientacao[chave] = symbol
+    _salvar()
+
+
+def carregar():
+    """Lê o cache persistido; arquivo ausente ou corrompido começa vazio."""
+    try:
+        with open(SYMBOL_CACHE_PATH) as f:
+            _orientacao.update(json.load(f))
+        print(f"🔤 {len(_orientacao)} orientações de par carregadas de {SYMBOL_CACHE_PATH}")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"⚠️ Cache de símbolos ignorado ({e})")
+
+
+def _salvar():
+    tmp = f"{SYMBOL_CACHE_PATH}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(_orientacao, f)
+        os.replace(tmp, SYMBOL_CACHE_PATH)
+    except Exception as e:
+        print(f"⚠️ Falha ao salvar cache de símbolos: {e}")
+
+
+def aprender_catalogo(simbolos: list[str]):
+    """Aprende a orientação de todos os pares listados pela corretora (ver assets.py)."""
+    antes = dict(_orientacao)
+    for simbolo in simbolos:
+        _orientacao[_chave(simbolo)] = simbolo
+    if _orientacao != antes:
+        _salvar()
+    print(f"🔤 Orientação de {len(simbolos)} pares carregada da corretora")